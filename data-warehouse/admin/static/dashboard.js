@@ -80,7 +80,7 @@ async function updateVideoChart(chart) {
   chart.data.labels = Object.keys(data.files);
   chart.data.datasets[0].data = Object.values(data.files);
   chart.update();
-  document.getElementById('video-total').textContent = Object.keys(data.files).length;
+  document.getElementById('video-total').textContent = data.count ?? Object.keys(data.files).length;
 }
 
 // Fake average reading just to show metric card
@@ -45,21 +45,22 @@ async function loadSensors() {
 // Load single sensor chart + stats
 //────────────────────────────────────────────
 async function loadSensorData(sensorId) {
-  const res = await apiFetch(`/api/sensors/${sensorId}/readings`);
+  // Downsampled server-side (LTTB): at most 1000 points whatever the history length
+  const res = await apiFetch(`/api/sensors/${sensorId}/series?points=1000`);
   if (!res.ok) return;
 
-  const readings = await res.json();
-  if (!readings || readings.length === 0) return;
+  const series = await res.json();
+  if (!series.values || series.values.length === 0 || !series.stats.count) return;
 
-  const timestamps = readings.map(r => r.ts);
-  const values = readings.map(r => r.value);
+  const timestamps = series.timestamps;
+  const values = series.values;
 
-  const avg = values.reduce((a, b) => a + b, 0) / values.length;
-  document.getElementById("latest-value").textContent = values.at(-1).toFixed(2);
-  document.getElementById("avg-value").textContent = avg.toFixed(2);
-  document.getElementById("min-value").textContent = Math.min(...values).toFixed(2);
-  document.getElementById("max-value").textContent = Math.max(...values).toFixed(2);
-  document.getElementById("total-records").textContent = values.length;
+  const stats = series.stats;  // full range, not just the plotted points
+  document.getElementById("latest-value").textContent = stats.last.toFixed(2);
+  document.getElementById("avg-value").textContent = stats.avg.toFixed(2);
+  document.getElementById("min-value").textContent = stats.min.toFixed(2);
+  document.getElementById("max-value").textContent = stats.max.toFixed(2);
+  document.getElementById("total-records").textContent = stats.count;
 
   if (chart) chart.destroy();
   chart = new Chart(ctx, {
@@ -95,8 +96,9 @@ async function loadAllSensorData() {
   tableBody.innerHTML = `<tr><td colspan="6" class="text-center text-muted">Loading...</td></tr>`;
 
   try {
-    const res = await apiFetch("/api/sensors/all-readings");
-    const data = await res.json();
+    // First page only (newest first); older pages via ?after=next_cursor
+    const res = await apiFetch("/api/sensors/all-readings?limit=200");
+    const data = (await res.json()).items;
 
     if (!Array.isArray(data) || data.length === 0) {
       tableBody.innerHTML = `<tr><td colspan="6" class="text-center text-muted">No data found</td></tr>`;
@@ -1,19 +1,13 @@
-import os
+from app import storage_ledger
 
-def get_file_size_mb(path):
-    total_size = 0
-    for dirpath, _, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if os.path.isfile(fp):
-                total_size += os.path.getsize(fp)
-    return round(total_size / (1024 * 1024), 2)
 
 def get_storage_stats():
+    # Totals come from the storage ledger instead of walking storage/ on every call
+    usage = storage_ledger.megabytes("storage", ("sensors", "videos", "others"))
     stats = {
-        "sensor_storage": get_file_size_mb("storage/storage/sensors.db"),
-        "video_storage": get_file_size_mb("storage/storage/videos"),
-        "other_storage": get_file_size_mb("storage/others") if os.path.exists("storage/others") else 0.0,
+        "sensor_storage": usage["sensors"],
+        "video_storage": usage["videos"],
+        "other_storage": usage["others"],
     }
     stats["total_storage"] = round(sum(stats.values()), 2)
     return stats
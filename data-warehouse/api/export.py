@@ -1,13 +1,17 @@
 # api/export.py
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 from datetime import datetime
-import io, csv
+import uuid
+import itertools
+import time
 
 from app.database import get_db
-from app import models
+from app import hot_cache, ingest, models, rollups
+from app.api_key import get_current_client
+from app.utils.streaming import stream_query, iter_csv, csv_chunks, iter_zip, TransferLog
+from app.utils import columnar
 
 router = APIRouter(prefix="/api/export", tags=["Export"])
 
@@ -22,52 +26,202 @@ def export_readings_csv(
     start: datetime = Query(...),
     end: datetime = Query(...),
     resample: str = Query("", description="Optional: 1min, 1h, 1d"),
-    db: Session = Depends(get_db)
+    format: str = Query("csv", description="csv, parquet, arrow or feather"),
+    db: Session = Depends(get_db),
+    client: models.User = Depends(get_current_client),
 ):
     """
-    Exports sensor readings as CSV between the given time range.
+    Exports sensor readings as CSV (or Parquet / Arrow / Feather) between the given time range.
+    Bearer token or X-API-Key required; non-admins only get their own sensors.
     """
-    ids = [s.strip() for s in sensor_ids.split(',') if s.strip()]
+    columnar.check_format(format)
+    # Naive UTC bounds compare directly against the ts column, so partitions are pruned
+    start, end = ingest.parse_ts(start), ingest.parse_ts(end)
+    try:
+        ids = [uuid.UUID(s.strip()) for s in sensor_ids.split(',') if s.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sensor id.")
+    if not client.is_admin:
+        ids = [sid for (sid,) in db.query(models.Sensor.id).filter(
+            models.Sensor.id.in_(ids), models.Sensor.owner_id == client.id
+        )]
     if not ids:
         return {"error": "No sensor IDs provided"}
 
-    q = db.query(
-        models.SensorReading.sensor_id,
-        models.SensorReading.ts,
-        models.SensorReading.value
-    ).filter(
-        models.SensorReading.sensor_id.in_(ids),
-        models.SensorReading.ts >= start,
-        models.SensorReading.ts <= end
-    )
+    started = time.perf_counter()
 
-    # Optional: simple time bucket resampling
-    if resample:
-        unit_map = {'1min': 'minute', '1h': 'hour', '1d': 'day'}
-        unit = unit_map.get(resample, 'minute')
-        q = db.query(
-            models.SensorReading.sensor_id.label('sensor_id'),
-            func.date_trunc(unit, models.SensorReading.ts).label('bucket'),
-            func.avg(models.SensorReading.value).label('value')
+    def build_query(session: Session):
+        return session.query(
+            models.SensorReading.sensor_id,
+            models.SensorReading.ts,
+            models.SensorReading.value
         ).filter(
             models.SensorReading.sensor_id.in_(ids),
             models.SensorReading.ts >= start,
             models.SensorReading.ts <= end
-        ).group_by('sensor_id', 'bucket').order_by('bucket')
+        )
 
-    rows = q.all()
+    if resample:
+        # Served from the minute/hour/day rollups; raw rows are only read at the range edges
+        resolution = resample if resample in rollups.RESOLUTIONS else "1min"
+        rows = [
+            (r.sensor_id, r.bucket, r.agg.avg)
+            for r in rollups.resample(db, ids, start, end, resolution)
+        ]
+    else:
+        # Recent ranges: every sensor's slice comes from the in-memory hot series
+        windows = [(sid, hot_cache.cache.read(db, sid, start, end)) for sid in ids] if hot_cache.cache.covers(start) else []
+        if windows and all(w is not None for _, w in windows):
+            rows = (
+                (sid, t, v)
+                for sid, w in windows
+                for t, v in zip(w.ts.astype("datetime64[us]").tolist(), w.value.tolist())
+            )
+        else:
+            rows = stream_query(build_query)
 
-    # Write to CSV
-    buf = io.StringIO()
-    writer = csv.writer(buf)
-    writer.writerow(["Sensor ID", "Timestamp", "Value"])
-    for r in rows:
-        ts = getattr(r, "bucket", getattr(r, "ts", None))
-        writer.writerow([str(r.sensor_id), ts.isoformat(), float(r.value)])
+    def row_tuple(r):
+        return str(r[0]), r[1], float(r[2])
 
-    buf.seek(0)
+    if format != "csv":
+        log = TransferLog(f"export readings {format} ({len(ids)} sensors)", started)
+        schema = columnar.schema([("sensor_id", "string"), ("ts", "timestamp"), ("value", "float")])
+        body = columnar.iter_columnar(
+            format, schema, columnar.record_batches(rows, schema, row_tuple, log=log), log
+        )
+        return StreamingResponse(body, media_type=columnar.FORMATS[format][0], headers=columnar.headers(format, "export"))
+
+    # Stream CSV straight off a server-side cursor: memory stays flat for any range
+    log = TransferLog(f"export readings ({len(ids)} sensors)", started)
+    body = iter_csv(
+        ["Sensor ID", "Timestamp", "Value"],
+        rows,
+        lambda r: [str(r[0]), r[1].isoformat(), float(r[2])],
+        log,
+    )
     return StreamingResponse(
-        iter([buf.getvalue()]),
+        body,
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=export.csv"}
     )
+
+
+# ✅ Export CSV / ZIP
+@router.get("/sensor-data")
+def export_sensor_data(
+    sensor_ids: str,
+    start: str,
+    end: str,
+    format: str = "csv",
+    db: Session = Depends(get_db),
+    client: models.User = Depends(get_current_client),
+):
+    """Bearer token or X-API-Key required; non-admins only export their own sensors."""
+    started = time.perf_counter()
+    columnar.check_format(format)
+    try:
+        start_dt = datetime.fromisoformat(start)
+        end_dt = datetime.fromisoformat(end)
+        try:
+            sensor_id_list = [uuid.UUID(s.strip()) for s in sensor_ids.split(",") if s.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid sensor id.")
+        if not client.is_admin:
+            sensor_id_list = [sid for (sid,) in db.query(models.Sensor.id).filter(
+                models.Sensor.id.in_(sensor_id_list), models.Sensor.owner_id == client.id
+            )]
+
+        if not sensor_id_list:
+            raise HTTPException(status_code=400, detail="No sensors selected.")
+
+        in_range = (
+            models.SensorReading.sensor_id.in_(sensor_id_list),
+            models.SensorReading.ts >= start_dt,
+            models.SensorReading.ts <= end_dt,
+        )
+        has_data = db.query(db.query(models.SensorReading.id).filter(*in_range).exists()).scalar()
+        if not has_data:
+            raise HTTPException(status_code=404, detail="No data found in this range.")
+
+        def build_query(session: Session):
+            # One ordered pass over all sensors; grouped into archive members below
+            return (
+                session.query(
+                    models.SensorReading.sensor_id,
+                    models.Sensor.name.label("sensor_name"),
+                    models.SensorReading.ts,
+                    models.SensorReading.ts_end,
+                    models.SensorReading.value,
+                    models.SensorReading.unit,
+                )
+                .join(models.Sensor, models.SensorReading.sensor_id == models.Sensor.id)
+                .filter(*in_range)
+                .order_by(models.SensorReading.sensor_id, models.SensorReading.ts)
+            )
+
+        header = ["Sensor Name", "Start Time", "End Time", "Value", "Unit"]
+
+        def format_row(r):
+            return [
+                r.sensor_name,
+                r.ts.strftime("%Y-%m-%d %H:%M:%S"),
+                r.ts_end.strftime("%Y-%m-%d %H:%M:%S") if r.ts_end else "",
+                r.value,
+                r.unit,
+            ]
+
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        if format != "csv":
+            # Columnar formats hold every sensor in one file, keyed by sensor_name
+            log = TransferLog(f"export sensor-data {format} ({len(sensor_id_list)} sensors)", started)
+            schema = columnar.schema([
+                ("sensor_name", "string"), ("start_time", "timestamp"), ("end_time", "timestamp"),
+                ("value", "float"), ("unit", "string"),
+            ])
+            batches = columnar.record_batches(
+                stream_query(build_query), schema,
+                lambda r: (r.sensor_name, r.ts, r.ts_end, r.value, r.unit),
+                log=log,
+            )
+            return StreamingResponse(
+                columnar.iter_columnar(format, schema, batches, log),
+                media_type=columnar.FORMATS[format][0],
+                headers=columnar.headers(format, f"sensors_export_{stamp}"),
+            )
+
+        log = TransferLog(f"export sensor-data ({len(sensor_id_list)} sensors)", started)
+
+        if len(sensor_id_list) == 1:
+            name = db.query(models.Sensor.name).filter(models.Sensor.id == sensor_id_list[0]).scalar()
+            filename = f"{name}_export_{stamp}.csv"
+            return StreamingResponse(
+                iter_csv(header, stream_query(build_query), format_row, log),
+                media_type="text/csv",
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+
+        # Multiple → ZIP, one member per sensor, compressed and sent as produced
+        def members():
+            used = set()
+            for _, rows in itertools.groupby(stream_query(build_query), key=lambda r: r.sensor_id):
+                first = next(rows)
+                arcname = f"{first.sensor_name}.csv"
+                n = 1
+                while arcname in used:
+                    n += 1
+                    arcname = f"{first.sensor_name}_{n}.csv"
+                used.add(arcname)
+                yield arcname, csv_chunks(header, itertools.chain([first], rows), format_row, log)
+
+        zip_filename = f"sensors_export_{stamp}.zip"
+        return StreamingResponse(
+            iter_zip(members(), log),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("❌ CSV Export Error:", e)
+        raise HTTPException(status_code=500, detail=str(e))
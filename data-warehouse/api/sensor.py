@@ -1,10 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query, Path
 from pydantic import BaseModel
-import sqlite3
-import csv
 import os
 import datetime
 from api.sensor_admin import router as sensor_admin_router
+from app.utils import csv_store
+from app import sqlite_db
 from api.export import router as export_router
 
 app.include_router(sensor_admin_router)
@@ -16,6 +16,11 @@ DB_PATH = "storage/sensors.db"
 CSV_DIR = "storage/sensors"
 CSV_FILE = os.path.join(CSV_DIR, "sensor_data.csv")
 
+INSERT_SQL = """
+    INSERT INTO sensors (sensor_id, start_timestamp, end_timestamp, value, unit)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
 class SensorData(BaseModel):
     sensor_id: str
     start_timestamp: str
@@ -23,42 +28,42 @@ class SensorData(BaseModel):
     value: float
     unit: str
 
-# 📝 Create new sensor entry
-@sensor_router.post("/")
-def submit_sensor_data(data: SensorData):
+
+def _values(data: SensorData) -> tuple:
+    return (data.sensor_id, data.start_timestamp, data.end_timestamp, data.value, data.unit)
+
+
+def _check_timestamps(data: SensorData):
     try:
         datetime.datetime.fromisoformat(data.start_timestamp)
         datetime.datetime.fromisoformat(data.end_timestamp)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid timestamp format")
 
-    os.makedirs(CSV_DIR, exist_ok=True)
 
-    # Save to SQLite
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO sensors (sensor_id, start_timestamp, end_timestamp, value, unit)
-        VALUES (?, ?, ?, ?, ?)
-    """, (data.sensor_id, data.start_timestamp, data.end_timestamp, data.value, data.unit))
-    conn.commit()
-    conn.close()
+def _csv_row(data: SensorData) -> dict:
+    return {
+        "Sensor ID": data.sensor_id,
+        "Start Timestamp": data.start_timestamp,
+        "End Timestamp": data.end_timestamp,
+        "Value": data.value,
+        "Unit": data.unit,
+    }
 
-    # Save to CSV
-    write_header = not os.path.exists(CSV_FILE)
-    with open(CSV_FILE, "a", newline="") as f:
-        writer = csv.writer(f)
-        if write_header:
-            writer.writerow(["Sensor ID", "Start Timestamp", "End Timestamp", "Value", "Unit"])
-        writer.writerow([data.sensor_id, data.start_timestamp, data.end_timestamp, data.value, data.unit])
+# 📝 Create new sensor entry
+@sensor_router.post("/")
+def submit_sensor_data(data: SensorData):
+    _check_timestamps(data)
+
+    # SQLite is the primary store; the CSV is a mirror written in the background
+    sqlite_db.execute(DB_PATH, INSERT_SQL, _values(data))
+    csv_store.enqueue([_csv_row(data)])
 
-    return {"message": "✅ Sensor data stored in SQLite and CSV"}
+    return {"message": "✅ Sensor data stored in SQLite and queued for CSV"}
 
 # 📊 Read sensor entries (optional filters)
 @sensor_router.get("/")
 def retrieve_sensor_data(start: str = None, end: str = None):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
     query = "SELECT rowid, sensor_id, start_timestamp, end_timestamp, value, unit FROM sensors WHERE 1=1"
     params = []
 
@@ -69,25 +74,19 @@ def retrieve_sensor_data(start: str = None, end: str = None):
         query += " AND end_timestamp <= ?"
         params.append(end)
 
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    rows = sqlite_db.query(DB_PATH, query, params)
 
     return {"data": rows}
 
 # 📋 Admin view: latest 100 entries
 @sensor_router.get("/admin/sensors")
 def get_sensor_data_for_admin():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+    rows = sqlite_db.query(DB_PATH, """
         SELECT sensor_id, start_timestamp, end_timestamp, value, unit
         FROM sensors
         ORDER BY start_timestamp DESC
         LIMIT 100
     """)
-    rows = cursor.fetchall()
-    conn.close()
 
     data = [
         {
@@ -107,23 +106,15 @@ def update_sensor_entry(
     entry_id: int = Path(..., description="Row ID of the entry to update"),
     updated: SensorData = None
 ):
-    try:
-        datetime.datetime.fromisoformat(updated.start_timestamp)
-        datetime.datetime.fromisoformat(updated.end_timestamp)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid timestamp format")
+    _check_timestamps(updated)
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
+    cursor = sqlite_db.execute(DB_PATH, """
         UPDATE sensors
         SET sensor_id = ?, start_timestamp = ?, end_timestamp = ?, value = ?, unit = ?
         WHERE rowid = ?
-    """, (updated.sensor_id, updated.start_timestamp, updated.end_timestamp, updated.value, updated.unit, entry_id))
+    """, (*_values(updated), entry_id))
     if cursor.rowcount == 0:
         raise HTTPException(status_code=404, detail=f"No entry found with ID {entry_id}")
-    conn.commit()
-    conn.close()
 
     return {"message": f"✅ Entry {entry_id} updated successfully"}
 
@@ -135,36 +126,21 @@ def purge_old_sensor_data(before: str = Query(...)):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid timestamp format")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sensors WHERE end_timestamp < ?", (before,))
-    deleted = cursor.rowcount
-    conn.commit()
-    conn.close()
+    deleted = sqlite_db.execute(DB_PATH, "DELETE FROM sensors WHERE end_timestamp < ?", (before,)).rowcount
 
     return {"message": f"🧹 Deleted {deleted} entries before {before}"}
 
 # 🗑 Delete entries by sensor ID
 @sensor_router.delete("/delete-by-id/")
 def delete_sensor_entries(sensor_id: str = Query(...)):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sensors WHERE sensor_id = ?", (sensor_id,))
-    deleted = cursor.rowcount
-    conn.commit()
-    conn.close()
+    deleted = sqlite_db.execute(DB_PATH, "DELETE FROM sensors WHERE sensor_id = ?", (sensor_id,)).rowcount
 
     return {"message": f"🗑 Deleted {deleted} entries for sensor ID '{sensor_id}'"}
 
 # 🗑 Delete a specific sensor entry by row ID
 @sensor_router.delete("/{entry_id}/")
 def delete_sensor_entry_by_id(entry_id: int = Path(...)):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sensors WHERE rowid = ?", (entry_id,))
-    deleted = cursor.rowcount
-    conn.commit()
-    conn.close()
+    deleted = sqlite_db.execute(DB_PATH, "DELETE FROM sensors WHERE rowid = ?", (entry_id,)).rowcount
 
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"No entry found with ID {entry_id}")
@@ -1,15 +1,23 @@
 # api/sensor_pg.py
-from fastapi import APIRouter, Depends, HTTPException, Form
+import os
+from fastapi import APIRouter, Depends, HTTPException, Form, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import asc
+from sqlalchemy import asc, func
 from datetime import datetime, timedelta
 
 from app.database import get_db
-from app import models
-from app.auth import get_current_active_user  # returns ORM User from DB
+from app import models, downsample, hot_cache, ingest, ingest_buffer, pagination, rollups, sensor_registry, sensor_stats
+from app.auth import get_current_active_user  # returns cached Principal (id, username, is_admin)
+from app.api_key import get_current_client    # Bearer token or X-API-Key (machine clients)
 
 router = APIRouter()
 
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_ERRORS = 100
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Helpers
 # ──────────────────────────────────────────────────────────────────────────────
@@ -59,13 +67,23 @@ def list_sensors(
 @router.get("/api/sensors/{sensor_id}/readings")
 def get_sensor_readings(
     sensor_id: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = pagination.DEFAULT_LIMIT,
+    after: str | None = None,
+    before: str | None = None,
+    order: str = "asc",
     db: Session = Depends(get_db),
     user: models.User = Depends(get_current_active_user),
 ):
     """
-    Return readings for a single sensor.
+    Return one page of readings for a single sensor.
     - Admin: any sensor
     - User : only if they own the sensor
+    - start/end (optional) bound ts, so only the matching partitions are scanned
+    - Keyset-paginated on (ts, id): pass next_cursor back as `after`,
+      prev_cursor as `before`; order=desc lists newest first
+    - Ranges starting inside the hot cache window are paged from memory
     """
     if sensor_id in (None, "", "undefined"):
         raise HTTPException(status_code=400, detail="Invalid or missing sensor_id")
@@ -78,13 +96,23 @@ def get_sensor_readings(
         raise HTTPException(status_code=403, detail="Not authorized for this sensor")
 
     try:
-        rows = (
-            db.query(models.SensorReading)
-            .filter(models.SensorReading.sensor_id == sensor_id)
-            .order_by(models.SensorReading.ts)
-            .all()
-        )
-        return [
+        start, end = ingest.parse_ts(start), ingest.parse_ts(end)
+        cached = hot_cache.cache.read(db, sensor.id, start, end)
+        if cached is not None:
+            rows, next_cursor, prev_cursor = hot_cache.keyset_page(
+                cached, limit=limit, after=after, before=before, descending=(order == "desc"),
+            )
+        else:
+            q = db.query(models.SensorReading).filter(models.SensorReading.sensor_id == sensor_id)
+            if start is not None:
+                q = q.filter(models.SensorReading.ts >= start)
+            if end is not None:
+                q = q.filter(models.SensorReading.ts <= end)
+            rows, next_cursor, prev_cursor = pagination.keyset_page(
+                q, models.SensorReading.ts, models.SensorReading.id,
+                limit=limit, after=after, before=before, descending=(order == "desc"),
+            )
+        items = [
             {
                 "id": r.id,
                 "sensor_name": sensor.name,
@@ -95,11 +123,101 @@ def get_sensor_readings(
             }
             for r in rows
         ]
+        return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ get_sensor_readings error:", e)
         raise HTTPException(status_code=500, detail="Database query failed")
 
 
+@router.get("/api/sensors/{sensor_id}/aggregate")
+def get_sensor_aggregate(
+    sensor_id: str,
+    start: datetime,
+    end: datetime,
+    resolution: str = "1h",
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_active_user),
+):
+    """
+    Bucketed count/avg/min/max/first/last for charts (resolution: 1min, 1h, 1d).
+    Served from the rollup tables, so long ranges don't scan raw readings.
+    """
+    if resolution not in rollups.RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(rollups.RESOLUTIONS)}")
+
+    sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+    if not sensor:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    if not user.is_admin and sensor.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized for this sensor")
+
+    try:
+        return [
+            {
+                "bucket": r.bucket.isoformat(),
+                "count": r.agg.count,
+                "avg": r.agg.avg,
+                "min": r.agg.min,
+                "max": r.agg.max,
+                "first": r.agg.first_value,
+                "last": r.agg.last_value,
+            }
+            for r in rollups.resample(db, [sensor.id], start, end, resolution)
+        ]
+    except Exception as e:
+        print("❌ get_sensor_aggregate error:", e)
+        raise HTTPException(status_code=500, detail="Database query failed")
+
+
+@router.get("/api/sensors/{sensor_id}/series")
+def get_sensor_series(
+    sensor_id: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    points: int = 1000,
+    method: str = "lttb",
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_active_user),
+):
+    """
+    Downsampled series for charts: at most `points` points, whatever the range.
+    - method: lttb (keeps the line's shape) or minmax (keeps spikes)
+    - start/end default to the sensor's first/last reading
+    - stats (count/min/max/avg/first/last) cover the full range, not just the points
+    """
+    if method not in downsample.METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(downsample.METHODS)}")
+
+    sensor = db.query(models.Sensor).filter(models.Sensor.id == sensor_id).first()
+    if not sensor:
+        raise HTTPException(status_code=404, detail="Sensor not found")
+    if not user.is_admin and sensor.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized for this sensor")
+
+    try:
+        start, end = ingest.parse_ts(start), ingest.parse_ts(end)
+        if start is None or end is None:
+            first, last = sensor_stats.extent(db, sensor.id)
+            if first is None:
+                # Not in the catalog yet (before a backfill): two index lookups
+                first, last = (
+                    db.query(func.min(models.SensorReading.ts), func.max(models.SensorReading.ts))
+                    .filter(models.SensorReading.sensor_id == sensor.id)
+                    .one()
+                )
+            if first is None:
+                return {"sensor_id": str(sensor.id), "method": method, "timestamps": [], "values": [], "stats": {"count": 0}}
+            start, end = start or first, end or last
+
+        points = max(3, min(points, downsample.SERIES_MAX_POINTS))
+        return downsample.series(db, sensor.id, start, end, points, method)
+    except Exception as e:
+        print("❌ get_sensor_series error:", e)
+        raise HTTPException(status_code=500, detail="Database query failed")
+
+
 @router.post("/api/sensors/add")
 def add_sensor_reading(
     sensor_name: str = Form(...),
@@ -107,31 +225,43 @@ def add_sensor_reading(
     unit: str = Form(""),
     ts: str | None = Form(None),
     db: Session = Depends(get_db),
-    user: models.User = Depends(get_current_active_user),
+    user: models.User = Depends(get_current_client),
 ):
     """
     Add a new reading.
     - Creates the sensor for this user if it doesn't exist.
     - ts is optional (defaults to now). ts_end = ts + 1 minute.
+    - With INGEST_MODE=buffered the reading is logged locally and
+      acknowledged with 202; the flusher commits it shortly after.
     """
     try:
-        # Find or create sensor for this user
-        sensor = (
-            db.query(models.Sensor)
-            .filter(models.Sensor.name == sensor_name, models.Sensor.owner_id == user.id)
-            .first()
-        )
-        if not sensor:
-            sensor = models.Sensor(name=sensor_name, owner_id=user.id)
-            db.add(sensor)
-            db.commit()
-            db.refresh(sensor)
+        # Find or create sensor for this user (cached; created in this transaction)
+        sensor_id = sensor_registry.get_or_create(db, user.id, sensor_name)
 
         start_time = _parse_dt(ts)
         end_time = start_time + timedelta(minutes=1)
 
+        buffer = ingest_buffer.get_buffer()
+        if buffer is not None:
+            db.commit()  # persist a newly created sensor before acknowledging
+            buffer.append([{
+                "sensor_id": sensor_id,
+                "owner_id": user.id,
+                "ts": start_time,
+                "ts_end": end_time,
+                "value": value,
+                "unit": unit,
+            }])
+            return JSONResponse(status_code=202, content={
+                "status": "queued",
+                "message": f"Reading queued for {sensor_name}",
+                "sensor_id": str(sensor_id),
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+            })
+
         reading = models.SensorReading(
-            sensor_id=sensor.id,
+            sensor_id=sensor_id,
             owner_id=user.id,
             ts=start_time,
             ts_end=end_time,
@@ -139,25 +269,145 @@ def add_sensor_reading(
             unit=unit,
         )
         db.add(reading)
+        db.flush()
+        reading_id = reading.id  # read before commit expires it (no reload afterwards)
         db.commit()
-        db.refresh(reading)
 
         return {
             "status": "success",
             "message": f"Reading added for {sensor_name}",
-            "id": reading.id,
-            "sensor_id": str(sensor.id),
+            "id": reading_id,
+            "sensor_id": str(sensor_id),
             "start_time": start_time.isoformat(),
             "end_time": end_time.isoformat(),
         }
     except HTTPException:
         raise
+    except ingest_buffer.IngestBufferFull:
+        raise HTTPException(status_code=503, detail="Ingest backlog is full, retry later")
     except Exception as e:
         db.rollback()
         print("❌ add_sensor_reading error:", e)
         raise HTTPException(status_code=500, detail="Failed to add reading")
 
 
+def _bulk_load(db: Session, owner_id, body: bytes, content_type: str) -> dict:
+    """Validate a bulk body and load all good rows in one transaction."""
+    now = datetime.utcnow()
+    accepted, errors = [], []
+    for index, record, error in ingest.iter_bulk_records(body, content_type):
+        if len(accepted) + len(errors) >= BULK_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {BULK_MAX_ROWS} readings")
+        if error is None:
+            try:
+                accepted.append((index, ingest.normalize_record(record, now)))
+                continue
+            except ValueError as e:
+                error = str(e)
+        errors.append({"index": index, "error": error})
+
+    # Rows that name their sensor by id must point at one of the caller's sensors
+    owned = ingest.owned_sensor_ids(db, owner_id, (r["sensor_id"] for _, r in accepted if r["sensor_id"]))
+    unknown = [(i, r) for i, r in accepted if r["sensor_id"] and r["sensor_id"] not in owned]
+    if unknown:
+        errors.extend({"index": i, "error": "Unknown sensor_id"} for i, _ in unknown)
+        errors.sort(key=lambda e: e["index"])
+    accepted = [r for _, r in accepted if not r["sensor_id"] or r["sensor_id"] in owned]
+
+    sensor_ids, created = ingest.resolve_sensor_ids(
+        db, owner_id, (r["sensor_name"] for r in accepted if not r["sensor_id"])
+    )
+    rows = [
+        {
+            "sensor_id": r["sensor_id"] or sensor_ids[r["sensor_name"]],
+            "owner_id": owner_id,
+            "ts": r["ts"],
+            "ts_end": r["ts_end"],
+            "value": r["value"],
+            "unit": r["unit"],
+        }
+        for r in accepted
+    ]
+    ingest.load_readings(db, rows)
+    db.commit()
+
+    return {
+        "status": "success" if not errors else "partial",
+        "accepted": len(rows),
+        "rejected": len(errors),
+        "sensors_created": created,
+        "errors": errors[:BULK_MAX_ERRORS],
+    }
+
+
+@router.post("/api/sensors/bulk")
+async def add_sensor_readings_bulk(
+    request: Request,
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_client),
+):
+    """
+    Add many readings across many sensors in one transaction.
+    - Body: JSON array, NDJSON (application/x-ndjson) or CSV (text/csv) with a header row.
+    - Fields: sensor_name or sensor_id (one of your sensors), value, unit, ts, ts_end
+      (legacy CSV headers are accepted too).
+    - Invalid rows are rejected individually; the rest are loaded with COPY.
+    - Bodies over BULK_MAX_BYTES are refused with 413.
+    - Accepts a Bearer token or an X-API-Key header.
+    """
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > BULK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Body exceeds {BULK_MAX_BYTES} bytes")
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > BULK_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {BULK_MAX_BYTES} bytes")
+    content_type = request.headers.get("content-type", "application/json")
+    try:
+        return await run_in_threadpool(_bulk_load, db, user.id, body, content_type)
+    except HTTPException:
+        raise
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        print("❌ add_sensor_readings_bulk error:", e)
+        raise HTTPException(status_code=500, detail="Failed to load readings")
+
+
+@router.get("/api/sensors/catalog")
+def get_sensor_catalog(
+    db: Session = Depends(get_db),
+    user: models.User = Depends(get_current_active_user),
+):
+    """
+    Every visible sensor with first_ts, last_ts, row_count, last_value and
+    last_ingest_at, read from the sensor_stats catalog.
+    - Admin: all sensors
+    - User : own sensors
+    """
+    return sensor_stats.catalog(db, owner_id=None if user.is_admin else user.id)
+
+
+@router.get("/api/sensors/ingest/stats")
+def ingest_stats(user: models.User = Depends(get_current_active_user)):
+    """Write-behind buffer queue depth and flush latency (admin only)."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    buffer = ingest_buffer.get_buffer()
+    return buffer.stats() if buffer else {"mode": ingest_buffer.INGEST_MODE}
+
+
+@router.get("/api/sensors/hot-cache/stats")
+def hot_cache_stats(user: models.User = Depends(get_current_active_user)):
+    """Hot series cache size, hit rate and evictions for this worker (admin only)."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return hot_cache.cache.stats()
+
+
 @router.put("/api/sensors/update/{reading_id}")
 def update_sensor_reading(
     reading_id: int,
@@ -180,7 +430,6 @@ def update_sensor_reading(
         r.value = value
         r.unit = unit
         db.commit()
-        db.refresh(r)
         return {"status": "success", "message": "Reading updated"}
     except HTTPException:
         raise
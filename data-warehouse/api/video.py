@@ -1,7 +1,7 @@
-from fastapi import APIRouter, UploadFile, Depends, HTTPException
-from fastapi.responses import StreamingResponse
-from app.storage.minio_client import client, BUCKET
+from fastapi import APIRouter, UploadFile, Depends, Request
 from app.authz import require_role
+from app.object_store import video_store
+from app.utils.object_stream import object_response
 import uuid
 
 
@@ -10,25 +10,20 @@ video_router = APIRouter(prefix='/api/video', tags=['Videos'])
 
 @video_router.post('/')
 async def upload_video(file: UploadFile, user=Depends(require_role('user'))):
-key = f"{uuid.uuid4()}-{file.filename}"
-size = 0
-data = await file.read()
-size = len(data)
-client.put_object(BUCKET, key, io.BytesIO(data), length=size, content_type=file.content_type)
-# save DB row (id, key, size, owner_id)
-return { 'message': 'uploaded', 'key': key }
+    key = f"{uuid.uuid4()}-{file.filename}"
+    # Streams the spooled upload (multipart) on the object-store pool, off the event loop
+    size = await video_store.put(key, file.file, content_type=file.content_type or 'video/mp4')
+    # save DB row (id, key, size, owner_id)
+    return { 'message': 'uploaded', 'key': key, 'size': size }
 
 
 @video_router.get('/{key}')
-async def get_video(key: str):
-try:
-obj = client.get_object(BUCKET, key)
-return StreamingResponse(obj, media_type='video/mp4')
-except Exception:
-raise HTTPException(404, 'Not found')
+async def get_video(key: str, request: Request):
+    # Honours Range / If-None-Match, so seeking in a player fetches only the needed bytes
+    return await object_response(request, video_store, key, media_type='video/mp4')
 
 
 @video_router.delete('/{key}')
 async def delete_video(key: str, user=Depends(require_role('admin'))):
-client.remove_object(BUCKET, key)
-return { 'message': 'deleted' }
\ No newline at end of file
+    await video_store.remove(key)
+    return { 'message': 'deleted' }
@@ -0,0 +1,83 @@
+# api/video_upload.py
+"""
+Resumable chunked video upload (see app/video_uploads.py):
+
+    POST   /api/videos/uploads                      → {id, part_size, ...}
+    PUT    /api/videos/uploads/{id}/parts/{n}       raw bytes of part n (X-Checksum-SHA256 optional)
+    GET    /api/videos/uploads/{id}                 parts received so far (resume from here)
+    POST   /api/videos/uploads/{id}/complete
+    GET    /api/videos/uploads/{id}/content         the assembled video (Range / If-None-Match supported)
+    DELETE /api/videos/uploads/{id}                 abort
+"""
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app import models, video_uploads
+from app.auth import get_current_active_user
+from app.database import get_db
+from app.schemas import VideoUploadInit
+from app.object_store import store
+from app.utils.object_stream import object_response
+
+router = APIRouter(prefix="/api/videos/uploads", tags=["Videos"])
+
+
+@router.post("")
+async def init_upload(body: VideoUploadInit, user: models.User = Depends(get_current_active_user),
+                      db: Session = Depends(get_db)):
+    return await video_uploads.init_upload(db, user, body.filename, body.content_type, body.part_size, body.size_bytes)
+
+
+@router.get("/{video_id}")
+def upload_status(video_id: str, user: models.User = Depends(get_current_active_user),
+                  db: Session = Depends(get_db)):
+    return video_uploads.describe(video_uploads.get_upload(db, video_id, user))
+
+
+@router.put("/{video_id}/parts/{part_number}")
+async def upload_part(
+    video_id: str,
+    part_number: int,
+    request: Request,
+    x_checksum_sha256: str | None = Header(None),
+    user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """Body is the raw part (at most the upload's part_size bytes); parts may be sent in parallel."""
+    video = await run_in_threadpool(video_uploads.get_upload, db, video_id, user)
+    limit = video.part_size
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail=f"Part exceeds part_size ({limit} bytes)")
+
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > limit:
+            raise HTTPException(status_code=413, detail=f"Part exceeds part_size ({limit} bytes)")
+    return await video_uploads.put_part(db, video, part_number, data, x_checksum_sha256)
+
+
+@router.post("/{video_id}/complete")
+async def complete_upload(video_id: str, user: models.User = Depends(get_current_active_user),
+                          db: Session = Depends(get_db)):
+    video = await run_in_threadpool(video_uploads.get_upload, db, video_id, user)
+    return await video_uploads.complete_upload(db, video)
+
+
+@router.get("/{video_id}/content")
+async def upload_content(video_id: str, request: Request, user: models.User = Depends(get_current_active_user),
+                         db: Session = Depends(get_db)):
+    """Stream a completed upload (owner or admin)."""
+    video = await run_in_threadpool(video_uploads.get_upload, db, video_id, user)
+    if video.status != "complete":
+        raise HTTPException(status_code=409, detail=f"Upload is {video.status}")
+    return await object_response(request, store, video.object_key, media_type=video.content_type)
+
+
+@router.delete("/{video_id}")
+async def abort_upload(video_id: str, user: models.User = Depends(get_current_active_user),
+                       db: Session = Depends(get_db)):
+    video = await run_in_threadpool(video_uploads.get_upload, db, video_id, user)
+    return await video_uploads.abort_upload(db, video)
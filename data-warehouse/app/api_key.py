@@ -1,9 +1,26 @@
 # app/api_key.py
+import os
+import hmac
+import time
+import hashlib
 import secrets
-import sqlite3
-from fastapi import HTTPException
+import threading
+from collections import OrderedDict
+from fastapi import Depends, Header, HTTPException
+from sqlalchemy.orm import Session
 
-DB_PATH = "datawarehouse.db"
+from app import models, pg_notify
+from app.auth import Principal, principal_cache, get_current_active_user
+from app.database import get_db
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+API_KEY_PEPPER = os.getenv("API_KEY_PEPPER", "").encode()
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "300"))          # valid keys
+API_KEY_NEGATIVE_TTL = float(os.getenv("API_KEY_NEGATIVE_TTL", "30"))     # unknown keys
+API_KEY_CACHE_MAX = int(os.getenv("API_KEY_CACHE_MAX", "50000"))
+API_KEY_CHANNEL = "api_key_cache"
 
 # ───────────────────────────────────────────────
 # 🔑 API Key Utilities
@@ -14,42 +31,134 @@ def generate_api_key() -> str:
     return secrets.token_hex(16)
 
 
-def get_user_by_api_key(api_key: str):
-    """Validate an API key and return basic user info."""
+def hash_api_key(api_key: str) -> str:
+    """Keys are high-entropy, so a keyed SHA-256 is enough (and indexable)."""
+    return hmac.new(API_KEY_PEPPER, api_key.encode(), hashlib.sha256).hexdigest()
+
+
+class ApiKeyCache:
+    """
+    key hash → Principal, with negative entries (None) for unknown keys.
+    Positive entries also carry the user's principal-cache version, so a
+    password change or admin demotion invalidates them too.
+    """
+
+    def __init__(self, maxsize: int = API_KEY_CACHE_MAX):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # hash → (expires_at, version, principal | None)
+        self._lock = threading.Lock()
+
+    def get(self, key_hash: str):
+        """Return (hit, principal)."""
+        with self._lock:
+            entry = self._entries.get(key_hash)
+        if entry is None:
+            return False, None
+        expires_at, version, principal = entry
+        if expires_at <= time.time() or (
+            principal is not None and version != principal_cache.version(principal.username)
+        ):
+            self.invalidate(key_hash)
+            return False, None
+        return True, principal
+
+    def put(self, key_hash: str, principal, version=None):
+        ttl = API_KEY_CACHE_TTL if principal is not None else API_KEY_NEGATIVE_TTL
+        with self._lock:
+            self._entries[key_hash] = (time.time() + ttl, version, principal)
+            self._entries.move_to_end(key_hash)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key_hash: str = None):
+        with self._lock:
+            if key_hash is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key_hash, None)
+
+
+api_key_cache = ApiKeyCache()
+pg_notify.subscribe(API_KEY_CHANNEL, api_key_cache.invalidate)
+
+
+def get_user_by_api_key(api_key: str, db: Session):
+    """Validate an API key and return the owning Principal (or None)."""
     if not api_key:
         return None
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT id, username, is_admin FROM users WHERE api_key=?", (api_key,))
-    row = c.fetchone()
-    conn.close()
+    key_hash = hash_api_key(api_key)
+    hit, principal = api_key_cache.get(key_hash)
+    if hit:
+        return principal
 
-    if row:
-        return {"id": row[0], "username": row[1], "is_admin": bool(row[2])}
-    return None
+    user = db.query(models.User).filter(models.User.api_key_hash == key_hash).first()
+    if user is None:
+        api_key_cache.put(key_hash, None)
+        return None
 
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        is_admin=bool(user.is_admin),
+        created_at=user.created_at,
+    )
+    api_key_cache.put(key_hash, principal, principal_cache.version(user.username))
+    return principal
 
-def assign_api_key_to_user(username: str) -> str:
-    """Generate a new API key and assign it to a specific user."""
-    api_key = generate_api_key()
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE users SET api_key=? WHERE username=?", (api_key, username))
-    if c.rowcount == 0:
-        conn.close()
+def _set_key_hash(username: str, key_hash, db: Session):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None:
         raise HTTPException(status_code=404, detail=f"User '{username}' not found")
-    conn.commit()
-    conn.close()
+    old_hash = user.api_key_hash
+    user.api_key_hash = key_hash
+    for h in (old_hash, key_hash):
+        if h:
+            pg_notify.publish(db, API_KEY_CHANNEL, h)
+    db.commit()
+    for h in (old_hash, key_hash):
+        if h:
+            api_key_cache.invalidate(h)
 
+
+def assign_api_key_to_user(username: str, db: Session) -> str:
+    """Generate a new API key for a user; only its hash is stored."""
+    api_key = generate_api_key()
+    _set_key_hash(username, hash_api_key(api_key), db)
     return api_key
 
 
-def revoke_api_key(username: str):
+def revoke_api_key(username: str, db: Session):
     """Remove API key for a given user."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE users SET api_key=NULL WHERE username=?", (username,))
-    conn.commit()
-    conn.close()
+    _set_key_hash(username, None, db)
+
+
+# ───────────────────────────────────────────────
+# 🚪 Auth dependencies (Bearer token or X-API-Key)
+# ───────────────────────────────────────────────
+def get_optional_client(
+    authorization: str = Header(None),
+    x_api_key: str = Header(None),
+    db: Session = Depends(get_db),
+):
+    """
+    Principal from X-API-Key or a Bearer token; None when neither is sent.
+    None means anonymous: only for routes that serve public data, and they
+    must grant it nothing beyond that. Data routes use get_current_client.
+    """
+    if x_api_key:
+        principal = get_user_by_api_key(x_api_key, db)
+        if principal is None:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        return principal
+    if authorization:
+        return get_current_active_user(authorization, db)
+    return None
+
+
+def get_current_client(client=Depends(get_optional_client)) -> Principal:
+    """Like get_current_active_user, but machine clients may use X-API-Key."""
+    if client is None:
+        raise HTTPException(status_code=401, detail="Missing Authorization header or X-API-Key")
+    return client
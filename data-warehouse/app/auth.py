@@ -1,11 +1,19 @@
 # app/auth.py
+import os
+import time
+import uuid
 import bcrypt
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, Header
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import SessionLocal, get_db
 from app.models import User
+from app import pg_notify
 
 # ─────────────────────────────
 # 🔐 JWT Config
@@ -14,6 +22,10 @@ SECRET_KEY = "super_secret_key_12345"  # use your own unique key!
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds
+PRINCIPAL_CACHE_MAX = int(os.getenv("PRINCIPAL_CACHE_MAX", "10000"))
+PRINCIPAL_CHANNEL = "principal_cache"
+
 # ─────────────────────────────
 # 🔑 Password Hashing
 # ─────────────────────────────
@@ -32,29 +44,155 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# ─────────────────────────────
+# 🪪 Principal Cache (token → user)
+# ─────────────────────────────
+@dataclass(frozen=True)
+class Principal:
+    """The user fields routes rely on, detached from any DB session."""
+    id: uuid.UUID
+    username: str
+    is_admin: bool
+    created_at: datetime | None = None
+
+
+class PrincipalCache:
+    """
+    TTL-bounded token → Principal cache. Entries are stamped with the
+    username's version; invalidate() bumps it so every token of that
+    user misses on its next use.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, maxsize: int = PRINCIPAL_CACHE_MAX):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # token → (expires_at, version, principal)
+        self._versions: dict[str, int] = {}
+        self._epoch = 0  # bumped by a full invalidation
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, version, principal = entry
+            if expires_at <= time.time() or version != self._version(principal.username):
+                del self._entries[token]
+                return None
+            return principal
+
+    def put(self, token: str, principal: Principal, token_exp, version: tuple):
+        expires_at = time.time() + self.ttl
+        if token_exp:
+            expires_at = min(expires_at, float(token_exp))
+        with self._lock:
+            if version != self._version(principal.username):
+                return  # invalidated while we were reading the DB
+            self._entries[token] = (expires_at, version, principal)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def _version(self, username: str) -> tuple:
+        return (self._epoch, self._versions.get(username, 0))
+
+    def version(self, username: str) -> tuple:
+        with self._lock:
+            return self._version(username)
+
+    def invalidate(self, username: str = None):
+        """Invalidate one user's tokens, or every entry when username is None."""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                self._versions[username] = self._versions.get(username, 0) + 1
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_principal(username: str = None):
+    """Drop cached principals for a user (or everyone) in this worker."""
+    principal_cache.invalidate(username)
+
+
+# Password, admin-flag and username changes (and deletes) must not be served
+# from cache: NOTIFY reaches every worker on commit, and this worker also
+# drops the entry after its own commit.
+_INVALIDATE_KEY = "principal_invalidate"
+
+
+def _queue_invalidation(connection, target, username: str):
+    inspect(target).session.info.setdefault(_INVALIDATE_KEY, set()).add(username)
+    pg_notify.publish(connection, PRINCIPAL_CHANNEL, username)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[a].history.has_changes() for a in ("hashed_password", "is_admin", "username")):
+        old_name = (state.attrs.username.history.deleted or [target.username])[0]
+        _queue_invalidation(connection, target, old_name)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _queue_invalidation(connection, target, target.username)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _invalidate_committed(session):
+    for username in session.info.pop(_INVALIDATE_KEY, ()):
+        invalidate_principal(username)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop(_INVALIDATE_KEY, None)
+
+
+pg_notify.subscribe(PRINCIPAL_CHANNEL, invalidate_principal)
+
 # ─────────────────────────────
 # 👤 Verify JWT Token
 # ─────────────────────────────
-def get_current_active_user(authorization: str = Header(...)):
-    """Validate Bearer token from request headers."""
+def get_current_active_user(
+    authorization: str = Header(...),
+    db: Session = Depends(get_db),
+) -> Principal:
+    """
+    Validate Bearer token from request headers (cached per token).
+    Uses the request's shared session, so a cache miss costs no extra checkout.
+    """
     if not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
 
     token = authorization.split(" ")[1]
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-
-        db = SessionLocal()
-        user = db.query(User).filter(User.username == username).first()
-        db.close()
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+    username = payload.get("sub")
+    if not username:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        return user
+    version = principal_cache.version(username)
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        is_admin=bool(user.is_admin),
+        created_at=user.created_at,
+    )
 
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    principal_cache.put(token, principal, payload.get("exp"), version)
+    return principal
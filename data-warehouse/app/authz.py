@@ -49,9 +49,11 @@ def create_access_token(data: dict, expires_delta: datetime.timedelta | None = N
 # ───────────────────────────────────────────────
 # 👤 Dependency: Get current user from JWT
 # ───────────────────────────────────────────────
-def get_current_active_user(token: str = Depends(oauth2_scheme)):
-    """Decode JWT and return user from DB"""
-    db: Session = database.SessionLocal()
+def get_current_active_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(database.get_db),
+):
+    """Decode JWT and return user from the request's shared DB session"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -69,5 +71,3 @@ def get_current_active_user(token: str = Depends(oauth2_scheme)):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    finally:
-        db.close()
@@ -0,0 +1,152 @@
+# app/downsample.py
+"""
+Chart downsampling with NumPy.
+
+- lttb   : Largest-Triangle-Three-Buckets; keeps the visual shape of a line.
+- minmax : per time bucket, the minimum and maximum point (spikes survive).
+
+Both take x as float64 (e.g. epoch ms) sorted ascending and return the
+indices of the points to keep, so callers can slice any parallel arrays.
+"""
+import os
+import datetime as dt
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app import hot_cache, models, rollups
+
+METHODS = ("lttb", "minmax")
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of n points chosen by LTTB (first and last are always kept)."""
+    size = len(x)
+    if n >= size or size <= 2:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1])
+
+    x = x - x[0]  # keep the triangle areas well-conditioned
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)  # n-2 buckets over x[1:-1]
+    counts = np.diff(edges)
+    # Mean point of every bucket in one pass; the last bucket looks ahead to the final point
+    mean_x = np.add.reduceat(x[:-1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:-1], edges[:-1]) / counts
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - mean_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (mean_y[i] - y[a])
+        )
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the min and max point in each of n/2 equal-width time buckets."""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+
+    buckets = max(1, n // 2)
+    span = x[-1] - x[0]
+    seg = np.minimum(((x - x[0]) * buckets / span).astype(np.int64), buckets - 1) if span else np.zeros(size, np.int64)
+    # Sorting by (bucket, y) puts each bucket's min first and max last
+    order = np.lexsort((y, seg))
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(seg)) + 1))
+    ends = np.append(starts[1:], size) - 1
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def downsample(method: str, x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    if method == "minmax":
+        return minmax(x, y, n)
+    return lttb(x, y, n)
+
+
+# ───────────────────────────────────────────────
+# 📈 Series for one sensor
+# ───────────────────────────────────────────────
+SERIES_MAX_POINTS = 10000
+SERIES_RAW_MAX = int(os.getenv("SERIES_RAW_MAX", "500000"))  # above this, read rollups instead of raw rows
+
+
+def _epoch_ms(ts) -> np.ndarray:
+    return np.array(ts, dtype="datetime64[us]").astype(np.int64) / 1000.0
+
+
+def series(db: Session, sensor_id, start: dt.datetime, end: dt.datetime, points: int, method: str) -> dict:
+    """
+    At most `points` points of one sensor between start and end, plus exact
+    stats for the whole range. Ranges with more than SERIES_RAW_MAX readings
+    are downsampled from the finest rollup that fits instead of raw rows;
+    ranges inside the hot cache window are served from memory.
+    """
+    totals, raw_count = None, 0
+    cached = hot_cache.cache.read(db, sensor_id, start, end)
+    if cached is None:
+        for r in rollups.resample(db, [sensor_id], start, end, "1d"):
+            totals = r.agg if totals is None else totals.merge(r.agg)
+        raw_count = totals.count if totals else 0
+
+    source = "raw"
+    if cached is not None:
+        source = "cache"
+        ts = cached.ts.astype("datetime64[us]")
+        y = cached.value
+    elif raw_count <= SERIES_RAW_MAX:
+        rows = (
+            db.query(models.SensorReading.ts, models.SensorReading.value)
+            .filter(
+                models.SensorReading.sensor_id == sensor_id,
+                models.SensorReading.ts >= start,
+                models.SensorReading.ts <= end,
+            )
+            .order_by(models.SensorReading.ts, models.SensorReading.id)
+            .limit(SERIES_RAW_MAX)
+            .all()
+        )
+        ts = np.array([r[0] for r in rows], dtype="datetime64[us]")
+        y = np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows))
+    else:
+        span = end - start
+        source = next((res for res in rollups.RESOLUTIONS if span / rollups.STEP[res] <= SERIES_RAW_MAX), "1d")
+        buckets = rollups.resample(db, [sensor_id], start, end, source)
+        if method == "minmax":
+            # Each bucket becomes its min and max, so spikes stay visible
+            half = rollups.STEP[source] / 2
+            ts = np.array([t for b in buckets for t in (b.bucket, b.bucket + half)], dtype="datetime64[us]")
+            y = np.array([v for b in buckets for v in (b.agg.min, b.agg.max)], dtype=np.float64)
+        else:
+            ts = np.array([b.bucket for b in buckets], dtype="datetime64[us]")
+            y = np.array([b.agg.avg for b in buckets], dtype=np.float64)
+
+    keep = downsample(method, _epoch_ms(ts), y, points) if len(y) else np.arange(0)
+    if totals is None and len(y):
+        # Cached, or rollups not backfilled yet for this range: stats from the raw points
+        totals = rollups.Agg(len(y), float(y.sum()), float(y.min()), float(y.max()), None, float(y[0]), None, float(y[-1]))
+        raw_count = len(y)
+    return {
+        "sensor_id": str(sensor_id),
+        "method": method,
+        "source": source,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "timestamps": np.datetime_as_string(ts[keep], unit="ms").tolist(),
+        "values": y[keep].tolist(),
+        "stats": {
+            "count": raw_count,
+            "min": totals.min if totals else None,
+            "max": totals.max if totals else None,
+            "avg": totals.avg if totals else None,
+            "first": totals.first_value if totals else None,
+            "last": totals.last_value if totals else None,
+        },
+    }
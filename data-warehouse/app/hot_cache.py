@@ -0,0 +1,367 @@
+# app/hot_cache.py
+"""
+In-process hot-series cache: each active sensor's last HOT_CACHE_WINDOW
+seconds of readings held as contiguous NumPy columns (ts, ts_end, id,
+value, unit code), ordered by (ts, id).
+
+A series is loaded on the first read whose range starts inside the window.
+Afterwards it is kept current incrementally: every commit that writes,
+edits or deletes readings marks the sensor "stale from" the earliest ts it
+touched (locally after commit, and for other workers via pg_notify). The
+next read fetches only rows from that point on — one range scan on
+(sensor_id, ts, id) — and splices them onto the buffer. Rows that fall
+out of the window are trimmed from the front, and the whole cache is
+bounded by HOT_CACHE_MAX_BYTES with LRU eviction.
+"""
+import os
+import threading
+import datetime as dt
+from collections import OrderedDict, namedtuple
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from app import models, pagination, pg_notify, reading_changes
+from app.reading_changes import sensor_uuid
+from app.database import SessionLocal
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+HOT_CACHE_ENABLED = os.getenv("HOT_CACHE_ENABLED", "1") == "1"
+HOT_CACHE_WINDOW = dt.timedelta(seconds=float(os.getenv("HOT_CACHE_WINDOW", "86400")))
+HOT_CACHE_MAX_BYTES = int(os.getenv("HOT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CHANNEL = "hot_cache"
+NOTIFY_BATCH = 80  # sensors per notification (payloads are capped at 8000 bytes)
+_PENDING_KEY = "hot_cache_pending"
+
+_COLUMNS = (("ts", np.int64), ("ts_end", np.int64), ("id", np.int64), ("value", np.float64), ("unit", np.int16))
+NAT = np.iinfo(np.int64).min  # datetime64 NaT as int64 (missing ts_end)
+
+Window = namedtuple("Window", "ts ts_end id value unit units")
+CachedReading = namedtuple("CachedReading", "id ts ts_end value unit")
+
+
+def to_us(ts: dt.datetime) -> int:
+    return int(np.datetime64(ts, "us").astype(np.int64))
+
+
+# ───────────────────────────────────────────────
+# 🧱 Column buffer for one sensor
+# ───────────────────────────────────────────────
+class SeriesBuffer:
+    """Append-mostly columns; live rows are cols[start:end], always contiguous."""
+
+    def __init__(self, capacity: int = 1024):
+        self.cols = {name: np.empty(capacity, dtype) for name, dtype in _COLUMNS}
+        self.start = 0
+        self.end = 0
+        self.units = []        # unit code → unit string
+        self._unit_codes = {}
+        self.covered_from = None   # µs; every reading with ts >= covered_from is held
+        self.stale_from = None     # µs; rows from here on may be out of date
+        self.counted = 0           # bytes of this buffer included in HotCache's running total
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.cols.values())
+
+    def view(self, name: str) -> np.ndarray:
+        return self.cols[name][self.start:self.end]
+
+    def _reserve(self, extra: int):
+        capacity = len(self.cols["ts"])
+        if self.end + extra <= capacity:
+            return
+        size = len(self)
+        # Compact in place when at least half is free, otherwise grow ×2
+        new_capacity = capacity if size + extra <= capacity // 2 else max(capacity * 2, size + extra)
+        for name, dtype in _COLUMNS:
+            col = np.empty(new_capacity, dtype) if new_capacity != capacity else self.cols[name]
+            col[:size] = self.cols[name][self.start:self.end]
+            self.cols[name] = col
+        self.start, self.end = 0, size
+
+    def _unit_code(self, unit) -> int:
+        unit = unit or ""
+        code = self._unit_codes.get(unit)
+        if code is None:
+            code = self._unit_codes[unit] = len(self.units)
+            self.units.append(unit)
+        return code
+
+    def splice(self, from_us: int, rows):
+        """Replace every row with ts >= from_us by rows (id, ts, ts_end, value, unit), ordered by (ts, id)."""
+        self.end = self.start + int(np.searchsorted(self.view("ts"), from_us, "left"))
+        n = len(rows)
+        if not n:
+            return
+        self._reserve(n)
+        lo, hi = self.end, self.end + n
+        self.cols["id"][lo:hi] = [r[0] for r in rows]
+        self.cols["ts"][lo:hi] = np.array([r[1] for r in rows], dtype="datetime64[us]").astype(np.int64)
+        self.cols["ts_end"][lo:hi] = np.array([r[2] for r in rows], dtype="datetime64[us]").astype(np.int64)
+        self.cols["value"][lo:hi] = [r[3] for r in rows]
+        self.cols["unit"][lo:hi] = [self._unit_code(r[4]) for r in rows]
+        self.end = hi
+
+    def trim_before(self, from_us: int):
+        self.start += int(np.searchsorted(self.view("ts"), from_us, "left"))
+        self.covered_from = from_us
+
+    def window(self, start_us: int, end_us: int | None) -> Window:
+        """Copies of the rows with start <= ts <= end (safe to use after the lock is released)."""
+        ts = self.view("ts")
+        lo = int(np.searchsorted(ts, start_us, "left"))
+        hi = len(ts) if end_us is None else int(np.searchsorted(ts, end_us, "right"))
+        return Window(*(self.view(name)[lo:hi].copy() for name, _ in _COLUMNS), list(self.units))
+
+
+# ───────────────────────────────────────────────
+# 🔥 Cache
+# ───────────────────────────────────────────────
+class HotCache:
+    def __init__(self, window: dt.timedelta = HOT_CACHE_WINDOW, max_bytes: int = HOT_CACHE_MAX_BYTES):
+        self.window = window
+        self.max_bytes = max_bytes
+        self._series = OrderedDict()  # sensor id → SeriesBuffer (LRU order)
+        self._bytes = 0               # running total of every cached buffer's size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def covers(self, start: dt.datetime | None) -> bool:
+        return HOT_CACHE_ENABLED and start is not None and start >= dt.datetime.utcnow() - self.window
+
+    def read(self, db, sensor_id, start: dt.datetime | None, end: dt.datetime | None = None) -> Window | None:
+        """Readings of one sensor with start <= ts <= end, or None if the range isn't cacheable."""
+        if not self.covers(start):
+            return None
+        sid = sensor_uuid(sensor_id)
+        with self._lock:
+            series = self._series.get(sid)
+            if series is None:
+                series = self._series[sid] = SeriesBuffer()
+                self._account(series)
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._series.move_to_end(sid)
+
+        with series.lock:
+            now = dt.datetime.utcnow()
+            with self._lock:
+                stale, series.stale_from = series.stale_from, None
+            if series.covered_from is None:
+                floor = now - self.window
+                series.splice(to_us(floor), self._fetch(db, sid, floor))
+                series.covered_from = to_us(floor)
+            elif stale is not None:
+                since = max(stale, series.covered_from)
+                series.splice(since, self._fetch(db, sid, np.datetime64(since, "us").astype(dt.datetime)))
+            # Trim once a tenth of a window has aged out, not on every read
+            floor_us = to_us(now - self.window)
+            if floor_us - series.covered_from > self.window.total_seconds() * 1e5:
+                series.trim_before(floor_us)
+            result = series.window(to_us(start), to_us(end) if end is not None else None)
+            with self._lock:
+                if self._series.get(sid) is series:  # not evicted/invalidated meanwhile
+                    self._account(series)
+
+        self._evict(keep=sid)
+        return result
+
+    @staticmethod
+    def _fetch(db, sid, since: dt.datetime):
+        r = models.SensorReading
+        return (
+            db.query(r.id, r.ts, r.ts_end, r.value, r.unit)
+            .filter(r.sensor_id == sid, r.ts >= since)
+            .order_by(r.ts, r.id)
+            .all()
+        )
+
+    def _account(self, series: SeriesBuffer):
+        """Fold a buffer's size change into the running total (caller holds self._lock)."""
+        size = series.nbytes
+        self._bytes += size - series.counted
+        series.counted = size
+
+    def _drop(self, sid):
+        """Remove one series and its bytes from the total (caller holds self._lock)."""
+        series = self._series.pop(sid, None)
+        if series is not None:
+            self._bytes -= series.counted
+
+    def _evict(self, keep=None):
+        with self._lock:
+            for sid in list(self._series):
+                if self._bytes <= self.max_bytes:
+                    break
+                if sid == keep and len(self._series) > 1:
+                    continue
+                self._drop(sid)
+                self.evictions += 1
+
+    def mark_stale(self, sensor_id, ts: dt.datetime | None = None):
+        """Rows of sensor_id from ts on changed (None: everything cached for it)."""
+        sid = sensor_uuid(sensor_id)
+        with self._lock:
+            series = self._series.get(sid)
+            if series is None:
+                return
+            since = to_us(ts) if ts is not None else (series.covered_from or NAT)
+            series.stale_from = since if series.stale_from is None else min(series.stale_from, since)
+
+    def invalidate(self, sensor_id=None):
+        with self._lock:
+            if sensor_id is None:
+                self._series.clear()
+                self._bytes = 0
+            else:
+                self._drop(sensor_uuid(sensor_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": HOT_CACHE_ENABLED,
+                "window_seconds": self.window.total_seconds(),
+                "sensors": len(self._series),
+                "rows": sum(len(s) for s in self._series.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = HotCache()
+
+
+def readings(window: Window) -> list[CachedReading]:
+    """Materialise a window as reading-like rows (.id, .ts, .ts_end, .value, .unit)."""
+    ts = window.ts.astype("datetime64[us]").tolist()
+    ts_end = window.ts_end.astype("datetime64[us]").tolist()
+    return [
+        CachedReading(int(i), t, e, float(v), window.units[u])
+        for i, t, e, v, u in zip(window.id, ts, ts_end, window.value, window.unit)
+    ]
+
+
+def keyset_page(window: Window, limit: int = pagination.DEFAULT_LIMIT,
+                after: str | None = None, before: str | None = None, descending: bool = False):
+    """pagination.keyset_page over a cached window: (rows, next_cursor, prev_cursor)."""
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+    limit = max(1, min(limit, pagination.MAX_LIMIT))
+    ts, ids = window.ts, window.id
+    mask = np.ones(len(ts), dtype=bool)
+    for cursor, newer in ((after, not descending), (before, descending)):
+        if not cursor:
+            continue
+        cts, cid = pagination.decode_cursor(cursor)
+        cts = to_us(cts)
+        if newer:
+            mask &= (ts > cts) | ((ts == cts) & (ids > cid))
+        else:
+            mask &= (ts < cts) | ((ts == cts) & (ids < cid))
+
+    idx = np.flatnonzero(mask)  # ascending (ts, id)
+    if descending != bool(before):
+        idx = idx[::-1]
+    more = len(idx) > limit
+    idx = idx[:limit]
+    if before:
+        idx = idx[::-1]
+    rows = readings(window._replace(**{f: getattr(window, f)[idx] for f in ("ts", "ts_end", "id", "value", "unit")}))
+    return (rows, *pagination.page_cursors(rows, more, after, before))
+
+
+# ───────────────────────────────────────────────
+# ♻️ Change tracking
+# ───────────────────────────────────────────────
+def _earliest(changes: dict, sensor_id, ts):
+    if sensor_id is None or ts is None:
+        return
+    sid = sensor_uuid(sensor_id)
+    changes[sid] = ts if sid not in changes else min(changes[sid], ts)
+
+
+def note_writes(db, conn, rows):
+    """Record readings written with Core (bulk/COPY) in the current transaction."""
+    if not HOT_CACHE_ENABLED:
+        return
+    changes = {}
+    for r in rows:
+        _earliest(changes, r.get("sensor_id"), r.get("ts"))
+    _record(db, conn, changes)
+
+
+def _record(session, conn, changes: dict):
+    if not changes:
+        return
+    pending = session.info.setdefault(_PENDING_KEY, {})
+    for sid, ts in changes.items():
+        if sid not in pending or pending[sid] is not None:
+            _earliest(pending, sid, ts)
+    # Delivered to other workers only if this transaction commits
+    items = [[str(sid), ts.isoformat()] for sid, ts in changes.items()]
+    for i in range(0, len(items), NOTIFY_BATCH):
+        pg_notify.publish(conn, CHANNEL, items[i:i + NOTIFY_BATCH])
+
+
+def _on_reading_changes(session, conn, changes):
+    """Readings added, edited or deleted through the ORM; deleted sensors are dropped outright."""
+    if not HOT_CACHE_ENABLED:
+        return
+    stale = {}
+    for r in changes.inserted:
+        _earliest(stale, r["sensor_id"], r["ts"])
+    for sid, ts in changes.deleted:
+        _earliest(stale, sid, ts)
+    for e in changes.edited:
+        _earliest(stale, e.old_sensor_id, e.old_ts)
+        _earliest(stale, e.sensor_id, e.ts)
+    for sid in changes.removed_sensors:
+        stale.pop(sid, None)
+        session.info.setdefault(_PENDING_KEY, {})[sid] = None
+    if changes.removed_sensors:
+        pg_notify.publish(conn, CHANNEL, [[str(sid), None] for sid in changes.removed_sensors])
+    _record(session, conn, stale)
+
+
+reading_changes.subscribe(_on_reading_changes)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply_pending(session):
+    for sid, ts in session.info.pop(_PENDING_KEY, {}).items():
+        if ts is None:
+            cache.invalidate(sid)
+        else:
+            cache.mark_stale(sid, ts)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _on_notify(payload):
+    if payload is None:
+        cache.invalidate()
+        return
+    for sid, ts in payload:
+        if ts is None:
+            cache.invalidate(sid)
+        else:
+            cache.mark_stale(sid, dt.datetime.fromisoformat(ts))
+
+
+pg_notify.subscribe(CHANNEL, _on_notify)
@@ -0,0 +1,215 @@
+# app/ingest.py
+import csv
+import io
+import json
+import math
+import uuid
+import datetime as dt
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import hot_cache, models, rollups, sensor_registry, sensor_stats
+
+# ───────────────────────────────────────────────
+# 📥 Bulk ingest configuration
+# ───────────────────────────────────────────────
+READING_COLUMNS = ("sensor_id", "owner_id", "ts", "ts_end", "value", "unit", "created_at")
+DEFAULT_DURATION = dt.timedelta(minutes=1)
+
+# Accepted field names → canonical field (mirrors the legacy CSV headers).
+# The legacy "Sensor ID" column holds the sensor's name; "sensor_id" is a real sensor UUID.
+FIELD_ALIASES = {
+    "sensor_name": "sensor_name", "sensor": "sensor_name", "name": "sensor_name",
+    "Sensor ID": "sensor_name",
+    "sensor_id": "sensor_id",
+    "value": "value", "Value": "value",
+    "unit": "unit", "Unit": "unit",
+    "ts": "ts", "start_time": "ts", "start_timestamp": "ts", "Start Timestamp": "ts",
+    "ts_end": "ts_end", "end_time": "ts_end", "end_timestamp": "ts_end", "End Timestamp": "ts_end",
+}
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+# ───────────────────────────────────────────────
+# 🧩 Parsing
+# ───────────────────────────────────────────────
+def parse_ts(val) -> dt.datetime | None:
+    """Strict ISO-8601 parse; aware timestamps are normalised to naive UTC."""
+    if val in (None, ""):
+        return None
+    if isinstance(val, dt.datetime):
+        parsed = val
+    else:
+        parsed = dt.datetime.fromisoformat(str(val).strip().replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def iter_bulk_records(body: bytes, content_type: str):
+    """
+    Yield (index, record, error) for each reading in a bulk request body.
+    Supports a JSON array (or {"readings": [...]}), NDJSON and CSV with a header row.
+    Raises ValueError if the body as a whole cannot be parsed.
+    """
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    text = body.decode("utf-8-sig")
+
+    if ctype in CSV_TYPES:
+        reader = csv.DictReader(io.StringIO(text))
+        for i, row in enumerate(reader):
+            yield i, row, None
+        return
+
+    if ctype in NDJSON_TYPES:
+        for i, line in enumerate(l for l in text.splitlines() if l.strip()):
+            try:
+                yield i, json.loads(line), None
+            except json.JSONDecodeError as e:
+                yield i, None, f"Invalid JSON: {e.msg}"
+        return
+
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON body: {e.msg}")
+    if isinstance(payload, dict):
+        payload = payload.get("readings")
+    if not isinstance(payload, list):
+        raise ValueError("Expected a JSON array of readings")
+    for i, record in enumerate(payload):
+        yield i, record, None
+
+
+def normalize_record(record, now: dt.datetime | None = None) -> dict:
+    """
+    Validate one raw record and return sensor_id/sensor_name/ts/ts_end/value/unit.
+    A record names its sensor by sensor_id (an existing sensor's UUID) or by
+    sensor_name; when sensor_id is given, sensor_name is ignored.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Reading must be an object")
+
+    fields = {}
+    for key, val in record.items():
+        canonical = FIELD_ALIASES.get(key.strip() if isinstance(key, str) else key)
+        if canonical and canonical not in fields:
+            fields[canonical] = val
+
+    sensor_id, name = fields.get("sensor_id"), None
+    if sensor_id not in (None, ""):
+        try:
+            sensor_id = uuid.UUID(str(sensor_id).strip())
+        except ValueError:
+            raise ValueError("Invalid sensor_id")
+    else:
+        sensor_id = None
+        name = str(fields.get("sensor_name") or "").strip()
+        if not name:
+            raise ValueError("Missing sensor_name or sensor_id")
+
+    try:
+        value = float(fields.get("value"))
+    except (TypeError, ValueError):
+        raise ValueError("Missing or non-numeric value")
+    if not math.isfinite(value):
+        raise ValueError("Value must be finite")
+
+    try:
+        ts = parse_ts(fields.get("ts")) or now or dt.datetime.utcnow()
+        ts_end = parse_ts(fields.get("ts_end")) or ts + DEFAULT_DURATION
+    except ValueError:
+        raise ValueError("Invalid timestamp format")
+
+    return {
+        "sensor_id": sensor_id,
+        "sensor_name": name,
+        "ts": ts,
+        "ts_end": ts_end,
+        "value": value,
+        "unit": str(fields.get("unit") or ""),
+    }
+
+
+# ───────────────────────────────────────────────
+# 🌡 Sensor resolution
+# ───────────────────────────────────────────────
+def resolve_sensor_ids(db: Session, owner_id, names) -> tuple[dict, int]:
+    """
+    Map sensor names → ids for one owner, creating missing sensors in the
+    current transaction. Returns (mapping, number_created).
+    """
+    return sensor_registry.resolve_many(db, owner_id, names)
+
+
+def owned_sensor_ids(db: Session, owner_id, sensor_ids) -> set:
+    """The subset of sensor_ids that exist and belong to owner_id."""
+    sensor_ids = set(sensor_ids)
+    if not sensor_ids:
+        return set()
+    return {
+        sid for (sid,) in
+        db.query(models.Sensor.id)
+        .filter(models.Sensor.owner_id == owner_id, models.Sensor.id.in_(sensor_ids))
+    }
+
+
+# ───────────────────────────────────────────────
+# 🚚 Loading
+# ───────────────────────────────────────────────
+def _copy_field(val) -> str:
+    """Render a value for the COPY text format."""
+    if val is None:
+        return r"\N"
+    if isinstance(val, dt.datetime):
+        return val.isoformat()
+    return (
+        str(val)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def load_readings(db: Session, rows: list[dict]) -> int:
+    """
+    Insert readings in the session's current transaction (no commit).
+    Uses COPY on PostgreSQL and a single executemany insert elsewhere;
+    the sensor rollups and stats catalog are updated in the same
+    transaction and the hot series cache is told about the new rows once
+    it commits.
+    """
+    if not rows:
+        return 0
+
+    now = dt.datetime.utcnow()
+    for r in rows:
+        r.setdefault("created_at", now)
+
+    conn = db.connection()
+    if conn.dialect.name == "postgresql":
+        buf = io.StringIO()
+        for r in rows:
+            buf.write("\t".join(_copy_field(r.get(c)) for c in READING_COLUMNS))
+            buf.write("\n")
+        buf.seek(0)
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {models.SensorReading.__tablename__} ({', '.join(READING_COLUMNS)}) FROM STDIN",
+                buf,
+            )
+        finally:
+            cursor.close()
+    else:
+        conn.execute(
+            insert(models.SensorReading.__table__),
+            [{c: r.get(c) for c in READING_COLUMNS} for r in rows],
+        )
+    rollups.apply_inserts(conn, rows)
+    sensor_stats.apply_inserts(conn, rows, now)
+    hot_cache.note_writes(db, conn, rows)
+    return len(rows)
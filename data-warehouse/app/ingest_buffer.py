@@ -0,0 +1,406 @@
+# app/ingest_buffer.py
+"""
+Write-behind ingest buffer.
+
+Accepted readings are appended to a local append-only log (JSON lines,
+group-fsynced), acknowledged immediately, and group-committed into
+sensor_readings by a background flusher on size or time thresholds.
+
+Each worker owns one slot directory (slot-N, held by an flock). The last
+flushed (segment, offset) of a slot is saved in ingest_checkpoints in the
+same transaction as the rows, so a crash never loads a row twice; anything
+after it is replayed on restart. Slots no live worker holds (a restart with
+fewer workers) are drained at startup.
+"""
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import datetime as dt
+from collections import deque
+from itertools import islice
+from sqlalchemy.exc import IntegrityError, DataError
+
+from app import ingest, models
+from app.database import SessionLocal
+
+try:
+    import fcntl
+except ImportError:  # Windows: no slot locking, buffered mode unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+INGEST_MODE = os.getenv("INGEST_MODE", "sync")  # "sync" | "buffered"
+INGEST_LOG_DIR = os.getenv("INGEST_LOG_DIR", os.path.join("storage", "ingest"))
+FLUSH_MAX_ROWS = int(os.getenv("INGEST_FLUSH_MAX_ROWS", "5000"))
+FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.5"))  # seconds
+FSYNC = os.getenv("INGEST_FSYNC", "true").lower() == "true"
+SEGMENT_MAX_BYTES = int(os.getenv("INGEST_SEGMENT_MAX_BYTES", str(64 * 1024 * 1024)))
+MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "1000000"))
+MAX_SLOTS = 64
+
+
+class IngestBufferFull(Exception):
+    """Raised when the un-flushed backlog exceeds MAX_PENDING."""
+
+
+# ───────────────────────────────────────────────
+# 🧩 Row (de)serialisation
+# ───────────────────────────────────────────────
+def _encode(row: dict) -> bytes:
+    return (json.dumps({
+        "sensor_id": str(row["sensor_id"]),
+        "owner_id": str(row["owner_id"]) if row.get("owner_id") else None,
+        "ts": row["ts"].isoformat(),
+        "ts_end": row["ts_end"].isoformat() if row.get("ts_end") else None,
+        "value": row["value"],
+        "unit": row.get("unit") or "",
+    }, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _decode(line: bytes) -> dict:
+    d = json.loads(line)
+    return {
+        "sensor_id": uuid.UUID(d["sensor_id"]),
+        "owner_id": uuid.UUID(d["owner_id"]) if d.get("owner_id") else None,
+        "ts": dt.datetime.fromisoformat(d["ts"]),
+        "ts_end": dt.datetime.fromisoformat(d["ts_end"]) if d.get("ts_end") else None,
+        "value": d["value"],
+        "unit": d.get("unit") or "",
+    }
+
+
+# ───────────────────────────────────────────────
+# 🗂 Slot directories
+# ───────────────────────────────────────────────
+def _try_lock(path: str):
+    """The slot's flock handle, or None if another process holds it."""
+    fh = open(os.path.join(path, "lock"), "w")
+    try:
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        fh.close()
+        return None
+    return fh
+
+
+def _slot_id(path: str) -> str:
+    """Stable id of a slot directory (its ingest_checkpoints key)."""
+    id_path = os.path.join(path, "id")
+    try:
+        with open(id_path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        slot_id = str(uuid.uuid4())
+        with open(id_path, "w") as f:
+            f.write(slot_id)
+        return slot_id
+
+
+def _segment_path(path: str, seq: int) -> str:
+    return os.path.join(path, f"{seq:012d}.log")
+
+
+def _segments(path: str) -> list[int]:
+    return sorted(int(f[:-4]) for f in os.listdir(path) if f.endswith(".log"))
+
+
+# ───────────────────────────────────────────────
+# 📦 Buffer
+# ───────────────────────────────────────────────
+class IngestBuffer:
+    def __init__(self, log_dir: str = INGEST_LOG_DIR, session_factory=SessionLocal,
+                 max_rows: int = FLUSH_MAX_ROWS, interval: float = FLUSH_INTERVAL):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.interval = interval
+
+        self._lock = threading.Lock()          # guards the active segment + queue
+        self._sync_lock = threading.Lock()     # group fsync leader election
+        self._wake = threading.Condition(self._lock)
+        self._pending = deque()                # (seq, offset after the row's line, row)
+        self._stop = False
+        self._thread = None
+
+        self.dir = self._claim_slot(log_dir)
+        self.slot_id = _slot_id(self.dir)
+        self._seq = 0
+        self._fd = None
+        self._offset = 0
+        self._synced = (0, 0)
+
+        self.metrics = {
+            "appended": 0, "flushed": 0, "dropped": 0, "replayed": 0, "drained": 0,
+            "flushes": 0, "failures": 0,
+            "last_flush_ms": 0.0, "avg_flush_ms": 0.0, "max_flush_ms": 0.0,
+        }
+
+    # ── slot / files ──────────────────────────
+    def _claim_slot(self, log_dir: str) -> str:
+        """Each worker process owns one slot directory, held by an flock."""
+        if fcntl is None:
+            raise RuntimeError("INGEST_MODE=buffered needs fcntl (POSIX) to give each worker its own log slot")
+        for n in range(MAX_SLOTS):
+            path = os.path.join(log_dir, f"slot-{n}")
+            os.makedirs(path, exist_ok=True)
+            fh = _try_lock(path)
+            if fh is not None:
+                self._slot_lock = fh
+                return path
+        raise RuntimeError(f"No free ingest log slot under {log_dir}")
+
+    def _read_checkpoint(self, path: str, slot_id: str) -> tuple[int, int]:
+        db = self.session_factory()
+        try:
+            row = db.get(models.IngestCheckpoint, slot_id)
+        finally:
+            db.close()
+        if row is not None:
+            return row.seq, row.position
+        try:
+            # slots last flushed before checkpoints moved into the database
+            with open(os.path.join(path, "checkpoint")) as f:
+                seq, off = f.read().split()
+                return int(seq), int(off)
+        except (OSError, ValueError):
+            return 0, 0
+
+    def _open_segment(self, seq: int):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._seq = seq
+        self._fd = os.open(_segment_path(self.dir, seq), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._offset = os.fstat(self._fd).st_size
+
+    # ── lifecycle ─────────────────────────────
+    def start(self):
+        """Drain orphaned slots, replay this slot's un-flushed tail, open a fresh segment and start the flusher."""
+        self._drain_orphans()
+        ck_seq, entries = self._replay(self.dir, self.slot_id)
+        self._pending.extend(entries)
+        self.metrics["replayed"] = len(entries)
+        segments = _segments(self.dir)
+        self._open_segment(max(segments[-1] if segments else 0, ck_seq) + 1)
+        self._thread = threading.Thread(target=self._run, name="ingest-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"📥 Ingest buffer started in {self.dir} ({len(self._pending)} replayed)")
+
+    def stop(self, timeout: float = 10.0):
+        with self._lock:
+            self._stop = True
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _replay(self, path: str, slot_id: str) -> tuple[int, list]:
+        """(checkpoint segment, [(seq, offset, row)]) for everything in `path` after its checkpoint."""
+        ck_seq, ck_off = self._read_checkpoint(path, slot_id)
+        entries = []
+        for seq in _segments(path):
+            seg = _segment_path(path, seq)
+            if seq < ck_seq:
+                os.remove(seg)
+                continue
+            start = ck_off if seq == ck_seq else 0
+            with open(seg, "rb") as f:
+                f.seek(start)
+                data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                # torn tail from a crash mid-write: drop the partial line
+                with open(seg, "r+b") as f:
+                    f.truncate(start + end)
+            offset = start
+            for line in data[:end].splitlines(keepends=True):
+                offset += len(line)
+                try:
+                    entries.append((seq, offset, _decode(line)))
+                except (ValueError, KeyError):
+                    logger.warning(f"⚠️ Skipping corrupt ingest log line in {seg}")
+        return ck_seq, entries
+
+    def _drain_orphans(self):
+        """Load what is left in slots no live worker holds, e.g. after restarting with fewer workers."""
+        root = os.path.dirname(self.dir)
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if path == self.dir or not name.startswith("slot-") or not os.path.isdir(path):
+                continue
+            fh = _try_lock(path)
+            if fh is None:
+                continue  # owned by a running worker
+            try:
+                slot_id = _slot_id(path)
+                _, entries = self._replay(path, slot_id)
+                for i in range(0, len(entries), self.max_rows):
+                    self._load(slot_id, entries[i:i + self.max_rows])
+                if entries:
+                    self.metrics["drained"] += len(entries)
+                    logger.info(f"📥 Drained {len(entries)} buffered readings from orphaned {path}")
+            except Exception as e:
+                logger.error(f"❌ Could not drain ingest slot {path}, retrying on next start: {e}")
+            finally:
+                fh.close()
+
+    # ── append path ───────────────────────────
+    def append(self, rows: list[dict]):
+        """Durably log rows and queue them for the flusher."""
+        lines = [_encode(r) for r in rows]
+        data = b"".join(lines)
+        with self._lock:
+            if len(self._pending) + len(rows) > MAX_PENDING:
+                raise IngestBufferFull("Ingest backlog is full")
+            if self._offset >= SEGMENT_MAX_BYTES:
+                self._open_segment(self._seq + 1)
+            os.write(self._fd, data)
+            seq, end = self._seq, self._offset
+            # each row checkpoints at the end of its own line
+            for r, line in zip(rows, lines):
+                end += len(line)
+                self._pending.append((seq, end, r))
+            self._offset = end
+            self.metrics["appended"] += len(rows)
+            if len(self._pending) >= self.max_rows:
+                self._wake.notify()
+        if FSYNC:
+            self._sync_to(seq, end)
+
+    def _sync_to(self, seq: int, end: int):
+        """Group fsync: one caller syncs on behalf of everyone queued behind it."""
+        with self._sync_lock:
+            if self._synced >= (seq, end):
+                return
+            with self._lock:
+                if self._seq == seq:
+                    fd, target = os.dup(self._fd), (self._seq, self._offset)
+                else:
+                    # segment rotated since our write; fsync the sealed one directly
+                    fd, target = os.open(_segment_path(self.dir, seq), os.O_RDONLY), (seq, end)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._synced = target
+
+    # ── flusher ───────────────────────────────
+    def _run(self):
+        backoff = self.interval
+        while True:
+            with self._lock:
+                if not self._stop and len(self._pending) < self.max_rows:
+                    self._wake.wait(self.interval)
+                if self._stop and not self._pending:
+                    return
+                batch = list(islice(self._pending, self.max_rows))
+            if not batch:
+                continue
+            try:
+                self._flush(batch)
+                backoff = self.interval
+            except Exception as e:
+                self.metrics["failures"] += 1
+                logger.error(f"❌ Ingest flush failed, retrying in {backoff:.1f}s: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                if self._stop:
+                    return
+
+    def _flush(self, batch: list):
+        started = time.perf_counter()
+        self._load(self.slot_id, batch)
+
+        with self._lock:
+            for _ in batch:
+                self._pending.popleft()
+        seq = batch[-1][0]
+        for old in _segments(self.dir):
+            if old < seq:
+                os.remove(_segment_path(self.dir, old))
+
+        ms = (time.perf_counter() - started) * 1000
+        m = self.metrics
+        m["flushes"] += 1
+        m["flushed"] += len(batch)
+        m["last_flush_ms"] = round(ms, 2)
+        m["max_flush_ms"] = round(max(m["max_flush_ms"], ms), 2)
+        m["avg_flush_ms"] = round(ms if m["flushes"] == 1 else 0.9 * m["avg_flush_ms"] + 0.1 * ms, 2)
+
+    def _load(self, slot_id: str, entries: list):
+        """
+        Group-commit (seq, offset, row) entries together with the slot's
+        checkpoint; bisect to isolate rows the database rejects.
+        """
+        seq, position = entries[-1][0], entries[-1][1]
+        checkpoint = models.IngestCheckpoint(slot_id=slot_id, seq=seq, position=position)
+        db = self.session_factory()
+        try:
+            ingest.load_readings(db, [dict(r) for _, _, r in entries])
+            db.merge(checkpoint)
+            db.commit()
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            if len(entries) == 1:
+                self.metrics["dropped"] += 1
+                logger.warning(f"⚠️ Dropping rejected buffered reading: {e.orig}")
+                db.merge(checkpoint)  # skip it on replay
+                db.commit()
+                return
+            mid = len(entries) // 2
+            self._load(slot_id, entries[:mid])
+            self._load(slot_id, entries[mid:])
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ── metrics ───────────────────────────────
+    def stats(self) -> dict:
+        with self._lock:
+            depth = len(self._pending)
+        return {
+            "mode": "buffered",
+            "queue_depth": depth,
+            "segment": self._seq,
+            "segment_bytes": self._offset,
+            **self.metrics,
+        }
+
+
+# ───────────────────────────────────────────────
+# 🚀 Process-wide instance
+# ───────────────────────────────────────────────
+_buffer: IngestBuffer | None = None
+
+
+def enabled() -> bool:
+    return _buffer is not None
+
+
+def get_buffer() -> IngestBuffer | None:
+    return _buffer
+
+
+def start():
+    """Start the buffer if INGEST_MODE=buffered (call once per worker at startup)."""
+    global _buffer
+    if INGEST_MODE != "buffered" or _buffer is not None:
+        return
+    _buffer = IngestBuffer()
+    _buffer.start()
+
+
+def stop():
+    global _buffer
+    if _buffer is not None:
+        _buffer.stop()
+        _buffer = None
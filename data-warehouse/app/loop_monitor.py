@@ -0,0 +1,76 @@
+# app/loop_monitor.py
+"""
+Event-loop blocking monitor.
+
+A task sleeps LOOP_MONITOR_INTERVAL seconds at a time and measures how late
+it wakes up. Any lateness is time the loop spent running something that did
+not yield, such as blocking I/O inside an async def. Lag above
+LOOP_BLOCK_THRESHOLD counts as a stall, and stalls longer than
+LOOP_BLOCK_WARN are logged. Figures are per worker process.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.05"))
+LOOP_BLOCK_WARN = float(os.getenv("LOOP_BLOCK_WARN", "0.5"))
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.stalls = 0
+        self.blocked_seconds = 0.0
+        self.max_lag = 0.0
+        self.recent = deque(maxlen=100)  # (unix time, lag seconds) of recent stalls
+        self.started_at = None
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - before - self.interval
+            self.samples += 1
+            if lag < LOOP_BLOCK_THRESHOLD:
+                continue
+            self.stalls += 1
+            self.blocked_seconds += lag
+            self.max_lag = max(self.max_lag, lag)
+            self.recent.append((time.time(), lag))
+            if lag >= LOOP_BLOCK_WARN:
+                logger.warning(f"⚠️ Event loop blocked for {lag * 1000:.0f} ms")
+
+    def start(self):
+        """Start on the running loop (call from an async startup hook)."""
+        if self._task is None or self._task.done():
+            self.started_at = time.time()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        window = time.time() - 60
+        last_minute = [lag for ts, lag in self.recent if ts >= window]
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "max_stall_ms": round(self.max_lag * 1000, 1),
+            "last_minute": {"stalls": len(last_minute), "blocked_ms": round(sum(last_minute) * 1000, 1)},
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0,
+        }
+
+
+monitor = LoopMonitor()
@@ -8,13 +8,19 @@ from sqlalchemy import (
     DateTime,
     ForeignKey,
     BigInteger,
+    Integer,
     Float,
     Index,
     Boolean,
+    UniqueConstraint,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from .database import Base
+from .database import Base, DATABASE_URL
+
+# sensor_readings is range-partitioned by ts on PostgreSQL only; elsewhere
+# (SQLite) it is a plain table with an autoincrement id
+READINGS_PARTITIONED = DATABASE_URL.startswith("postgresql")
 
 
 # ────────────────────────────────
@@ -27,6 +33,7 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     hashed_password = Column(Text, nullable=False)
     is_admin = Column(Boolean, default=False)
+    api_key_hash = Column(String(64), nullable=True, unique=True, index=True)  # HMAC-SHA256 of the key
     created_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
 
     # Relationships
@@ -41,6 +48,10 @@ class User(Base):
 # ────────────────────────────────
 class Sensor(Base):
     __tablename__ = "sensors"
+    __table_args__ = (
+        # ✅ One sensor name per owner (target of the ingest upsert)
+        UniqueConstraint("owner_id", "name", name="uq_sensors_owner_name"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False, index=True)
@@ -57,10 +68,14 @@ class Sensor(Base):
 # ────────────────────────────────
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
+    # ✅ Range-partitioned by ts on PostgreSQL (partitions managed by app/partitions.py)
+    __table_args__ = {"postgresql_partition_by": "RANGE (ts)"}
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # The partition key has to be part of the primary key; SQLite cannot
+    # autoincrement a composite key, so there the key is id alone
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     sensor_id = Column(UUID(as_uuid=True), ForeignKey("sensors.id"), index=True)
-    ts = Column(DateTime, nullable=False, index=True)
+    ts = Column(DateTime, primary_key=READINGS_PARTITIONED, nullable=False)
     ts_end = Column(DateTime, nullable=True)
     value = Column(Float, nullable=False)
     unit = Column(String, nullable=True)
@@ -72,8 +87,55 @@ class SensorReading(Base):
     owner = relationship("User", back_populates="readings")
 
 
-# ✅ Index for efficient time-based querying
-Index("ix_sr_sensor_ts", SensorReading.sensor_id, SensorReading.ts)
+# ✅ Keyset pagination / time-range indexes: (ts, id) and (sensor_id, ts, id)
+Index("ix_sr_ts_id", SensorReading.ts, SensorReading.id)
+Index("ix_sr_sensor_ts_id", SensorReading.sensor_id, SensorReading.ts, SensorReading.id)
+
+
+# ────────────────────────────────
+# 📊 SENSOR ROLLUP MODEL (1min / 1h / 1d aggregates, see app/rollups.py)
+# ────────────────────────────────
+class SensorRollup(Base):
+    __tablename__ = "sensor_rollups"
+
+    sensor_id = Column(UUID(as_uuid=True), ForeignKey("sensors.id", ondelete="CASCADE"), primary_key=True)
+    resolution = Column(String(8), primary_key=True)  # "1min" | "1h" | "1d"
+    bucket = Column(DateTime, primary_key=True)        # bucket start (naive UTC)
+    count = Column(BigInteger, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    first_ts = Column(DateTime, nullable=False)
+    first_value = Column(Float, nullable=False)
+    last_ts = Column(DateTime, nullable=False)
+    last_value = Column(Float, nullable=False)
+
+
+# ────────────────────────────────
+# 🗂 SENSOR STATS CATALOG (one row per sensor, see app/sensor_stats.py)
+# ────────────────────────────────
+class SensorStats(Base):
+    __tablename__ = "sensor_stats"
+
+    sensor_id = Column(UUID(as_uuid=True), ForeignKey("sensors.id", ondelete="CASCADE"), primary_key=True)
+    first_ts = Column(DateTime, nullable=True)    # None once every reading is gone
+    last_ts = Column(DateTime, nullable=True)
+    row_count = Column(BigInteger, nullable=False, default=0)
+    last_value = Column(Float, nullable=True)     # value of the reading at last_ts
+    last_ingest_at = Column(DateTime, nullable=True)
+
+
+# ────────────────────────────────
+# 📥 INGEST CHECKPOINTS (one row per write-behind log slot, see app/ingest_buffer.py)
+# ────────────────────────────────
+class IngestCheckpoint(Base):
+    """Last flushed (segment, position) of a slot, committed with the rows it covers."""
+    __tablename__ = "ingest_checkpoints"
+
+    slot_id = Column(String(36), primary_key=True)  # from the slot directory's id file
+    seq = Column(BigInteger, nullable=False)
+    position = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime, default=dt.datetime.utcnow, onupdate=dt.datetime.utcnow, nullable=False)
 
 
 # ────────────────────────────────
@@ -89,7 +151,28 @@ class VideoAsset(Base):
     license = Column(Text, nullable=True)
     created_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
 
+    # Resumable multipart upload (app/video_uploads.py)
+    object_key = Column(Text, nullable=True)
+    content_type = Column(Text, nullable=True)
+    status = Column(String, nullable=False, default="complete")  # uploading | complete | aborted
+    upload_id = Column(Text, nullable=True)                      # S3 multipart upload id while uploading
+    part_size = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, default=dt.datetime.utcnow, nullable=True)
+
     owner = relationship("User", back_populates="videos")
+    parts = relationship("VideoUploadPart", cascade="all, delete-orphan", passive_deletes=True)
+
+
+class VideoUploadPart(Base):
+    """One received part of a VideoAsset upload (what a resumed client can skip)."""
+    __tablename__ = "video_upload_parts"
+
+    video_id = Column(UUID(as_uuid=True), ForeignKey("video_assets.id", ondelete="CASCADE"), primary_key=True)
+    part_number = Column(BigInteger, primary_key=True, autoincrement=False)
+    size_bytes = Column(BigInteger, nullable=False)
+    etag = Column(Text, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    uploaded_at = Column(DateTime, default=dt.datetime.utcnow, nullable=False)
 
 
 # ────────────────────────────────
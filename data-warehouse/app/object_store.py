@@ -0,0 +1,188 @@
+# app/object_store.py
+"""
+Async access to MinIO for request handlers.
+
+minio-py is blocking, so every call runs on a dedicated, bounded thread
+pool (OBJECT_STORE_WORKERS threads, at most OBJECT_STORE_MAX_PENDING calls
+queued or running) and is awaited from the event loop. A slow transfer
+then occupies one store thread instead of stalling every other request,
+and a burst of uploads queues here instead of exhausting the shared
+threadpool.
+
+    store        → storage/minio_client.py (uploads, file downloads, migration)
+    video_store  → app/storage/minio_client.py (/api/video)
+
+The MinIO client is created on first use, not at import.
+"""
+import os
+import io
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+OBJECT_STORE_WORKERS = int(os.getenv("OBJECT_STORE_WORKERS", "8"))
+OBJECT_STORE_MAX_PENDING = int(os.getenv("OBJECT_STORE_MAX_PENDING", "64"))
+OBJECT_CHUNK_BYTES = 256 * 1024
+PUT_PART_SIZE = 16 * 1024 * 1024  # multipart part size for uploads of unknown length
+
+
+class ObjectStore:
+    def __init__(self, name: str, connect, workers: int = OBJECT_STORE_WORKERS,
+                 max_pending: int = OBJECT_STORE_MAX_PENDING):
+        self.name = name
+        self._connect = connect          # () -> (client, bucket)
+        self._client = None
+        self._bucket = None
+        self._connect_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"object-store-{name}")
+        self._max_pending = max_pending
+        self._slots = None               # asyncio.Semaphore, created on the serving loop
+        self.pending = 0
+        self.calls = 0
+        self.errors = 0
+
+    # ───────────────────────────────────────────────
+    # 🔌 Plumbing
+    # ───────────────────────────────────────────────
+    @property
+    def client(self):
+        if self._client is None:
+            with self._connect_lock:
+                if self._client is None:
+                    self._client, self._bucket = self._connect()
+        return self._client
+
+    @property
+    def bucket(self) -> str:
+        self.client
+        return self._bucket
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on the store's pool (waits for a slot when OBJECT_STORE_MAX_PENDING are queued)."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending)
+        async with self._slots:
+            self.pending += 1
+            self.calls += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self._executor, lambda: fn(*args, **kwargs)
+                )
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.pending -= 1
+
+    def stats(self) -> dict:
+        return {"bucket": self._bucket, "connected": self._client is not None, "pending": self.pending,
+                "calls": self.calls, "errors": self.errors, "workers": self._executor._max_workers}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ───────────────────────────────────────────────
+    # 📦 Objects
+    # ───────────────────────────────────────────────
+    async def stat(self, key: str):
+        return await self.run(lambda: self.client.stat_object(self.bucket, key))
+
+    async def exists(self, key: str) -> bool:
+        from minio.error import S3Error
+        try:
+            await self.stat(key)
+            return True
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                return False
+            raise
+
+    async def put(self, key: str, data, length: int | None = None,
+                  content_type: str = "application/octet-stream") -> int:
+        """Store bytes or a readable file object; returns the size written."""
+        def _put():
+            nonlocal length
+            stream = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+            if length is None and stream.seekable():
+                start = stream.tell()
+                length = stream.seek(0, io.SEEK_END) - start
+                stream.seek(start)
+            self.client.put_object(
+                self.bucket, key, stream, length=-1 if length is None else length,
+                part_size=PUT_PART_SIZE if length is None else 0, content_type=content_type,
+            )
+            return length
+        return await self.run(_put)
+
+    async def fput(self, key: str, path: str, content_type: str = "application/octet-stream") -> int:
+        """Upload a local file (multipart for large files); returns its size."""
+        def _fput():
+            self.client.fput_object(self.bucket, key, path, content_type=content_type)
+            return os.path.getsize(path)
+        return await self.run(_fput)
+
+    async def remove(self, key: str):
+        await self.run(lambda: self.client.remove_object(self.bucket, key))
+
+    async def iter(self, key: str, offset: int = 0, length: int = 0, chunk_size: int = OBJECT_CHUNK_BYTES):
+        """Async iterator over an object's bytes (length 0: to the end); each read runs on the pool."""
+        obj = await self.run(lambda: self.client.get_object(self.bucket, key, offset=offset, length=length))
+        try:
+            while True:
+                chunk = await self.run(obj.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            obj.close()
+            obj.release_conn()
+
+    # ───────────────────────────────────────────────
+    # 🧩 Multipart (minio-py only exposes these as underscored methods, stable since 7.0)
+    # ───────────────────────────────────────────────
+    async def create_multipart(self, key: str, content_type: str) -> str:
+        return await self.run(lambda: self.client._create_multipart_upload(
+            self.bucket, key, {"Content-Type": content_type}))
+
+    async def upload_part(self, key: str, upload_id: str, part_number: int, data) -> str:
+        return await self.run(lambda: self.client._upload_part(
+            self.bucket, key, data, None, upload_id, part_number))
+
+    async def complete_multipart(self, key: str, upload_id: str, parts: list[tuple[int, str]]):
+        from minio.datatypes import Part
+        await self.run(lambda: self.client._complete_multipart_upload(
+            self.bucket, key, upload_id, [Part(n, etag) for n, etag in parts]))
+
+    async def abort_multipart(self, key: str, upload_id: str):
+        await self.run(lambda: self.client._abort_multipart_upload(self.bucket, key, upload_id))
+
+
+def _files_client():
+    from storage.minio_client import minio_client, MINIO_BUCKET, ensure_bucket
+    ensure_bucket()
+    return minio_client, MINIO_BUCKET
+
+
+def _videos_client():
+    from app.storage.minio_client import client, BUCKET, ensure_bucket
+    ensure_bucket()
+    return client, BUCKET
+
+
+store = ObjectStore("files", _files_client)
+video_store = ObjectStore("videos", _videos_client)
+
+
+def stats() -> dict:
+    return {s.name: s.stats() for s in (store, video_store)}
+
+
+def shutdown():
+    store.shutdown()
+    video_store.shutdown()
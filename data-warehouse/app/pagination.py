@@ -0,0 +1,69 @@
+# app/pagination.py
+"""
+Keyset (seek) pagination on (ts, id).
+
+Cursors are opaque, URL-safe encodings of the (ts, id) of a boundary row.
+Each page is a row-value comparison plus LIMIT, so it is an index range
+scan on (ts, id) no matter how deep the client pages — never an OFFSET.
+"""
+import base64
+import datetime as dt
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+def encode_cursor(ts: dt.datetime, row_id) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[dt.datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, row_id = raw.split("|")
+        return dt.datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_page(query, ts_col, id_col, limit: int = DEFAULT_LIMIT,
+                after: str | None = None, before: str | None = None, descending: bool = False):
+    """
+    One page of `query` in (ts, id) order (newest first when descending).
+    - after : the page following this cursor in listing order
+    - before: the page preceding it (for "previous" navigation)
+    Rows must expose .ts and .id. Returns (rows, next_cursor, prev_cursor).
+    """
+    if after and before:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
+    limit = max(1, min(limit, MAX_LIMIT))
+    key = tuple_(ts_col, id_col)
+
+    if after:
+        cursor = tuple_(*decode_cursor(after))
+        query = query.filter(key < cursor if descending else key > cursor)
+    if before:
+        cursor = tuple_(*decode_cursor(before))
+        query = query.filter(key > cursor if descending else key < cursor)
+
+    # Walking backwards scans the index in the opposite direction, then flips the page
+    scan_desc = descending != bool(before)
+    order = (ts_col.desc(), id_col.desc()) if scan_desc else (ts_col.asc(), id_col.asc())
+    rows = query.order_by(*order).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+    return (rows, *page_cursors(rows, more, after, before))
+
+
+def page_cursors(rows, more: bool, after: str | None, before: str | None):
+    """(next_cursor, prev_cursor) for a page in listing order; more = rows exist past its far end."""
+    first = encode_cursor(rows[0].ts, rows[0].id) if rows else None
+    last = encode_cursor(rows[-1].ts, rows[-1].id) if rows else None
+    if before:
+        return last or before, first if more else None
+    return last if more else None, first if after else None
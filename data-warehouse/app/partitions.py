@@ -0,0 +1,250 @@
+# app/partitions.py
+"""
+Range partitioning of sensor_readings by ts (PostgreSQL only).
+
+A maintenance thread keeps READINGS_PARTITIONS_AHEAD monthly (or weekly)
+partitions created ahead of time. Rows that land in the DEFAULT partition
+(historical backfills, clock skew) are moved into a proper partition on
+the next pass. Retention drops whole partitions instead of deleting rows;
+sensor_rollups are kept, so downsampled history outlives the raw data.
+
+All DDL runs under a transaction-scoped advisory lock, so several workers
+can run maintenance at the same time.
+"""
+import os
+import re
+import logging
+import threading
+import datetime as dt
+from collections import Counter
+from sqlalchemy import text
+
+from app import sensor_stats
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+PARENT = "sensor_readings"
+DEFAULT_PARTITION = f"{PARENT}_default"
+PARTITION_INTERVAL = os.getenv("READINGS_PARTITION_INTERVAL", "month")        # month | week
+PARTITIONS_AHEAD = int(os.getenv("READINGS_PARTITIONS_AHEAD", "3"))
+RETENTION_DAYS = int(os.getenv("READINGS_RETENTION_DAYS", "0"))                # 0 = keep forever
+CHECK_INTERVAL = float(os.getenv("READINGS_PARTITION_CHECK_INTERVAL", "3600"))
+DELETE_BATCH = 10000
+_LOCK_KEY = 0x5E45_0001  # pg_advisory_xact_lock key for partition DDL
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+_stop = threading.Event()
+_thread = None
+
+
+# ───────────────────────────────────────────────
+# 🗓 Periods
+# ───────────────────────────────────────────────
+def period_start(ts: dt.datetime) -> dt.datetime:
+    day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    if PARTITION_INTERVAL == "week":
+        return day - dt.timedelta(days=day.weekday())  # Monday, like date_trunc('week')
+    return day.replace(day=1)
+
+
+def next_period(start: dt.datetime) -> dt.datetime:
+    if PARTITION_INTERVAL == "week":
+        return start + dt.timedelta(days=7)
+    return (start.replace(day=28) + dt.timedelta(days=4)).replace(day=1)
+
+
+def _literal(ts: dt.datetime) -> str:
+    return f"'{ts.isoformat(sep=' ')}'"
+
+
+def _parse_bound(val: str):
+    val = val.strip()
+    if val in ("MINVALUE", "MAXVALUE"):
+        return None
+    return dt.datetime.fromisoformat(val.strip("'"))
+
+
+# ───────────────────────────────────────────────
+# 🔎 Inspection
+# ───────────────────────────────────────────────
+def is_partitioned(conn) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    kind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"), {"name": PARENT}
+    ).scalar()
+    return kind == "p"
+
+
+def list_partitions(conn) -> list[dict]:
+    """[{name, lower, upper, default}] ordered by lower bound; None = unbounded."""
+    rows = conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:name)
+    """), {"name": PARENT})
+    parts = []
+    for name, bound in rows:
+        m = _BOUND_RE.search(bound or "")
+        parts.append({
+            "name": name,
+            "lower": _parse_bound(m.group(1)) if m else None,
+            "upper": _parse_bound(m.group(2)) if m else None,
+            "default": m is None,
+        })
+    return sorted(parts, key=lambda p: (p["default"], p["lower"] or dt.datetime.min))
+
+
+# ───────────────────────────────────────────────
+# 🧱 Creation
+# ───────────────────────────────────────────────
+def _create(conn, lower: dt.datetime, upper: dt.datetime, existing: list[dict]) -> str | None:
+    """Create [lower, upper) unless covered, clipping the start to any partition it overlaps."""
+    for p in existing:
+        if p["default"]:
+            continue
+        lo, hi = p["lower"], p["upper"]
+        if (lo is None or lo <= lower) and (hi is None or lower < hi):
+            lower = hi if hi is not None else upper
+    if lower >= upper:
+        return None
+
+    name = f"{PARENT}_p{lower:%Y%m%d}"
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    if any(p["default"] for p in existing):
+        # Move rows that were parked in the default partition, or ATTACH would fail
+        conn.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :lo AND ts < :hi RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """), {"lo": lower, "hi": upper})
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ({_literal(lower)}) TO ({_literal(upper)})"
+    ))
+    existing.append({"name": name, "lower": lower, "upper": upper, "default": False})
+    logger.info(f"🧱 Created partition {name} [{lower} .. {upper})")
+    return name
+
+
+def ensure_partitions(conn, now: dt.datetime | None = None) -> list[str]:
+    """Create the current and upcoming partitions, plus any needed for rows parked in DEFAULT."""
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+    existing = list_partitions(conn)
+    if not any(p["default"] for p in existing):
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+        existing.append({"name": DEFAULT_PARTITION, "lower": None, "upper": None, "default": True})
+
+    starts = set()
+    start = period_start(now or dt.datetime.utcnow())
+    for _ in range(PARTITIONS_AHEAD + 1):
+        starts.add(start)
+        start = next_period(start)
+
+    unit = "week" if PARTITION_INTERVAL == "week" else "month"
+    parked = conn.execute(text(f"SELECT DISTINCT date_trunc('{unit}', ts) FROM {DEFAULT_PARTITION}"))
+    starts.update(ts for (ts,) in parked)
+
+    created = []
+    for lower in sorted(starts):
+        name = _create(conn, lower, next_period(lower), existing)
+        if name:
+            created.append(name)
+    return created
+
+
+# ───────────────────────────────────────────────
+# 🗑 Retention
+# ───────────────────────────────────────────────
+def drop_before(conn, cutoff: dt.datetime) -> dict:
+    """
+    Remove readings older than cutoff. On a partitioned table whole
+    partitions entirely below the cutoff are dropped (no row deletes, no
+    vacuum debt); the remainder is left until its partition expires.
+    The sensor_stats catalog is adjusted for every removed row.
+    """
+    removed = Counter()
+    if not is_partitioned(conn):
+        deleted = 0
+        while True:
+            sids = conn.execute(text(f"""
+                DELETE FROM {PARENT} WHERE id IN (
+                    SELECT id FROM {PARENT} WHERE ts < :cutoff LIMIT {DELETE_BATCH}
+                ) RETURNING sensor_id
+            """), {"cutoff": cutoff}).scalars().all()
+            removed.update(sids)
+            deleted += len(sids)
+            if len(sids) < DELETE_BATCH:
+                _forget(conn, removed)
+                return {"dropped": [], "deleted_rows": deleted}
+
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+    dropped = []
+    for p in list_partitions(conn):
+        if not p["default"] and p["upper"] is not None and p["upper"] <= cutoff:
+            removed.update(dict(conn.execute(text(
+                f"SELECT sensor_id, count(*) FROM {p['name']} GROUP BY sensor_id"
+            )).all()))
+            conn.execute(text(f"DROP TABLE {p['name']}"))
+            dropped.append(p["name"])
+    sids = conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE ts < :cutoff RETURNING sensor_id"), {"cutoff": cutoff}
+    ).scalars().all()
+    removed.update(sids)
+    _forget(conn, removed)
+    if dropped:
+        logger.info(f"🗑 Dropped partitions older than {cutoff}: {', '.join(dropped)}")
+    return {"dropped": dropped, "deleted_rows": len(sids)}
+
+
+def _forget(conn, removed: Counter):
+    removed.pop(None, None)
+    if removed:
+        sensor_stats.adjust(conn, {sid: -n for sid, n in removed.items()}, set(removed))
+
+
+# ───────────────────────────────────────────────
+# 🔁 Background maintenance
+# ───────────────────────────────────────────────
+def maintain():
+    """One maintenance pass: ensure partitions ahead, then apply READINGS_RETENTION_DAYS."""
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+        ensure_partitions(conn)
+    if RETENTION_DAYS > 0:
+        with engine.begin() as conn:
+            drop_before(conn, dt.datetime.utcnow() - dt.timedelta(days=RETENTION_DAYS))
+
+
+def _run():
+    while not _stop.is_set():
+        try:
+            maintain()
+        except Exception as e:
+            logger.error(f"❌ Partition maintenance failed: {e}")
+        _stop.wait(CHECK_INTERVAL)
+
+
+def start():
+    """Start the maintenance thread (Postgres only)."""
+    global _thread
+    if _thread is not None or engine.dialect.name != "postgresql":
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="partition-maintenance", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5.0)
+        _thread = None
@@ -0,0 +1,103 @@
+# app/pg_notify.py
+"""
+Cross-worker cache invalidation over PostgreSQL LISTEN/NOTIFY.
+
+Modules subscribe a handler per channel; publish() sends a JSON payload
+inside the caller's transaction, so it is only delivered on commit.
+After a listener reconnect every handler is called with None, meaning
+"notifications may have been missed — drop everything".
+"""
+import json
+import select
+import logging
+import threading
+from sqlalchemy import text
+
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+_handlers: dict[str, list] = {}
+_stop = threading.Event()
+_thread = None
+
+
+def subscribe(channel: str, handler):
+    """Register handler(payload) for a channel (call at import time)."""
+    _handlers.setdefault(channel, []).append(handler)
+
+
+def publish(conn, channel: str, payload):
+    """Queue a notification on a SQLAlchemy Connection/Session (no-op off Postgres)."""
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    if bind.dialect.name != "postgresql":
+        return
+    conn.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": json.dumps(payload)},
+    )
+
+
+def _dispatch(channel: str, payload):
+    for handler in _handlers.get(channel, []):
+        try:
+            handler(payload)
+        except Exception as e:
+            logger.error(f"❌ {channel} handler failed: {e}")
+
+
+def _listen():
+    cargs, cparams = engine.dialect.create_connect_args(engine.url)
+    first = True
+    while not _stop.is_set():
+        conn = None
+        try:
+            conn = engine.dialect.connect(*cargs, **cparams)
+            conn.autocommit = True
+            cur = conn.cursor()
+            for channel in _handlers:
+                cur.execute(f'LISTEN "{channel}"')
+            if not first:
+                for channel in _handlers:
+                    _dispatch(channel, None)
+            first = False
+
+            while not _stop.is_set():
+                if select.select([conn], [], [], 5.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    try:
+                        payload = json.loads(n.payload)
+                    except ValueError:
+                        payload = n.payload
+                    _dispatch(n.channel, payload)
+        except Exception as e:
+            logger.warning(f"⚠️ LISTEN connection lost, reconnecting: {e}")
+            first = False
+            _stop.wait(2.0)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+
+def start():
+    """Start the listener thread (once per worker, Postgres only)."""
+    global _thread
+    if _thread is not None or not _handlers or engine.dialect.name != "postgresql":
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_listen, name="pg-notify", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=6.0)
+        _thread = None
@@ -0,0 +1,87 @@
+# app/reading_changes.py
+"""
+One after_flush listener for sensor readings written through the ORM.
+
+It collects the readings added, edited and deleted (and sensors deleted) in
+a flush once, then hands the same ReadingChanges to every subscriber, in
+the flush's transaction:
+
+    rollups       → folds inserts, recomputes edited/deleted buckets
+    sensor_stats  → adjusts row counts and first/last readings
+    hot_cache     → marks the touched series stale after commit
+
+Core writes (bulk loads, COPY) bypass the ORM and call each module's
+apply_inserts()/note_writes() directly from ingest.load_readings().
+"""
+import uuid
+from collections import namedtuple
+from sqlalchemy import event, inspect
+
+from app import models
+from app.database import SessionLocal
+
+UPSERT_CHUNK = 2000  # rows per INSERT ... ON CONFLICT statement
+
+# One edited reading: where it was before the flush and where it is now.
+# values_changed is False when only unit/ts_end/... changed (aggregates unaffected).
+Edit = namedtuple("Edit", "old_sensor_id old_ts sensor_id ts values_changed")
+
+_subscribers = []
+
+
+def sensor_uuid(sensor_id):
+    """sensor_id as a uuid.UUID (None stays None)."""
+    if sensor_id is None or isinstance(sensor_id, uuid.UUID):
+        return sensor_id
+    return uuid.UUID(str(sensor_id))
+
+
+class ReadingChanges:
+    __slots__ = ("inserted", "deleted", "edited", "removed_sensors")
+
+    def __init__(self):
+        self.inserted = []            # {"sensor_id", "ts", "value"}
+        self.deleted = []             # (sensor_id, ts)
+        self.edited = []              # Edit
+        self.removed_sensors = set()  # sensor ids deleted in this flush
+
+    def __bool__(self):
+        return bool(self.inserted or self.deleted or self.edited or self.removed_sensors)
+
+
+def subscribe(handler):
+    """handler(session, conn, changes) runs after every flush that touched readings or sensors."""
+    _subscribers.append(handler)
+
+
+def collect(session) -> ReadingChanges:
+    changes = ReadingChanges()
+    for obj in session.deleted:
+        if isinstance(obj, models.Sensor):
+            changes.removed_sensors.add(sensor_uuid(obj.id))
+        elif isinstance(obj, models.SensorReading):
+            changes.deleted.append((sensor_uuid(obj.sensor_id), obj.ts))
+    for obj in session.new:
+        if isinstance(obj, models.SensorReading):
+            changes.inserted.append({"sensor_id": sensor_uuid(obj.sensor_id), "ts": obj.ts, "value": obj.value})
+    for obj in session.dirty:
+        if not isinstance(obj, models.SensorReading):
+            continue
+        state = inspect(obj)
+        old_sid = (state.attrs.sensor_id.history.deleted or [obj.sensor_id])[0]
+        old_ts = (state.attrs.ts.history.deleted or [obj.ts])[0]
+        values_changed = any(state.attrs[attr].history.has_changes() for attr in ("sensor_id", "ts", "value"))
+        changes.edited.append(Edit(sensor_uuid(old_sid), old_ts, sensor_uuid(obj.sensor_id), obj.ts, values_changed))
+    return changes
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _track_orm_changes(session, flush_context):
+    if not _subscribers:
+        return
+    changes = collect(session)
+    if not changes:
+        return
+    conn = session.connection()
+    for handler in _subscribers:
+        handler(session, conn, changes)
@@ -0,0 +1,366 @@
+# app/rollups.py
+"""
+Per-sensor rollups at 1min / 1h / 1d resolution (count, sum, min, max,
+first, last) kept in sensor_rollups.
+
+New readings are folded in with INSERT ... ON CONFLICT DO UPDATE inside the
+loading transaction, so late and out-of-order readings simply merge into
+their bucket. Edits and deletes recompute the touched minute buckets from
+raw rows, then the hours and days above them from the finer rollup.
+On PostgreSQL both paths first take a transaction-scoped advisory lock per
+(sensor, day), so a recompute never overwrites a concurrent insert's
+increment with an aggregate computed before that insert committed.
+
+Resampled reads are served from the coarsest rollup that covers the range;
+only the unaligned edges fall through to finer rollups and, at the very
+ends, to raw readings.
+"""
+import hashlib
+import datetime as dt
+from collections import namedtuple
+from sqlalchemy import case, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models, reading_changes
+from app.reading_changes import UPSERT_CHUNK, sensor_uuid
+
+RESOLUTIONS = ("1min", "1h", "1d")  # finest → coarsest
+STEP = {"1min": dt.timedelta(minutes=1), "1h": dt.timedelta(hours=1), "1d": dt.timedelta(days=1)}
+PG_UNIT = {"1min": "minute", "1h": "hour", "1d": "day"}
+_FINER = {"1min": None, "1h": "1min", "1d": "1h"}
+_COARSER = {"1min": "1h", "1h": "1d", "1d": None}
+
+Resampled = namedtuple("Resampled", "sensor_id bucket agg")
+
+
+def truncate(ts: dt.datetime, resolution: str) -> dt.datetime:
+    """Start of the bucket containing ts (same as Postgres date_trunc)."""
+    if resolution == "1min":
+        return ts.replace(second=0, microsecond=0)
+    if resolution == "1h":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(ts: dt.datetime, resolution: str) -> dt.datetime:
+    start = truncate(ts, resolution)
+    return start if start == ts else start + STEP[resolution]
+
+
+def _naive_utc(ts: dt.datetime) -> dt.datetime:
+    return ts.astimezone(dt.timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+# ───────────────────────────────────────────────
+# ➕ Mergeable aggregate
+# ───────────────────────────────────────────────
+class Agg:
+    """count/sum/min/max/first/last of one bucket; merge() is order independent."""
+
+    __slots__ = ("count", "sum", "min", "max", "first_ts", "first_value", "last_ts", "last_value")
+
+    def __init__(self, count, total, vmin, vmax, first_ts, first_value, last_ts, last_value):
+        self.count = count
+        self.sum = total
+        self.min = vmin
+        self.max = vmax
+        self.first_ts = first_ts
+        self.first_value = first_value
+        self.last_ts = last_ts
+        self.last_value = last_value
+
+    @classmethod
+    def of(cls, ts, value):
+        return cls(1, value, value, value, ts, value, ts, value)
+
+    @classmethod
+    def from_row(cls, r):
+        return cls(r.count, r.sum, r.min, r.max, r.first_ts, r.first_value, r.last_ts, r.last_value)
+
+    def merge(self, other: "Agg") -> "Agg":
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.first_ts < self.first_ts:
+            self.first_ts, self.first_value = other.first_ts, other.first_value
+        if other.last_ts >= self.last_ts:
+            self.last_ts, self.last_value = other.last_ts, other.last_value
+        return self
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count
+
+    def columns(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _fold(aggs: dict, key, agg: Agg):
+    current = aggs.get(key)
+    if current is None:
+        aggs[key] = agg
+    else:
+        current.merge(agg)
+
+
+# ───────────────────────────────────────────────
+# ✍️ Maintenance
+# ───────────────────────────────────────────────
+def _lock_days(conn, keys):
+    """pg_advisory_xact_lock every (sensor_id, day) in keys, in one global order (no deadlocks between writers)."""
+    if conn.dialect.name != "postgresql":
+        return  # SQLite serialises writers anyway
+    ids = sorted({
+        int.from_bytes(hashlib.blake2b(sid.bytes + day.isoformat().encode(), digest_size=8).digest(), "big", signed=True)
+        for sid, day in keys
+    })
+    if ids:
+        conn.execute(text("SELECT count(pg_advisory_xact_lock(k)) FROM unnest(CAST(:keys AS bigint[])) AS k"),
+                     {"keys": ids})
+
+
+def apply_inserts(conn, rows):
+    """
+    Fold newly inserted readings (dicts with sensor_id, ts, value) into every
+    resolution, in the caller's transaction. conn is a SQLAlchemy Connection.
+    """
+    buckets = {}
+    for r in rows:
+        if r.get("sensor_id") is None:
+            continue
+        sid = sensor_uuid(r["sensor_id"])
+        for res in RESOLUTIONS:
+            _fold(buckets, (sid, res, truncate(r["ts"], res)), Agg.of(r["ts"], r["value"]))
+    if not buckets:
+        return
+
+    if conn.dialect.name != "postgresql":
+        recompute(conn, {(sid, bucket) for sid, res, bucket in buckets if res == "1min"})
+        return
+
+    _lock_days(conn, {(sid, bucket) for sid, res, bucket in buckets if res == "1d"})
+    table = models.SensorRollup.__table__
+    values = [
+        {"sensor_id": sid, "resolution": res, "bucket": bucket, **agg.columns()}
+        for (sid, res, bucket), agg in buckets.items()
+    ]
+    for i in range(0, len(values), UPSERT_CHUNK):
+        stmt = pg_insert(table).values(values[i:i + UPSERT_CHUNK])
+        new, old = stmt.excluded, table.c
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["sensor_id", "resolution", "bucket"],
+            set_={
+                "count": old["count"] + new["count"],
+                "sum": old["sum"] + new["sum"],
+                "min": func.least(old["min"], new["min"]),
+                "max": func.greatest(old["max"], new["max"]),
+                "first_ts": func.least(old["first_ts"], new["first_ts"]),
+                "first_value": case(
+                    (new["first_ts"] < old["first_ts"], new["first_value"]), else_=old["first_value"]
+                ),
+                "last_ts": func.greatest(old["last_ts"], new["last_ts"]),
+                "last_value": case(
+                    (new["last_ts"] >= old["last_ts"], new["last_value"]), else_=old["last_value"]
+                ),
+            },
+        ))
+
+
+def _aggregate_bucket(conn, sid, resolution: str, bucket: dt.datetime) -> Agg | None:
+    """Recompute one bucket: minutes from raw readings, coarser levels from the finer rollup."""
+    end = bucket + STEP[resolution]
+    agg = None
+    if resolution == "1min":
+        t = models.SensorReading.__table__
+        rows = conn.execute(
+            select(t.c.ts, t.c.value)
+            .where(t.c.sensor_id == sid, t.c.ts >= bucket, t.c.ts < end)
+            .order_by(t.c.ts, t.c.id)
+        )
+        for ts, value in rows:
+            agg = agg.merge(Agg.of(ts, value)) if agg else Agg.of(ts, value)
+    else:
+        r = models.SensorRollup.__table__
+        rows = conn.execute(
+            select(*(r.c[name] for name in Agg.__slots__)).where(
+                r.c.sensor_id == sid,
+                r.c.resolution == _FINER[resolution],
+                r.c.bucket >= bucket,
+                r.c.bucket < end,
+            )
+        )
+        for row in rows:
+            agg = agg.merge(Agg(*row)) if agg else Agg(*row)
+    return agg
+
+
+def recompute(conn, minutes):
+    """Rebuild the given (sensor_id, minute bucket) pairs and the hours/days above them."""
+    r = models.SensorRollup.__table__
+    touched = {(sensor_uuid(sid), truncate(ts, "1min")) for sid, ts in minutes if sid is not None}
+    # Taken before the minutes are read, so inserts committed while we waited are counted
+    _lock_days(conn, {(sid, truncate(bucket, "1d")) for sid, bucket in touched})
+    for res in RESOLUTIONS:
+        for sid, bucket in touched:
+            agg = _aggregate_bucket(conn, sid, res, bucket)
+            conn.execute(r.delete().where(
+                r.c.sensor_id == sid, r.c.resolution == res, r.c.bucket == bucket
+            ))
+            if agg is not None:
+                conn.execute(r.insert().values(sensor_id=sid, resolution=res, bucket=bucket, **agg.columns()))
+        if _COARSER[res]:
+            touched = {(sid, truncate(bucket, _COARSER[res])) for sid, bucket in touched}
+
+
+def _on_reading_changes(session, conn, changes):
+    """Keep rollups in step with readings added, edited or deleted through the ORM."""
+    gone = changes.removed_sensors
+    dirty = set(changes.deleted)
+    for e in changes.edited:
+        if e.values_changed:
+            dirty.add((e.old_sensor_id, e.old_ts))
+            dirty.add((e.sensor_id, e.ts))
+    apply_inserts(conn, [r for r in changes.inserted if r["sensor_id"] not in gone])
+    recompute(conn, {(sid, ts) for sid, ts in dirty if sid not in gone and ts is not None})
+    if gone:
+        r = models.SensorRollup.__table__
+        conn.execute(r.delete().where(r.c.sensor_id.in_(gone)))
+
+
+reading_changes.subscribe(_on_reading_changes)
+
+
+# ───────────────────────────────────────────────
+# 📈 Reads
+# ───────────────────────────────────────────────
+def _plan(start: dt.datetime, stop: dt.datetime, resolution: str | None):
+    """Split [start, stop) into (resolution, lo, hi) segments, coarsest first; None = raw rows."""
+    if start >= stop:
+        return []
+    if resolution is None:
+        return [(None, start, stop)]
+    lo, hi = _ceil(start, resolution), truncate(stop, resolution)
+    finer = _FINER[resolution]
+    if lo >= hi:
+        return _plan(start, stop, finer)
+    return [(resolution, lo, hi)] + _plan(start, lo, finer) + _plan(hi, stop, finer)
+
+
+def resample(db: Session, sensor_ids, start: dt.datetime, end: dt.datetime, resolution: str) -> list[Resampled]:
+    """
+    Buckets at `resolution` for readings with start <= ts <= end, ordered by
+    bucket. Equivalent to date_trunc + aggregate over raw rows.
+    """
+    aggs = {}
+    start, stop = _naive_utc(start), _naive_utc(end) + dt.timedelta(microseconds=1)
+    for seg_res, lo, hi in _plan(start, stop, resolution):
+        if seg_res is None:
+            rows = (
+                db.query(models.SensorReading.sensor_id, models.SensorReading.ts, models.SensorReading.value)
+                .filter(
+                    models.SensorReading.sensor_id.in_(sensor_ids),
+                    models.SensorReading.ts >= lo,
+                    models.SensorReading.ts < hi,
+                )
+            )
+            for sid, ts, value in rows:
+                _fold(aggs, (sid, truncate(ts, resolution)), Agg.of(ts, value))
+        else:
+            rows = db.query(models.SensorRollup).filter(
+                models.SensorRollup.sensor_id.in_(sensor_ids),
+                models.SensorRollup.resolution == seg_res,
+                models.SensorRollup.bucket >= lo,
+                models.SensorRollup.bucket < hi,
+            )
+            for row in rows:
+                _fold(aggs, (row.sensor_id, truncate(row.bucket, resolution)), Agg.from_row(row))
+
+    return [
+        Resampled(sid, bucket, agg)
+        for (sid, bucket), agg in sorted(aggs.items(), key=lambda kv: (kv[0][1], str(kv[0][0])))
+    ]
+
+
+# ───────────────────────────────────────────────
+# 🔁 Rebuild (backfill / repair)
+# ───────────────────────────────────────────────
+_PG_REBUILD_MINUTES = text("""
+    INSERT INTO sensor_rollups
+        (sensor_id, resolution, bucket, count, sum, min, max, first_ts, first_value, last_ts, last_value)
+    SELECT sensor_id, '1min', date_trunc('minute', ts), count(*), sum(value), min(value), max(value),
+           min(ts), (array_agg(value ORDER BY ts, id))[1],
+           max(ts), (array_agg(value ORDER BY ts DESC, id DESC))[1]
+    FROM sensor_readings
+    WHERE sensor_id = :sid
+    GROUP BY sensor_id, date_trunc('minute', ts)
+""")
+
+_PG_REBUILD_LEVEL = """
+    INSERT INTO sensor_rollups
+        (sensor_id, resolution, bucket, count, sum, min, max, first_ts, first_value, last_ts, last_value)
+    SELECT sensor_id, :res, date_trunc('{unit}', bucket), sum(count), sum(sum), min(min), max(max),
+           min(first_ts), (array_agg(first_value ORDER BY first_ts))[1],
+           max(last_ts), (array_agg(last_value ORDER BY last_ts DESC))[1]
+    FROM sensor_rollups
+    WHERE sensor_id = :sid AND resolution = :finer
+    GROUP BY sensor_id, date_trunc('{unit}', bucket)
+"""
+
+
+def _rebuild_python(db: Session, sid, batch_size: int) -> int:
+    """Portable rebuild: one ordered pass over the raw rows, flushing closed buckets."""
+    table = models.SensorRollup.__table__
+    current, out, written = {}, [], 0
+    rows = (
+        db.query(models.SensorReading.ts, models.SensorReading.value)
+        .filter(models.SensorReading.sensor_id == sid)
+        .order_by(models.SensorReading.ts, models.SensorReading.id)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for ts, value in rows:
+        for res in RESOLUTIONS:
+            bucket = truncate(ts, res)
+            cur = current.get(res)
+            if cur is not None and cur[0] == bucket:
+                cur[1].merge(Agg.of(ts, value))
+                continue
+            if cur is not None:
+                out.append({"sensor_id": sid, "resolution": res, "bucket": cur[0], **cur[1].columns()})
+            current[res] = (bucket, Agg.of(ts, value))
+        if len(out) >= batch_size:
+            db.execute(table.insert(), out)
+            written += len(out)
+            out = []
+    out.extend(
+        {"sensor_id": sid, "resolution": res, "bucket": bucket, **agg.columns()}
+        for res, (bucket, agg) in current.items()
+    )
+    if out:
+        db.execute(table.insert(), out)
+        written += len(out)
+    return written
+
+
+def rebuild(db: Session, sensor_ids=None, batch_size: int = 5000) -> int:
+    """Recompute all rollups for the given sensors (default: every sensor); commits per sensor."""
+    if sensor_ids is None:
+        sensor_ids = [sid for (sid,) in db.query(models.Sensor.id)]
+    pg = db.get_bind().dialect.name == "postgresql"
+    written = 0
+    for sid in map(sensor_uuid, sensor_ids):
+        db.query(models.SensorRollup).filter(models.SensorRollup.sensor_id == sid).delete(synchronize_session=False)
+        if pg:
+            db.execute(_PG_REBUILD_MINUTES, {"sid": sid})
+            for res in RESOLUTIONS[1:]:
+                db.execute(
+                    text(_PG_REBUILD_LEVEL.format(unit=PG_UNIT[res])),
+                    {"sid": sid, "res": res, "finer": _FINER[res]},
+                )
+            written += db.query(models.SensorRollup).filter(models.SensorRollup.sensor_id == sid).count()
+        else:
+            written += _rebuild_python(db, sid, batch_size)
+        db.commit()
+    return written
@@ -1,21 +1,16 @@
 from fastapi import APIRouter
-import sqlite3
+from app import sqlite_db
 
 router = APIRouter()
 
 @router.get("/admin/sensors")
 def get_sensor_data():
-    conn = sqlite3.connect("storage/sensors.db")
-    cursor = conn.cursor()
-
-    cursor.execute("""
+    rows = sqlite_db.query("storage/sensors.db", """
         SELECT sensor_id, start_timestamp, end_timestamp, value, unit
         FROM sensors
         ORDER BY start_timestamp DESC
         LIMIT 100
     """)
-    rows = cursor.fetchall()
-    conn.close()
 
     data = [
         {
@@ -8,3 +8,9 @@ class UserCreate(BaseModel):
 class UserLogin(BaseModel):
     username: str
     password: str
+
+class VideoUploadInit(BaseModel):
+    filename: str
+    content_type: str | None = None
+    part_size: int | None = None     # bytes per part (5–100 MB); server default if omitted
+    size_bytes: int | None = None    # total size, checked on complete when given
@@ -0,0 +1,190 @@
+# app/sensor_registry.py
+"""
+In-process (owner_id, sensor name) → sensor UUID registry for the ingest path.
+
+Lookups hit a bounded LRU; misses fall through to one SELECT and, for new
+sensors, a race-safe INSERT ... ON CONFLICT DO NOTHING on the
+uq_sensors_owner_name constraint. Newly created ids are only cached once
+the creating transaction commits. Deletes and renames are broadcast to
+other workers via pg_notify.
+"""
+import os
+import uuid
+import threading
+import datetime as dt
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models, pg_notify
+from app.database import SessionLocal
+
+REGISTRY_MAX = int(os.getenv("SENSOR_REGISTRY_MAX", "100000"))
+CHANNEL = "sensor_registry"
+_PENDING_KEY = "sensor_registry_pending"
+
+
+class SensorRegistry:
+    """Thread-safe bounded LRU map of (owner_id, name) → sensor id."""
+
+    def __init__(self, maxsize: int = REGISTRY_MAX):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            sid = self._data.get(key)
+            if sid is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return sid
+
+    def put(self, key, sid):
+        with self._lock:
+            self._data[key] = sid
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "max": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+registry = SensorRegistry()
+
+
+def _key(owner_id, name: str):
+    return (str(owner_id) if owner_id else None, name)
+
+
+# ───────────────────────────────────────────────
+# 🔎 Resolution
+# ───────────────────────────────────────────────
+def resolve_many(db: Session, owner_id, names) -> tuple[dict, int]:
+    """
+    Map sensor names → ids for one owner, creating missing sensors in the
+    session's current transaction. Returns (mapping, number_created).
+    """
+    mapping, missing = {}, []
+    for name in set(names):
+        sid = registry.get(_key(owner_id, name))
+        if sid is None:
+            missing.append(name)
+        else:
+            mapping[name] = sid
+    if not missing:
+        return mapping, 0
+
+    found = dict(
+        db.query(models.Sensor.name, models.Sensor.id)
+        .filter(models.Sensor.owner_id == owner_id, models.Sensor.name.in_(missing))
+        .all()
+    )
+    for name, sid in found.items():
+        registry.put(_key(owner_id, name), sid)
+    mapping.update(found)
+
+    to_create = [n for n in missing if n not in found]
+    if not to_create:
+        return mapping, 0
+
+    created = _insert_missing(db, owner_id, to_create)
+    pending = db.info.setdefault(_PENDING_KEY, {})
+    for name, sid in created.items():
+        pending[_key(owner_id, name)] = sid
+    mapping.update(created)
+
+    # Lost a creation race to another worker: the row exists now, read it
+    lost = [n for n in to_create if n not in created]
+    if lost:
+        raced = dict(
+            db.query(models.Sensor.name, models.Sensor.id)
+            .filter(models.Sensor.owner_id == owner_id, models.Sensor.name.in_(lost))
+            .all()
+        )
+        for name, sid in raced.items():
+            registry.put(_key(owner_id, name), sid)
+        mapping.update(raced)
+    return mapping, len(created)
+
+
+def get_or_create(db: Session, owner_id, name: str):
+    """Return the sensor id for (owner_id, name), creating it if needed."""
+    return resolve_many(db, owner_id, [name])[0][name]
+
+
+def _insert_missing(db: Session, owner_id, names: list[str]) -> dict:
+    """INSERT ... ON CONFLICT DO NOTHING; returns only the rows this call created."""
+    now = dt.datetime.utcnow()
+    values = [{"id": uuid.uuid4(), "name": n, "owner_id": owner_id, "created_at": now} for n in names]
+    table = models.Sensor.__table__
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = (
+            pg_insert(table)
+            .values(values)
+            .on_conflict_do_nothing(index_elements=["owner_id", "name"])
+            .returning(table.c.name, table.c.id)
+        )
+        return {name: sid for name, sid in db.execute(stmt)}
+
+    db.execute(table.insert(), values)
+    return {v["name"]: v["id"] for v in values}
+
+
+# ───────────────────────────────────────────────
+# ♻️ Invalidation
+# ───────────────────────────────────────────────
+@event.listens_for(SessionLocal, "after_commit")
+def _promote_pending(session):
+    for key, sid in session.info.pop(_PENDING_KEY, {}).items():
+        registry.put(key, sid)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _broadcast(connection, owner_id, name):
+    key = _key(owner_id, name)
+    registry.invalidate(key)
+    pg_notify.publish(connection, CHANNEL, list(key))
+
+
+@event.listens_for(models.Sensor, "after_delete")
+def _sensor_deleted(mapper, connection, target):
+    _broadcast(connection, target.owner_id, target.name)
+
+
+@event.listens_for(models.Sensor, "after_update")
+def _sensor_updated(mapper, connection, target):
+    state = inspect(target)
+    name_hist = state.attrs.name.history
+    owner_hist = state.attrs.owner_id.history
+    if name_hist.has_changes() or owner_hist.has_changes():
+        old_name = (name_hist.deleted or [target.name])[0]
+        old_owner = (owner_hist.deleted or [target.owner_id])[0]
+        _broadcast(connection, old_owner, old_name)
+
+
+def _on_notify(payload):
+    registry.invalidate(tuple(payload) if payload else None)
+
+
+pg_notify.subscribe(CHANNEL, _on_notify)
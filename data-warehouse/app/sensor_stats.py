@@ -0,0 +1,191 @@
+# app/sensor_stats.py
+"""
+sensor_stats: one catalog row per sensor (first_ts, last_ts, row_count,
+last_value, last_ingest_at), so listings and dashboards read O(#sensors)
+rows instead of aggregating sensor_readings.
+
+New readings are folded in with INSERT ... ON CONFLICT DO UPDATE inside the
+loading transaction (same as the rollups). Edits and deletes adjust
+row_count and re-read the first and last reading of the touched sensors,
+which is two index lookups on (sensor_id, ts, id).
+"""
+import datetime as dt
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models, reading_changes
+from app.reading_changes import UPSERT_CHUNK, sensor_uuid
+
+
+# ───────────────────────────────────────────────
+# ✍️ Maintenance
+# ───────────────────────────────────────────────
+def apply_inserts(conn, rows, now: dt.datetime | None = None):
+    """Fold newly inserted readings (dicts with sensor_id, ts, value) into the catalog."""
+    stats = {}
+    for r in rows:
+        if r.get("sensor_id") is None:
+            continue
+        sid, ts, value = sensor_uuid(r["sensor_id"]), r["ts"], r["value"]
+        s = stats.get(sid)
+        if s is None:
+            stats[sid] = {"row_count": 1, "first_ts": ts, "last_ts": ts, "last_value": value}
+            continue
+        s["row_count"] += 1
+        if ts < s["first_ts"]:
+            s["first_ts"] = ts
+        if ts >= s["last_ts"]:
+            s["last_ts"], s["last_value"] = ts, value
+    if not stats:
+        return
+
+    now = now or dt.datetime.utcnow()
+    # Sorted, so concurrent loads lock catalog rows in the same order
+    values = [{"sensor_id": sid, "last_ingest_at": now, **stats[sid]} for sid in sorted(stats)]
+    table = models.SensorStats.__table__
+    if conn.dialect.name != "postgresql":
+        for v in values:
+            _merge_portable(conn, v)
+        return
+
+    for i in range(0, len(values), UPSERT_CHUNK):
+        stmt = pg_insert(table).values(values[i:i + UPSERT_CHUNK])
+        new, old = stmt.excluded, table.c
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["sensor_id"],
+            set_={
+                "row_count": old.row_count + new.row_count,
+                "first_ts": func.least(old.first_ts, new.first_ts),
+                "last_ts": func.greatest(old.last_ts, new.last_ts),
+                "last_value": case(
+                    (old.last_ts.is_(None) | (new.last_ts >= old.last_ts), new.last_value),
+                    else_=old.last_value,
+                ),
+                "last_ingest_at": new.last_ingest_at,
+            },
+        ))
+
+
+def _merge_portable(conn, v: dict):
+    table = models.SensorStats.__table__
+    cur = conn.execute(select(table).where(table.c.sensor_id == v["sensor_id"])).first()
+    if cur is None:
+        conn.execute(table.insert().values(**v))
+        return
+    merged = {"row_count": cur.row_count + v["row_count"], "last_ingest_at": v["last_ingest_at"]}
+    merged["first_ts"] = v["first_ts"] if cur.first_ts is None else min(cur.first_ts, v["first_ts"])
+    if cur.last_ts is None or v["last_ts"] >= cur.last_ts:
+        merged["last_ts"], merged["last_value"] = v["last_ts"], v["last_value"]
+    conn.execute(table.update().where(table.c.sensor_id == v["sensor_id"]).values(**merged))
+
+
+def adjust(conn, deltas: dict, touched):
+    """Apply row_count deltas ({sensor_id: n}) and re-read first/last for the touched sensors."""
+    table = models.SensorStats.__table__
+    r = models.SensorReading.__table__
+    for sid, delta in sorted(deltas.items()):
+        if delta:
+            conn.execute(table.update().where(table.c.sensor_id == sid).values(row_count=table.c.row_count + delta))
+    for sid in sorted(touched):
+        first = conn.execute(
+            select(r.c.ts).where(r.c.sensor_id == sid).order_by(r.c.ts, r.c.id).limit(1)
+        ).scalar()
+        last = conn.execute(
+            select(r.c.ts, r.c.value).where(r.c.sensor_id == sid).order_by(r.c.ts.desc(), r.c.id.desc()).limit(1)
+        ).first()
+        conn.execute(table.update().where(table.c.sensor_id == sid).values(
+            first_ts=first,
+            last_ts=last[0] if last else None,
+            last_value=last[1] if last else None,
+        ))
+
+
+def _on_reading_changes(session, conn, changes):
+    """Keep the catalog in step with readings added, edited or deleted through the ORM."""
+    gone = changes.removed_sensors
+    deltas, touched = {}, set()
+    for sid, _ in changes.deleted:
+        if sid is not None:
+            deltas[sid] = deltas.get(sid, 0) - 1
+            touched.add(sid)
+    for e in changes.edited:
+        if not e.values_changed:
+            continue
+        if e.old_sensor_id != e.sensor_id:
+            # Moved to another sensor: one reading less there, one more here
+            for sid, delta in ((e.old_sensor_id, -1), (e.sensor_id, 1)):
+                if sid is not None:
+                    deltas[sid] = deltas.get(sid, 0) + delta
+        touched.update(sid for sid in (e.old_sensor_id, e.sensor_id) if sid is not None)
+
+    apply_inserts(conn, [r for r in changes.inserted if r["sensor_id"] not in gone])
+    adjust(conn, {sid: d for sid, d in deltas.items() if sid not in gone}, touched - gone)
+    if gone:
+        table = models.SensorStats.__table__
+        conn.execute(table.delete().where(table.c.sensor_id.in_(gone)))
+
+
+reading_changes.subscribe(_on_reading_changes)
+
+
+# ───────────────────────────────────────────────
+# 📖 Reads
+# ───────────────────────────────────────────────
+def catalog(db: Session, owner_id=None) -> list[dict]:
+    """Every sensor (or one owner's) with its catalog row; sensors never loaded have zero rows."""
+    q = (
+        db.query(models.Sensor, models.SensorStats)
+        .outerjoin(models.SensorStats, models.SensorStats.sensor_id == models.Sensor.id)
+        .order_by(models.Sensor.name)
+    )
+    if owner_id is not None:
+        q = q.filter(models.Sensor.owner_id == owner_id)
+    return [
+        {
+            "sensor_id": str(sensor.id),
+            "name": sensor.name,
+            "owner_id": str(sensor.owner_id) if sensor.owner_id else None,
+            "first_ts": stats.first_ts.isoformat() if stats and stats.first_ts else None,
+            "last_ts": stats.last_ts.isoformat() if stats and stats.last_ts else None,
+            "row_count": stats.row_count if stats else 0,
+            "last_value": stats.last_value if stats else None,
+            "last_ingest_at": stats.last_ingest_at.isoformat() if stats and stats.last_ingest_at else None,
+        }
+        for sensor, stats in q
+    ]
+
+
+def extent(db: Session, sensor_id):
+    """(first_ts, last_ts) of one sensor, or (None, None) if it has no readings."""
+    row = db.query(models.SensorStats.first_ts, models.SensorStats.last_ts).filter(
+        models.SensorStats.sensor_id == sensor_id
+    ).first()
+    return (row[0], row[1]) if row else (None, None)
+
+
+# ───────────────────────────────────────────────
+# 🔁 Rebuild (backfill / repair)
+# ───────────────────────────────────────────────
+def rebuild(db: Session, sensor_ids=None) -> int:
+    """Recompute catalog rows for the given sensors (default: every sensor); commits per sensor."""
+    if sensor_ids is None:
+        sensor_ids = [sid for (sid,) in db.query(models.Sensor.id)]
+    r = models.SensorReading
+    table = models.SensorStats.__table__
+    written = 0
+    for sid in map(sensor_uuid, sensor_ids):
+        count, first_ts, last_ts, last_ingest = db.query(
+            func.count(r.id), func.min(r.ts), func.max(r.ts), func.max(r.created_at)
+        ).filter(r.sensor_id == sid).one()
+        last = (
+            db.query(r.value).filter(r.sensor_id == sid).order_by(r.ts.desc(), r.id.desc()).first()
+        )
+        db.execute(table.delete().where(table.c.sensor_id == sid))
+        db.execute(table.insert().values(
+            sensor_id=sid, first_ts=first_ts, last_ts=last_ts, row_count=count,
+            last_value=last[0] if last else None, last_ingest_at=last_ingest,
+        ))
+        db.commit()
+        written += 1
+    return written
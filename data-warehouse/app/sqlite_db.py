@@ -0,0 +1,106 @@
+# app/sqlite_db.py
+"""
+Shared access layer for the legacy SQLite stores (uploads metadata in
+datawarehouse.db, edge sensor rows in storage/sensors.db).
+
+- One persistent connection per (thread, database file), so sqlite3's
+  prepared-statement cache survives between requests
+- WAL journaling: readers never block on a writer and vice versa
+- synchronous=NORMAL, a larger page cache, mmap reads and a busy timeout
+  instead of immediate "database is locked" errors
+- Autocommit by default; transaction() groups writes into one
+  BEGIN IMMEDIATE ... COMMIT
+"""
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")         # WAL + NORMAL is crash safe
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "20000"))
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+_local = threading.local()
+_all = []  # every connection opened, for close_all()
+_all_lock = threading.Lock()
+_generation = 0  # bumped by close_all(); threads then reopen lazily
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """This thread's connection to path (opened and tuned on first use)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None or _local.generation != _generation:
+        conns = _local.conns = {}
+        _local.generation = _generation
+    conn = conns.get(path)
+    if conn is None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(
+            path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,          # autocommit; see transaction()
+            check_same_thread=False,       # only so close_all() can run at shutdown
+            cached_statements=SQLITE_STATEMENT_CACHE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conns[path] = conn
+        with _all_lock:
+            _all.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction(path: str):
+    """
+    BEGIN IMMEDIATE ... COMMIT on this thread's connection (ROLLBACK on error).
+    IMMEDIATE takes the write lock up front, so two writers queue on the
+    busy timeout instead of deadlocking on a lock upgrade.
+    """
+    conn = connect(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def query(path: str, sql: str, params=()) -> list[tuple]:
+    return connect(path).execute(sql, params).fetchall()
+
+
+def query_one(path: str, sql: str, params=()):
+    return connect(path).execute(sql, params).fetchone()
+
+
+def execute(path: str, sql: str, params=()) -> sqlite3.Cursor:
+    """One autocommitted statement; returns the cursor (rowcount, lastrowid)."""
+    return connect(path).execute(sql, params)
+
+
+def close_all():
+    """Close every pooled connection (application shutdown)."""
+    global _generation
+    with _all_lock:
+        conns, _all[:] = list(_all), []
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ Closing SQLite connection failed: {e}")
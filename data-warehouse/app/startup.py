@@ -0,0 +1,204 @@
+# app/startup.py
+"""
+Startup orchestration: the one-time work a worker needs before serving,
+kept off the import path and timed.
+
+- Schema creation (create_all) runs under a cluster-wide lock: a Postgres
+  advisory lock, or a lock file on other databases. Workers booting together
+  take turns instead of racing on DDL, and after the first the work is a
+  no-op catalog check. The sensor_readings partitions for the current
+  period are created in the same step, before the maintenance thread runs.
+- The local → MinIO migration runs as a background job, started by whichever
+  worker on the host takes the migration lock file. The lock is held until
+  the job ends, and the admin endpoint and migrate_to_minio.py take the same
+  lock, so no second copy starts while one runs.
+- MinIO itself is connected lazily (app/object_store.py), so an outage
+  fails the requests that need it, not the boot.
+- Every step is timed. Cold start is measured from process start, so it
+  covers interpreter start-up and imports as well.
+"""
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STARTUP_LOCK_DIR = os.getenv("STARTUP_LOCK_DIR", "storage")
+STARTUP_MIGRATE_MINIO = os.getenv("STARTUP_MIGRATE_MINIO", "true").lower() == "true"
+_SCHEMA_LOCK_KEY = 0x5E45_0002  # pg_advisory_lock key for startup DDL
+
+
+def _process_started() -> float:
+    """Unix time this process started (Linux /proc), else the import time of this module."""
+    try:
+        with open("/proc/self/stat") as f:
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat") as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith("btime"))
+        return btime + ticks / os.sysconf("SC_CLK_TCK")
+    except Exception:
+        return time.time()
+
+
+PROCESS_STARTED = _process_started()
+
+
+class StartupReport:
+    def __init__(self):
+        self.steps = []            # {"name", "seconds", "status"}
+        self.hook_started = None
+        self.ready_at = None
+        self.migration = "not started"
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except Exception:
+            status = "failed"
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self.steps.append({"name": name, "seconds": round(seconds, 3), "status": status})
+            logger.info(f"⏱️ startup {name}: {seconds * 1000:.0f} ms ({status})")
+
+    def begin(self):
+        self.hook_started = time.time()
+
+    def ready(self):
+        self.ready_at = time.time()
+        logger.info(
+            f"✅ Worker {os.getpid()} ready: cold start {self.ready_at - PROCESS_STARTED:.2f} s "
+            f"(imports {self.hook_started - PROCESS_STARTED:.2f} s, startup {self.ready_at - self.hook_started:.2f} s)"
+        )
+
+    def as_dict(self) -> dict:
+        out = {"pid": os.getpid(), "steps": list(self.steps), "migration": self.migration}
+        if self.hook_started is not None:
+            out["import_s"] = round(self.hook_started - PROCESS_STARTED, 3)
+        if self.ready_at is not None:
+            out["startup_s"] = round(self.ready_at - self.hook_started, 3)
+            out["cold_start_s"] = round(self.ready_at - PROCESS_STARTED, 3)
+        return out
+
+
+report = StartupReport()
+
+
+# ───────────────────────────────────────────────
+# 🔒 Cross-worker locks
+# ───────────────────────────────────────────────
+def _lock_file(name: str):
+    os.makedirs(STARTUP_LOCK_DIR, exist_ok=True)
+    return open(os.path.join(STARTUP_LOCK_DIR, f".{name}.lock"), "a+")
+
+
+@contextmanager
+def schema_lock(engine):
+    """Held by one worker at a time across the cluster (Postgres) or the host (lock file)."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _SCHEMA_LOCK_KEY})
+        return
+    fh = _lock_file("schema")
+    try:
+        if fcntl:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+    finally:
+        fh.close()  # releases the flock
+
+
+def ensure_schema(engine, metadata):
+    """create_all, then (PostgreSQL) the DEFAULT and current reading partitions, so a fresh install can insert at once."""
+    from app import partitions
+
+    with report.step("schema"), schema_lock(engine):
+        metadata.create_all(bind=engine)
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                if partitions.is_partitioned(conn):
+                    partitions.ensure_partitions(conn)
+
+
+# ───────────────────────────────────────────────
+# 📦 MinIO migration (one per host: startup, admin POST and CLI share the lock)
+# ───────────────────────────────────────────────
+_migration_start = threading.Lock()
+
+
+def _try_migration_lock():
+    """The held migration lock file, or None if another process on this host is migrating."""
+    fh = _lock_file("minio_migrate")
+    if fcntl:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return None
+    return fh
+
+
+def start_migration() -> dict | None:
+    """
+    Start the MinIO migration on a background thread unless one is already
+    running on this host. Returns its status (this worker's run, new or
+    already going), or None when another process holds the lock.
+    """
+    from storage import minio_migrate
+
+    with _migration_start:
+        current = minio_migrate.status()
+        if current and current["running"]:
+            return current
+        fh = _try_migration_lock()
+        if fh is None:
+            report.migration = "running in another worker"
+            return None
+        report.migration = "running"
+
+        def _done():
+            report.migration = "finished"
+            fh.close()  # releases the flock for the next run
+
+        return minio_migrate.start_background(on_done=_done)
+
+
+def migrate_at_startup():
+    if not STARTUP_MIGRATE_MINIO:
+        report.migration = "disabled"
+        return
+    with report.step("migration start"):
+        start_migration()
+
+
+def run_migration() -> dict | None:
+    """Run a migration in this thread under the host lock (CLI); None if one is already running."""
+    from storage import minio_migrate
+
+    fh = _try_migration_lock()
+    if fh is None:
+        return None
+    try:
+        return minio_migrate.migrate_local_files_to_minio()
+    finally:
+        fh.close()
+
+
+def ready():
+    if report.ready_at is None:
+        report.ready()
@@ -0,0 +1,446 @@
+# app/storage_ledger.py
+"""
+Storage usage ledger: per-file sizes plus running totals, so the admin
+storage endpoints are reads of a few rows instead of a filesystem walk.
+
+Each scope is a local directory or the MinIO bucket with its own
+classifier:
+- storage_entries: one row per tracked file or object (scope, key, category, size)
+- storage_totals: files and bytes per (scope, category, size bucket)
+
+Upload, delete and migration code calls record()/forget() (or
+record_object()/forget_object()). Anything written outside those paths,
+such as the growing sensors.db and CSV or files copied in by hand, is
+picked up by a background reconciliation scan every
+STORAGE_RECONCILE_INTERVAL seconds. Only one worker runs a given scope's
+scan at a time. The same thread also aborts abandoned video uploads
+(app/video_uploads.sweep_abandoned).
+
+The ledger lives in the shared SQLite database, so every worker sees the
+same totals.
+"""
+import os
+import time
+import bisect
+import logging
+import threading
+
+from app import sqlite_db
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+LEDGER_DB = os.getenv("STORAGE_LEDGER_DB", "datawarehouse.db")
+RECONCILE_INTERVAL = float(os.getenv("STORAGE_RECONCILE_INTERVAL", "3600"))
+RECONCILE_BATCH = 1000
+MB = 1024 * 1024
+BUCKET_EDGES_MB = (1, 10, 100, 1000)  # size histogram: <1MB, 1–10MB, 10–100MB, 100MB–1GB, >1GB
+BUCKET_LABELS = ("<1MB", "1–10MB", "10–100MB", "100MB–1GB", ">1GB")
+
+IMAGE_EXT = {"jpg", "jpeg", "png", "gif"}
+DOCUMENT_EXT = {"pdf", "doc", "docx", "txt", "xlsx", "pptx"}
+VIDEO_EXT = {"mp4", "avi", "mov", "mkv"}
+
+
+def file_kind(name: str) -> str:
+    """images | documents | videos | others, by extension."""
+    ext = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+    if ext in IMAGE_EXT:
+        return "images"
+    if ext in DOCUMENT_EXT:
+        return "documents"
+    if ext in VIDEO_EXT:
+        return "videos"
+    return "others"
+
+
+def _storage_kind(key: str) -> str:
+    # Same split the admin dashboard has always shown for storage/
+    root, name = os.path.split(key)
+    if "videos" in root:
+        return "videos"
+    if "sensor" in root or name.endswith((".db", ".csv")):
+        return "sensors"
+    return "others"
+
+
+def _files_kind(key: str) -> str:
+    kind = file_kind(key)
+    return "others" if kind == "videos" else kind
+
+
+class Scope:
+    def __init__(self, name: str, classify, root: str | None = None, recursive: bool = True):
+        self.name = name
+        self.classify = classify
+        self.root = os.path.normpath(root) if root else None  # None: MinIO bucket
+        self.recursive = recursive
+
+    def contains(self, key: str) -> bool:
+        if self.root is None:
+            return False
+        if not self.recursive:
+            return os.path.dirname(key) == self.root
+        return key.startswith(self.root + os.sep)
+
+
+SCOPES = {
+    "storage": Scope("storage", _storage_kind, "storage"),
+    "files": Scope("files", _files_kind, "storage/files"),
+    "videos": Scope("videos", lambda key: "videos", "storage/videos", recursive=False),
+    "minio": Scope("minio", file_kind),
+}
+
+
+def bucket_of(size: int) -> int:
+    return bisect.bisect_right(BUCKET_EDGES_MB, size / MB)
+
+
+# ───────────────────────────────────────────────
+# 🗄️ Schema
+# ───────────────────────────────────────────────
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with sqlite_db.transaction(LEDGER_DB) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage_entries (
+                    scope TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    seen REAL NOT NULL,
+                    PRIMARY KEY (scope, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_storage_entries_size ON storage_entries (scope, size)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage_totals (
+                    scope TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    files INTEGER NOT NULL,
+                    bytes INTEGER NOT NULL,
+                    PRIMARY KEY (scope, category, bucket)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS storage_scans (
+                    scope TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL DEFAULT 0,
+                    finished_at REAL,
+                    files INTEGER,
+                    changed INTEGER
+                )
+            """)
+        _schema_ready = True
+
+
+# ───────────────────────────────────────────────
+# ✍️ Events
+# ───────────────────────────────────────────────
+def _bump(conn, scope: str, category: str, size: int, sign: int):
+    conn.execute("""
+        INSERT INTO storage_totals (scope, category, bucket, files, bytes) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (scope, category, bucket)
+        DO UPDATE SET files = files + excluded.files, bytes = bytes + excluded.bytes
+    """, (scope, category, bucket_of(size), sign, sign * size))
+    if sign < 0:
+        conn.execute("""
+            DELETE FROM storage_totals WHERE scope = ? AND category = ? AND bucket = ? AND files = 0
+        """, (scope, category, bucket_of(size)))
+
+
+def _apply(conn, scope: Scope, key: str, size: int | None, now: float) -> bool:
+    """Set (or, with size None, drop) one entry and move its totals; True if anything changed."""
+    old = conn.execute(
+        "SELECT category, size FROM storage_entries WHERE scope = ? AND key = ?", (scope.name, key)
+    ).fetchone()
+    category = scope.classify(key) if size is not None else None
+    if old is not None and size is not None and old == (category, size):
+        conn.execute("UPDATE storage_entries SET seen = ? WHERE scope = ? AND key = ?", (now, scope.name, key))
+        return False
+    if old is not None:
+        _bump(conn, scope.name, old[0], old[1], -1)
+    if size is None:
+        if old is None:
+            return False
+        conn.execute("DELETE FROM storage_entries WHERE scope = ? AND key = ?", (scope.name, key))
+        return True
+    _bump(conn, scope.name, category, size, 1)
+    conn.execute("""
+        INSERT INTO storage_entries (scope, key, category, size, seen) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (scope, key) DO UPDATE SET category = excluded.category, size = excluded.size, seen = excluded.seen
+    """, (scope.name, key, category, size, now))
+    return True
+
+
+def _key(path) -> str:
+    return os.path.normpath(os.path.relpath(os.fspath(path)))
+
+
+def _local(path, size: int | None):
+    key = _key(path)
+    scopes = [s for s in SCOPES.values() if s.contains(key)]
+    if not scopes:
+        return
+    try:
+        ensure_schema()
+        now = time.time()
+        with sqlite_db.transaction(LEDGER_DB) as conn:
+            for scope in scopes:
+                _apply(conn, scope, key, size, now)
+    except Exception as e:
+        # The reconciliation scan repairs anything missed here
+        logger.error(f"❌ Storage ledger update for {key} failed: {e}")
+
+
+def record(path, size: int | None = None):
+    """A local file was written or replaced (size defaults to its current size)."""
+    if size is None:
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return forget(path)
+    _local(path, size)
+
+
+def forget(path):
+    """A local file was removed."""
+    _local(path, None)
+
+
+def record_object(key: str, size: int, scope: str = "minio"):
+    """An object was stored in the bucket."""
+    _object(SCOPES[scope], key, size)
+
+
+def forget_object(key: str, scope: str = "minio"):
+    """An object was removed from the bucket."""
+    _object(SCOPES[scope], key, None)
+
+
+def _object(scope: Scope, key: str, size: int | None):
+    try:
+        ensure_schema()
+        with sqlite_db.transaction(LEDGER_DB) as conn:
+            _apply(conn, scope, key, size, time.time())
+    except Exception as e:
+        logger.error(f"❌ Storage ledger update for {scope.name}:{key} failed: {e}")
+
+
+# ───────────────────────────────────────────────
+# 📊 Reads
+# ───────────────────────────────────────────────
+def totals(scope: str) -> dict:
+    """{category: {"files", "bytes"}} for a scope."""
+    ensure_schema()
+    out = {}
+    for category, files, nbytes in sqlite_db.query(LEDGER_DB, """
+        SELECT category, SUM(files), SUM(bytes) FROM storage_totals WHERE scope = ? GROUP BY category
+    """, (scope,)):
+        out[category] = {"files": int(files), "bytes": int(nbytes)}
+    return out
+
+
+def megabytes(scope: str, categories=()) -> dict:
+    """{category: MB} for a scope, rounded like the dashboard shows it (missing categories are 0)."""
+    mb = {c: 0.0 for c in categories}
+    for category, t in totals(scope).items():
+        mb[category] = t["bytes"] / MB
+    return {c: round(v, 2) for c, v in mb.items()}
+
+
+def histogram(scope: str) -> dict:
+    """{bucket label: file count} across all categories of a scope."""
+    ensure_schema()
+    counts = [0] * len(BUCKET_LABELS)
+    for bucket, files in sqlite_db.query(LEDGER_DB, """
+        SELECT bucket, SUM(files) FROM storage_totals WHERE scope = ? GROUP BY bucket
+    """, (scope,)):
+        counts[bucket] = int(files)
+    return dict(zip(BUCKET_LABELS, counts))
+
+
+def largest(scope: str, limit: int) -> list[tuple[str, int]]:
+    """The scope's `limit` largest entries as (key, size), from the size index."""
+    ensure_schema()
+    return sqlite_db.query(LEDGER_DB, """
+        SELECT key, size FROM storage_entries WHERE scope = ? ORDER BY size DESC LIMIT ?
+    """, (scope, limit))
+
+
+def scans() -> dict:
+    ensure_schema()
+    return {
+        scope: {"started_at": started, "finished_at": finished, "files": files, "changed": changed}
+        for scope, started, finished, files, changed in sqlite_db.query(
+            LEDGER_DB, "SELECT scope, started_at, finished_at, files, changed FROM storage_scans"
+        )
+    }
+
+
+# ───────────────────────────────────────────────
+# 🔁 Reconciliation
+# ───────────────────────────────────────────────
+def _walk(scope: Scope):
+    """(key, size) of every file currently under a local scope."""
+    stack = [scope.root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if scope.recursive:
+                            stack.append(entry.path)
+                    elif entry.is_file():
+                        yield os.path.normpath(entry.path), entry.stat().st_size
+                except OSError:
+                    continue
+
+
+def _list_objects(scope: Scope):
+    from storage.minio_client import minio_client, MINIO_BUCKET
+    for obj in minio_client.list_objects(MINIO_BUCKET, recursive=True):
+        yield obj.object_name, obj.size
+
+
+def _claim(scope: str, now: float, force: bool) -> bool:
+    """Take the scope's scan slot if it is due (one worker at a time)."""
+    with sqlite_db.transaction(LEDGER_DB) as conn:
+        conn.execute("INSERT OR IGNORE INTO storage_scans (scope) VALUES (?)", (scope,))
+        # Due after an interval; a forced scan only waits for one in progress.
+        # A scan that never finished (its worker died) can be retaken after an interval.
+        condition = "(finished_at IS NOT NULL OR started_at <= ?)" if force else "started_at <= ?"
+        return conn.execute(f"""
+            UPDATE storage_scans SET started_at = ?, finished_at = NULL
+            WHERE scope = ? AND {condition}
+        """, (now, scope, now - RECONCILE_INTERVAL)).rowcount == 1
+
+
+def reconcile(name: str, force: bool = False) -> dict | None:
+    """
+    Bring one scope in line with what is actually on disk / in the bucket.
+    Returns {"files", "changed"} or None if the scan was not due or another
+    worker holds it. Entries recorded while the scan runs are never swept.
+    """
+    ensure_schema()
+    scope = SCOPES[name]
+    started = time.time()
+    if not _claim(name, started, force):
+        return None
+    try:
+        files, changed = _scan(scope, started)
+    except Exception:
+        # Release the slot; the next pass retries after an interval
+        sqlite_db.execute(LEDGER_DB, "UPDATE storage_scans SET finished_at = ? WHERE scope = ?",
+                          (time.time(), name))
+        raise
+    sqlite_db.execute(LEDGER_DB, """
+        UPDATE storage_scans SET finished_at = ?, files = ?, changed = ? WHERE scope = ?
+    """, (time.time(), files, changed, name))
+    if changed:
+        logger.info(f"Storage ledger {name}: {files} files scanned, {changed} corrected")
+    return {"files": files, "changed": changed}
+
+
+def _scan(scope: Scope, started: float) -> tuple[int, int]:
+    if scope.root is not None and not os.path.isdir(scope.root):
+        listing = iter(())
+    else:
+        listing = _walk(scope) if scope.root is not None else _list_objects(scope)
+
+    files = changed = 0
+    batch = []
+    for item in listing:
+        batch.append(item)
+        if len(batch) >= RECONCILE_BATCH:
+            changed += _reconcile_batch(scope, batch)
+            files += len(batch)
+            batch = []
+    if batch:
+        changed += _reconcile_batch(scope, batch)
+        files += len(batch)
+
+    # Sweep entries the scan did not see (and no event touched since it began)
+    while True:
+        with sqlite_db.transaction(LEDGER_DB) as conn:
+            gone = conn.execute(
+                "SELECT key FROM storage_entries WHERE scope = ? AND seen < ? LIMIT ?",
+                (scope.name, started, RECONCILE_BATCH),
+            ).fetchall()
+            for (key,) in gone:
+                _apply(conn, scope, key, None, started)
+        changed += len(gone)
+        if len(gone) < RECONCILE_BATCH:
+            break
+    return files, changed
+
+
+def _reconcile_batch(scope: Scope, batch: list) -> int:
+    now = time.time()
+    with sqlite_db.transaction(LEDGER_DB) as conn:
+        return sum(_apply(conn, scope, key, size, now) for key, size in batch)
+
+
+def reconcile_all(force: bool = False) -> dict:
+    out = {}
+    for name in SCOPES:
+        try:
+            out[name] = reconcile(name, force)
+        except Exception as e:
+            logger.error(f"❌ Storage ledger reconciliation of {name} failed: {e}")
+            out[name] = {"error": str(e)}
+    return out
+
+
+# ───────────────────────────────────────────────
+# 🧵 Background reconciler
+# ───────────────────────────────────────────────
+_stop = threading.Event()
+_thread = None
+
+
+def _run():
+    from app import video_uploads  # imports this module
+
+    while not _stop.is_set():
+        reconcile_all()
+        try:
+            video_uploads.sweep_abandoned()
+        except Exception as e:
+            logger.error(f"❌ Stale upload sweep failed: {e}")
+        # Check often; _claim() decides whether a scope is actually due
+        _stop.wait(min(RECONCILE_INTERVAL, 60.0))
+
+
+def start():
+    """Start the reconciliation thread (the first pass fills an empty ledger)."""
+    global _thread
+    if _thread is not None or RECONCILE_INTERVAL <= 0:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_run, name="storage-ledger", daemon=True)
+    _thread.start()
+
+
+def stop():
+    global _thread
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout=5.0)
+        _thread = None
@@ -0,0 +1,111 @@
+# app/utils/columnar.py
+"""
+Columnar exports (Parquet, Arrow IPC stream, Feather v2) built batch by
+batch from a DB cursor. pyarrow is optional; callers check available().
+"""
+from itertools import islice
+from fastapi import HTTPException
+
+from app.utils.streaming import StreamSink, TransferLog
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = None
+    pq = None
+
+COLUMNAR_BATCH_ROWS = 65536
+COMPRESSION = "zstd"
+
+# format → (media type, file extension)
+FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "feather": ("application/vnd.apache.arrow.file", "feather"),
+}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def check_format(fmt: str):
+    """Validate a ?format= value; "csv" is always accepted."""
+    if fmt == "csv":
+        return
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}' (csv, {', '.join(FORMATS)})")
+    if not available():
+        raise HTTPException(status_code=501, detail=f"{fmt} export requires pyarrow on the server")
+
+
+def headers(fmt: str, stem: str) -> dict:
+    return {"Content-Disposition": f"attachment; filename={stem}.{FORMATS[fmt][1]}"}
+
+
+def schema(columns):
+    """columns: [(name, "string" | "timestamp" | "float")] → pa.Schema"""
+    types = {"string": pa.string(), "timestamp": pa.timestamp("us"), "float": pa.float64()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _open_writer(fmt: str, sink, arrow_schema):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, arrow_schema, compression=COMPRESSION)
+    options = pa.ipc.IpcWriteOptions(compression=COMPRESSION)
+    if fmt == "arrow":
+        return pa.ipc.new_stream(sink, arrow_schema, options=options)
+    return pa.ipc.new_file(sink, arrow_schema, options=options)
+
+
+def _write(writer, fmt: str, batch):
+    if fmt == "parquet":
+        writer.write_table(pa.Table.from_batches([batch]))
+    else:
+        writer.write_batch(batch)
+
+
+def record_batches(rows, arrow_schema, to_tuple, batch_rows: int = COLUMNAR_BATCH_ROWS, log: TransferLog | None = None):
+    """Group cursor rows into typed RecordBatches without per-row string formatting."""
+    rows = iter(rows)
+    while True:
+        chunk = [to_tuple(r) for r in islice(rows, batch_rows)]
+        if not chunk:
+            return
+        if log is not None:
+            log.rows += len(chunk)
+        columns = list(zip(*chunk))
+        yield pa.record_batch(
+            [pa.array(col, type=field.type) for col, field in zip(columns, arrow_schema)],
+            schema=arrow_schema,
+        )
+
+
+def iter_columnar(fmt: str, arrow_schema, batches, log: TransferLog):
+    """Stream a columnar file; bytes are sent after every record batch."""
+    sink = StreamSink()
+    stream = pa.PythonFile(sink, mode="w")
+    try:
+        writer = _open_writer(fmt, stream, arrow_schema)
+        for batch in batches:
+            _write(writer, fmt, batch)
+            if sink.size:
+                data = sink.drain()
+                log.sent(len(data))
+                yield data
+        writer.close()
+        data = sink.drain()
+        log.sent(len(data))
+        yield data
+    finally:
+        log.done()
+
+
+def write_table(fmt: str, table, path: str):
+    """Write an in-memory table (e.g. from pandas) to a file in the given format."""
+    with pa.OSFile(path, "wb") as f:
+        writer = _open_writer(fmt, f, table.schema)
+        for batch in table.to_batches(max_chunksize=COLUMNAR_BATCH_ROWS):
+            _write(writer, fmt, batch)
+        writer.close()
@@ -1,35 +1,435 @@
-import csv, os, uuid
-CSV_PATH = os.path.join('storage','sensors','sensor_data.csv')
-FIELDS = ['id','Sensor ID','Start Timestamp','End Timestamp','Value','Unit']
+"""
+Log-structured CSV row store for storage/sensors/sensor_data.csv.
 
+Rows are never rewritten in place: an update appends a new version of the
+row (op "U") and a delete appends a tombstone (op "D"). An in-memory index
+maps each live row id to the byte offset of its latest version, so point
+reads are one seek. When superseded versions and tombstones pass
+CSV_COMPACT_RATIO of the file, a background thread rewrites it with only
+the live rows and swaps it in atomically.
 
+Writers in every worker serialise on a lock file; each process notices
+appends or compactions made by others from the file's size and inode.
+
+For request handlers that only mirror rows into the CSV, enqueue() hands
+them to a background writer that appends in batches through one open file
+handle and fsyncs every CSV_SINK_FSYNC_INTERVAL seconds.
+"""
+import atexit
+import csv
+import io
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CSV_PATH = os.path.join('storage', 'sensors', 'sensor_data.csv')
+FIELDS = ['id', 'Sensor ID', 'Start Timestamp', 'End Timestamp', 'Value', 'Unit']
+LOG_FIELDS = FIELDS + ['op']  # op: "" insert, "U" new version, "D" tombstone
+
+COMPACT_RATIO = float(os.getenv("CSV_COMPACT_RATIO", "0.5"))          # garbage / records
+COMPACT_MIN_GARBAGE = int(os.getenv("CSV_COMPACT_MIN_GARBAGE", "1000"))
+COMPACT_INTERVAL = float(os.getenv("CSV_COMPACT_INTERVAL", "60"))
+SINK_MAX_ROWS = int(os.getenv("CSV_SINK_MAX_ROWS", "1000"))
+SINK_FSYNC_INTERVAL = float(os.getenv("CSV_SINK_FSYNC_INTERVAL", "1.0"))
+SINK_MAX_PENDING = int(os.getenv("CSV_SINK_MAX_PENDING", "100000"))
+
+
+# ───────────────────────────────────────────────
+# 🧾 Record encoding
+# ───────────────────────────────────────────────
+def _encode(row: dict, op: str = '') -> bytes:
+    buf = io.StringIO()
+    # One record per line keeps byte offsets valid, so no embedded newlines
+    csv.writer(buf).writerow(
+        [str(row.get(k) or '').replace('\r', ' ').replace('\n', ' ') for k in FIELDS] + [op]
+    )
+    return buf.getvalue().encode('utf-8')
+
+
+def _decode(line: bytes) -> list[str]:
+    return next(csv.reader([line.decode('utf-8', errors='replace')]), [])
+
+
+def _row(values: list[str]) -> dict:
+    return dict(zip(FIELDS, values[:len(FIELDS)]))
+
+
+# ───────────────────────────────────────────────
+# 🗂 Store
+# ───────────────────────────────────────────────
+class CsvStore:
+    def __init__(self, path: str = CSV_PATH):
+        self.path = path
+        self.index = {}       # id -> byte offset of the live version
+        self.records = 0      # data lines in the file
+        self._end = 0         # bytes indexed so far
+        self._ino = None
+        self._fh = None       # append handle, reopened when the file is replaced
+        self._fh_ino = None
+        self._lock = threading.Lock()
+        self._compactor = None
+        self._wake = threading.Event()
+
+    @property
+    def garbage(self) -> int:
+        return self.records - len(self.index)
+
+    @contextmanager
+    def _locked(self):
+        """In-process lock plus an flock shared by every worker writing this file."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path + '.lock', 'a') as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    self._sync()
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """Create/upgrade the file if needed and index anything written since the last look."""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, 'wb') as f:
+                f.write(_encode(dict(zip(FIELDS, FIELDS)), 'op'))
+        with open(self.path, 'rb') as f:
+            header = _decode(f.readline())
+        if header != LOG_FIELDS:
+            self._upgrade(header)
+
+        st = os.stat(self.path)
+        if st.st_ino != self._ino or st.st_size < self._end:
+            # First look, or another worker compacted the file
+            self.index, self.records, self._end, self._ino = {}, 0, 0, st.st_ino
+        if st.st_size > self._end:
+            self._scan(st.st_size)
+
+    def _scan(self, size: int):
+        with open(self.path, 'rb') as f:
+            if self._end == 0:
+                self._end = len(f.readline())
+            f.seek(self._end)
+            offset = self._end
+            while offset < size:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                values = _decode(line)
+                if values and values[0]:
+                    self.records += 1
+                    if values[-1] == 'D' and len(values) == len(LOG_FIELDS):
+                        self.index.pop(values[0], None)
+                    else:
+                        self.index[values[0]] = offset
+                offset += len(line)
+            self._end = offset
+        if offset < size:
+            # Every writer holds the lock, so a torn last line is left over from a crash
+            logger.warning(f"Truncating {size - offset} bytes of a partial record in {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+
+    def _upgrade(self, header: list[str]):
+        """One-time rewrite of a legacy file (no id column, or no op column)."""
+        with open(self.path, newline='', encoding='latin1') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = [dict(zip([h.strip() for h in header], values)) for values in reader]
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(_encode(dict(zip(FIELDS, FIELDS)), 'op'))
+            for r in rows:
+                r['id'] = r.get('id') or str(uuid.uuid4())
+                f.write(_encode(r))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        logger.info(f"Upgraded {self.path} to the row-log format ({len(rows)} rows)")
+
+    def _writer(self):
+        if self._fh is None or self._fh_ino != self._ino:
+            if self._fh is not None:
+                self._fh.close()
+            self._fh = open(self.path, 'ab')
+            self._fh_ino = self._ino
+        return self._fh
+
+    def _write(self, data: bytes) -> int:
+        """Append data and flush it to the OS; returns the offset it starts at."""
+        f = self._writer()
+        f.write(data)
+        f.flush()
+        return f.tell() - len(data)
+
+    def _append(self, row: dict, op: str) -> int:
+        data = _encode(row, op)
+        offset = self._write(data)
+        self.records += 1
+        self._end = offset + len(data)
+        return offset
+
+    def sync(self):
+        """fsync appended records to disk."""
+        with self._lock:
+            if self._fh is not None:
+                os.fsync(self._fh.fileno())
+
+    def _read_at(self, offset: int) -> dict:
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return _row(_decode(f.readline()))
+
+    # ───────────────────────────────────────────────
+    # 📖 Reads
+    # ───────────────────────────────────────────────
+    def get(self, row_id: str) -> dict | None:
+        with self._locked():
+            offset = self.index.get(row_id)
+            return self._read_at(offset) if offset is not None else None
+
+    def read_all(self) -> list[dict]:
+        """Live rows in file order."""
+        with self._locked():
+            live = set(self.index.values())
+            rows = []
+            with open(self.path, 'rb') as f:
+                offset = len(f.readline())
+                for line in f:
+                    if offset in live:
+                        rows.append(_row(_decode(line)))
+                    offset += len(line)
+            return rows
+
+    # ───────────────────────────────────────────────
+    # ✍️ Writes
+    # ───────────────────────────────────────────────
+    def append(self, row: dict) -> dict:
+        row = {**{k: '' for k in FIELDS}, **row}
+        row['id'] = row.get('id') or str(uuid.uuid4())
+        with self._locked():
+            self.index[row['id']] = self._append(row, '')
+        return row
+
+    def append_many(self, rows: list[dict]) -> list[dict]:
+        """Append several rows with one lock and one write."""
+        rows = [{**{k: '' for k in FIELDS}, **r} for r in rows]
+        for r in rows:
+            r['id'] = r.get('id') or str(uuid.uuid4())
+        with self._locked():
+            data = [_encode(r) for r in rows]
+            offset = self._write(b''.join(data))
+            for r, line in zip(rows, data):
+                self.index[r['id']] = offset
+                offset += len(line)
+            self.records += len(rows)
+            self._end = offset
+        return rows
+
+    def update(self, row_id: str, changes: dict) -> dict | None:
+        """Append a new version of row_id; None if it doesn't exist."""
+        with self._locked():
+            offset = self.index.get(row_id)
+            if offset is None:
+                return None
+            row = {**self._read_at(offset), **changes, 'id': row_id}
+            self.index[row_id] = self._append(row, 'U')
+        self._maybe_compact()
+        return row
+
+    def delete(self, row_id: str) -> bool:
+        """Append a tombstone for row_id; False if it doesn't exist."""
+        with self._locked():
+            if row_id not in self.index:
+                return False
+            self._append({'id': row_id}, 'D')
+            del self.index[row_id]
+        self._maybe_compact()
+        return True
+
+    # ───────────────────────────────────────────────
+    # 🧹 Compaction
+    # ───────────────────────────────────────────────
+    def needs_compaction(self) -> bool:
+        return self.garbage >= COMPACT_MIN_GARBAGE and self.garbage >= COMPACT_RATIO * max(self.records, 1)
+
+    def compact(self) -> dict:
+        """Rewrite the file with only the live version of each row, then swap it in."""
+        with self._locked():
+            before = self.records
+            live = set(self.index.values())
+            tmp = self.path + '.compact'
+            index = {}
+            with open(self.path, 'rb') as src, open(tmp, 'wb') as dst:
+                header = src.readline()
+                dst.write(header)
+                pos = offset = len(header)
+                for line in src:
+                    if pos in live:
+                        values = _decode(line)
+                        # Rewritten as plain inserts: there is nothing left to supersede
+                        out = _encode(_row(values), '')
+                        index[values[0]] = offset
+                        dst.write(out)
+                        offset += len(out)
+                    pos += len(line)
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.replace(tmp, self.path)
+            self.index, self.records, self._end = index, len(index), offset
+            self._ino = os.stat(self.path).st_ino
+        logger.info(f"🧹 Compacted {self.path}: {before} → {len(index)} records")
+        return {"records_before": before, "records_after": len(index)}
+
+    def _maybe_compact(self):
+        if not self.needs_compaction():
+            return
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._run_compactor, name="csv-compaction", daemon=True)
+            self._compactor.start()
+        self._wake.set()
+
+    def _run_compactor(self):
+        while True:
+            self._wake.wait(COMPACT_INTERVAL)
+            self._wake.clear()
+            try:
+                with self._locked():
+                    due = self.needs_compaction()
+                if due:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"❌ CSV compaction failed: {e}")
+
+    def stats(self) -> dict:
+        with self._locked():
+            return {"path": self.path, "live_rows": len(self.index), "records": self.records,
+                    "garbage": self.garbage, "bytes": self._end}
+
+
+# ───────────────────────────────────────────────
+# 📮 Asynchronous sink
+# ───────────────────────────────────────────────
+class CsvSink:
+    """Background writer: queued rows are appended in batches, fsynced on an interval."""
+
+    def __init__(self, store: CsvStore, max_rows: int = SINK_MAX_ROWS,
+                 fsync_interval: float = SINK_FSYNC_INTERVAL, max_pending: int = SINK_MAX_PENDING):
+        self.store = store
+        self.max_rows = max_rows
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    def enqueue(self, rows: list[dict]):
+        """Queue rows for the CSV (blocks only if CSV_SINK_MAX_PENDING rows are waiting)."""
+        self.start()
+        for row in rows:
+            self._queue.put(row)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="csv-sink", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Drain the queue, fsync and stop the writer."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=timeout)
+
+    def _run(self):
+        last_sync = time.monotonic()
+        dirty = False
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.fsync_interval)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.max_rows:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.store.append_many(batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                    dirty = True
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"❌ CSV sink dropped {len(batch)} rows: {e}")
+            if dirty and (self._stop.is_set() or time.monotonic() - last_sync >= self.fsync_interval):
+                try:
+                    self.store.sync()
+                except Exception as e:
+                    logger.error(f"❌ CSV sink fsync failed: {e}")
+                dirty, last_sync = False, time.monotonic()
+        if dirty:
+            self.store.sync()
+
+    def stats(self) -> dict:
+        return {"pending": self._queue.qsize(), "written": self.written,
+                "failed": self.failed, "batches": self.batches}
+
+
+store = CsvStore()
+sink = CsvSink(store)
+atexit.register(sink.stop)
+
+
+# Module-level helpers (the original csv_store API)
 def ensure_header():
-os.makedirs(os.path.dirname(CSV_PATH), exist_ok=True)
-if not os.path.exists(CSV_PATH):
-with open(CSV_PATH,'w',newline='',encoding='utf-8') as f:
-csv.DictWriter(f, fieldnames=FIELDS).writeheader()
+    with store._locked():
+        pass
 
 
 def read_all():
-ensure_header()
-with open(CSV_PATH, newline='', encoding='latin1') as f:
-reader = csv.DictReader(f)
-rows = [dict(r) for r in reader]
-return rows
+    return store.read_all()
+
+
+def get_row(row_id: str):
+    return store.get(row_id)
 
 
 def append_row(row: dict):
-ensure_header()
-row = { **{k:'' for k in FIELDS}, **row }
-row['id'] = row.get('id') or str(uuid.uuid4())
-with open(CSV_PATH,'a',newline='',encoding='utf-8') as f:
-w = csv.DictWriter(f, fieldnames=FIELDS)
-w.writerow(row)
-return row
-
-
-def write_all(rows):
-ensure_header()
-with open(CSV_PATH,'w',newline='',encoding='utf-8') as f:
-w = csv.DictWriter(f, fieldnames=FIELDS)
-w.writeheader(); w.writerows(rows)
\ No newline at end of file
+    return store.append(row)
+
+
+def append_rows(rows: list[dict]):
+    return store.append_many(rows)
+
+
+def enqueue(rows: list[dict]):
+    """Mirror rows into the CSV asynchronously (see CsvSink)."""
+    sink.enqueue(rows)
+
+
+def update_row(row_id: str, changes: dict):
+    return store.update(row_id, changes)
+
+
+def delete_row(row_id: str) -> bool:
+    return store.delete(row_id)
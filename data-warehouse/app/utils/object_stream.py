@@ -0,0 +1,97 @@
+# app/utils/object_stream.py
+"""
+Serve a MinIO object over HTTP with conditional and partial requests.
+
+- stat_object first: Content-Length, ETag and Last-Modified without reading the body
+- every MinIO call goes through an app.object_store.ObjectStore, off the event loop
+- If-None-Match → 304 with no body
+- Range: bytes=a-b / a- / -n → 206 via a ranged get_object, so a player that
+  seeks fetches only the bytes it needs (If-Range falls back to 200 when the ETag changed)
+- Unsatisfiable ranges → 416; multi-range requests get the whole object
+"""
+import logging
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """(first, last) byte of a single `bytes=` range, or None to send the whole object."""
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            if not last:
+                return None
+            n = int(last)  # suffix: the final n bytes
+            if n <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - n, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None  # malformed: ignore the header (RFC 9110)
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+async def object_response(request: Request, store, key: str,
+                          media_type: str | None = None, filename: str | None = None) -> Response:
+    """StreamingResponse (200/206), 304 or 416 for one object; 404 if it does not exist."""
+    try:
+        stat = await store.stat(key)
+    except Exception:
+        raise HTTPException(status_code=404, detail="File not found in MinIO")
+
+    size = stat.size
+    etag = f'"{stat.etag}"'
+    headers = {"Accept-Ranges": "bytes", "ETag": etag}
+    if stat.last_modified is not None:
+        headers["Last-Modified"] = stat.last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT")
+    if filename:
+        headers["Content-Disposition"] = f"attachment; filename={filename}"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None  # the object changed since the client's copy: send it whole
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    media_type = media_type or stat.content_type or "application/octet-stream"
+    if byte_range is None:
+        if size == 0:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(store.iter(key), status_code=200, headers=headers, media_type=media_type)
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return StreamingResponse(store.iter(key, offset=start, length=end - start + 1),
+                             status_code=206, headers=headers, media_type=media_type)
@@ -0,0 +1,140 @@
+# app/utils/streaming.py
+import io
+import csv
+import time
+import zipfile
+import logging
+
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+STREAM_BATCH_ROWS = 2000        # rows fetched per server-side cursor round-trip
+STREAM_CHUNK_BYTES = 64 * 1024  # flush to the client once this much CSV is buffered
+
+
+def stream_query(build_query, batch_size: int = STREAM_BATCH_ROWS):
+    """
+    Yield rows from build_query(db) through a server-side cursor.
+    The generator owns its session, because the response body is produced
+    after the request's get_db session has been handed back.
+    """
+    db = SessionLocal()
+    try:
+        query = build_query(db).execution_options(stream_results=True)
+        yield from query.yield_per(batch_size)
+    finally:
+        db.close()
+
+
+class TransferLog:
+    """Logs time-to-first-byte and totals for a streamed response."""
+
+    def __init__(self, label: str, started: float | None = None):
+        self.label = label
+        self.started = started or time.perf_counter()
+        self.first_byte = None
+        self.rows = 0
+        self.bytes = 0
+
+    def sent(self, nbytes: int):
+        if self.first_byte is None:
+            self.first_byte = time.perf_counter()
+            logger.info(f"📤 {self.label}: first byte after {(self.first_byte - self.started) * 1000:.1f} ms")
+        self.bytes += nbytes
+
+    def done(self):
+        logger.info(
+            f"✅ {self.label}: {self.rows} rows, {self.bytes / 1024:.1f} KiB "
+            f"in {time.perf_counter() - self.started:.2f} s"
+        )
+
+
+def csv_chunks(header, rows, format_row, log: TransferLog | None = None):
+    """Encode rows as CSV bytes, yielding ~STREAM_CHUNK_BYTES chunks as they fill."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(format_row(row))
+        if log is not None:
+            log.rows += 1
+        if buf.tell() >= STREAM_CHUNK_BYTES:
+            chunk = buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+            yield chunk
+    yield buf.getvalue().encode()
+
+
+def iter_csv(header, rows, format_row, log: TransferLog):
+    """Stream a CSV response body."""
+    try:
+        for chunk in csv_chunks(header, rows, format_row, log):
+            log.sent(len(chunk))
+            yield chunk
+    finally:
+        log.done()
+
+
+class StreamSink:
+    """Write-only, non-seekable file object; streaming writers drain it as it fills."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0       # bytes waiting to be drained
+        self.position = 0   # total bytes written
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation("seek")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    @property
+    def closed(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def iter_zip(members, log: TransferLog):
+    """
+    Stream a ZIP archive. members yields (arcname, iterable of bytes).
+    zipfile falls back to data descriptors on a non-seekable sink, so
+    compressed bytes can be sent as soon as they are produced and the
+    archive is never held in memory.
+    """
+    sink = StreamSink()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for arcname, chunks in members:
+                with zf.open(arcname, "w", force_zip64=True) as member:
+                    for chunk in chunks:
+                        member.write(chunk)
+                        if sink.size >= STREAM_CHUNK_BYTES:
+                            data = sink.drain()
+                            log.sent(len(data))
+                            yield data
+        data = sink.drain()
+        log.sent(len(data))
+        yield data
+    finally:
+        log.done()
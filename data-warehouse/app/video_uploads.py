@@ -0,0 +1,215 @@
+# app/video_uploads.py
+"""
+Resumable chunked video uploads, streamed into an S3 multipart upload.
+
+    init      → VideoAsset(status="uploading") + CreateMultipartUpload
+    put part  → the request body goes into UploadPart n; a VideoUploadPart row records it
+    status    → the parts already received, so an interrupted client resumes where it stopped
+    complete  → CompleteMultipartUpload from the recorded parts (in part order)
+    abort     → AbortMultipartUpload, parts dropped
+    sweep     → uploads idle for VIDEO_UPLOAD_TTL_HOURS are aborted the same way
+                (from the storage-ledger thread), so abandoned parts do not pile up
+
+Every part request is independent, so clients upload several parts in
+parallel. Memory use is one part per in-flight request, not the whole
+recording. S3 calls go through app.object_store and database work through
+the threadpool, so the event loop never waits on either. Each part's SHA-256 is checked against the client's
+X-Checksum-SHA256 header when one is sent, and stored with the part.
+"""
+import os
+import uuid
+import hashlib
+import logging
+import datetime as dt
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app import models, storage_ledger
+from app.database import SessionLocal
+from app.object_store import store
+
+logger = logging.getLogger(__name__)
+
+# ───────────────────────────────────────────────
+# 🔧 Configuration
+# ───────────────────────────────────────────────
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB      # S3 minimum for every part but the last
+MAX_PART_SIZE = 100 * MB    # "video chunks up to 100MB"
+MAX_PARTS = 10000           # S3 limit
+DEFAULT_PART_SIZE = int(os.getenv("VIDEO_PART_SIZE", str(16 * MB)))
+VIDEO_PREFIX = "videos"
+UPLOAD_TTL_HOURS = float(os.getenv("VIDEO_UPLOAD_TTL_HOURS", "24"))  # 0 = never sweep
+SWEEP_BATCH = 100
+
+
+# ───────────────────────────────────────────────
+# 📋 Upload state
+# ───────────────────────────────────────────────
+def get_upload(db: Session, video_id: str, user: models.User) -> models.VideoAsset:
+    try:
+        video = db.get(models.VideoAsset, uuid.UUID(str(video_id)))
+    except ValueError:
+        video = None
+    if video is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if not user.is_admin and video.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return video
+
+
+def _uploading(video: models.VideoAsset) -> models.VideoAsset:
+    if video.status != "uploading":
+        raise HTTPException(status_code=409, detail=f"Upload is {video.status}")
+    return video
+
+
+def describe(video: models.VideoAsset) -> dict:
+    parts = sorted(video.parts, key=lambda p: p.part_number)
+    return {
+        "id": str(video.id),
+        "filename": video.filename,
+        "object_key": video.object_key,
+        "status": video.status,
+        "part_size": video.part_size,
+        "bytes_received": sum(p.size_bytes for p in parts),
+        "size_bytes": video.size_bytes,
+        "parts": [{"part_number": p.part_number, "size": p.size_bytes, "sha256": p.sha256} for p in parts],
+    }
+
+
+async def init_upload(db: Session, user: models.User, filename: str, content_type: str | None = None,
+                      part_size: int | None = None, size_bytes: int | None = None) -> dict:
+    """Start a multipart upload; the client then PUTs parts 1..n of part_size bytes."""
+    part_size = part_size or DEFAULT_PART_SIZE
+    if not MIN_PART_SIZE <= part_size <= MAX_PART_SIZE:
+        raise HTTPException(status_code=400, detail=f"part_size must be {MIN_PART_SIZE}–{MAX_PART_SIZE} bytes")
+    if size_bytes is not None and -(-size_bytes // part_size) > MAX_PARTS:
+        raise HTTPException(status_code=400, detail="File needs more than 10000 parts; use a larger part_size")
+    content_type = content_type or "video/mp4"
+
+    video = models.VideoAsset(
+        id=uuid.uuid4(),
+        filename=os.path.basename(filename),
+        owner_id=user.id,
+        content_type=content_type,
+        status="uploading",
+        part_size=part_size,
+        size_bytes=size_bytes,
+    )
+    video.object_key = f"{VIDEO_PREFIX}/{video.id}/{video.filename}"
+    video.upload_id = await store.create_multipart(video.object_key, content_type)
+    db.add(video)
+    await run_in_threadpool(db.commit)
+    return await run_in_threadpool(describe, video)
+
+
+async def put_part(db: Session, video: models.VideoAsset, part_number: int, data: bytes | bytearray,
+                   expected_sha256: str | None = None) -> dict:
+    """Upload one part (re-sending a part number replaces it)."""
+    _uploading(video)
+    if not 1 <= part_number <= MAX_PARTS:
+        raise HTTPException(status_code=400, detail="part_number must be 1–10000")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty part")
+    digest = await run_in_threadpool(lambda: hashlib.sha256(data).hexdigest())
+    if expected_sha256 and expected_sha256.lower() != digest:
+        raise HTTPException(status_code=400, detail="Part checksum mismatch")
+
+    etag = await store.upload_part(video.object_key, video.upload_id, part_number, data)
+
+    def _record():
+        db.merge(models.VideoUploadPart(
+            video_id=video.id, part_number=part_number, size_bytes=len(data),
+            etag=etag, sha256=digest, uploaded_at=dt.datetime.utcnow(),
+        ))
+        video.updated_at = dt.datetime.utcnow()
+        db.commit()
+    await run_in_threadpool(_record)
+    return {"part_number": part_number, "size": len(data), "sha256": digest}
+
+
+async def complete_upload(db: Session, video: models.VideoAsset) -> dict:
+    """Assemble the object from parts 1..n (all but the last must be part_size bytes)."""
+    _uploading(video)
+    parts = await run_in_threadpool(lambda: sorted(video.parts, key=lambda p: p.part_number))
+    if not parts:
+        raise HTTPException(status_code=400, detail="No parts uploaded")
+    missing = sorted(set(range(1, parts[-1].part_number + 1)) - {p.part_number for p in parts})
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {missing[:20]}")
+    short = [p.part_number for p in parts[:-1] if p.size_bytes != video.part_size]
+    if short:
+        raise HTTPException(status_code=400, detail=f"Parts must be {video.part_size} bytes except the last: {short[:20]}")
+    total = sum(p.size_bytes for p in parts)
+    if video.size_bytes is not None and video.size_bytes != total:
+        raise HTTPException(status_code=400, detail=f"Expected {video.size_bytes} bytes, received {total}")
+
+    await store.complete_multipart(video.object_key, video.upload_id, [(p.part_number, p.etag) for p in parts])
+    video.status = "complete"
+    video.size_bytes = total
+    video.upload_id = None
+    video.updated_at = dt.datetime.utcnow()
+    await run_in_threadpool(db.commit)
+    await run_in_threadpool(storage_ledger.record_object, video.object_key, total)
+    return await run_in_threadpool(describe, video)
+
+
+async def abort_upload(db: Session, video: models.VideoAsset) -> dict:
+    _uploading(video)
+    await store.abort_multipart(video.object_key, video.upload_id)
+
+    def _record():
+        video.status = "aborted"
+        video.upload_id = None
+        video.parts.clear()
+        video.updated_at = dt.datetime.utcnow()
+        db.commit()
+    await run_in_threadpool(_record)
+    return {"id": str(video.id), "status": video.status}
+
+
+# ───────────────────────────────────────────────
+# 🧹 Abandoned uploads
+# ───────────────────────────────────────────────
+def sweep_abandoned(ttl_hours: float = UPLOAD_TTL_HOURS) -> int:
+    """
+    Abort uploads with no part received for ttl_hours, freeing their parts
+    in MinIO. Blocking; runs on a background thread, so it calls the client
+    directly instead of going through the async store.
+    """
+    if ttl_hours <= 0:
+        return 0
+    from minio.error import S3Error
+
+    cutoff = dt.datetime.utcnow() - dt.timedelta(hours=ttl_hours)
+    swept = 0
+    db = SessionLocal()
+    try:
+        stale = (
+            db.query(models.VideoAsset)
+            .filter(models.VideoAsset.status == "uploading",
+                    func.coalesce(models.VideoAsset.updated_at, models.VideoAsset.created_at) < cutoff)
+            .limit(SWEEP_BATCH)
+            .all()
+        )
+        for video in stale:
+            try:
+                store.client._abort_multipart_upload(store.bucket, video.object_key, video.upload_id)
+            except S3Error as e:
+                if e.code != "NoSuchUpload":  # already gone (another worker swept it): just record it
+                    logger.error(f"❌ Could not abort stale upload {video.id}: {e}")
+                    continue
+            video.status = "aborted"
+            video.upload_id = None
+            video.parts.clear()
+            video.updated_at = dt.datetime.utcnow()
+            db.commit()
+            swept += 1
+    finally:
+        db.close()
+    if swept:
+        logger.info(f"🧹 Aborted {swept} video uploads idle for more than {ttl_hours:g} h")
+    return swept
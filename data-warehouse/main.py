@@ -8,18 +8,22 @@ from api.sensor import sensor_router
 from api.video import video_router
 from admin.stats import get_storage_stats
 
-from app import models, database, auth
+from app import models, database, auth, startup
 from app.schemas import UserCreate, UserLogin
 
-# Create database tables
-models.Base.metadata.create_all(bind=database.engine)
-
 app = FastAPI(
     title="Data Warehouse MVP",
     description="Centralized hub for sensor, video, and file data ingestion.",
     version="1.0.0"
 )
 
+# Create database tables (at startup, not import)
+@app.on_event("startup")
+def create_tables():
+    startup.report.begin()
+    startup.ensure_schema(database.engine, models.Base.metadata)
+    startup.ready()
+
 # Mount static files
 app.mount("/admin", StaticFiles(directory="admin", html=True), name="admin")
 
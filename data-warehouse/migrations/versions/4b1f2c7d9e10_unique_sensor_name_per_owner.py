@@ -0,0 +1,46 @@
+"""unique sensor name per owner
+
+Revision ID: 4b1f2c7d9e10
+Revises: 987762144877
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f2c7d9e10'
+down_revision: Union[str, Sequence[str], None] = '987762144877'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Repoint readings of duplicate (owner_id, name) sensors to the oldest one, then drop the duplicates
+    op.execute("""
+        WITH ranked AS (
+            SELECT id, first_value(id) OVER (
+                       PARTITION BY owner_id, name ORDER BY created_at, id
+                   ) AS keep_id
+            FROM sensors
+            WHERE owner_id IS NOT NULL
+        )
+        UPDATE sensor_readings r SET sensor_id = ranked.keep_id
+        FROM ranked
+        WHERE r.sensor_id = ranked.id AND ranked.id <> ranked.keep_id
+    """)
+    op.execute("""
+        DELETE FROM sensors s
+        USING sensors k
+        WHERE s.owner_id = k.owner_id AND s.name = k.name
+          AND (k.created_at, k.id::text) < (s.created_at, s.id::text)
+    """)
+    op.create_unique_constraint('uq_sensors_owner_name', 'sensors', ['owner_id', 'name'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_sensors_owner_name', 'sensors', type_='unique')
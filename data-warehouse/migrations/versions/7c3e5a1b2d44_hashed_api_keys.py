@@ -0,0 +1,30 @@
+"""hashed api keys on users
+
+Revision ID: 7c3e5a1b2d44
+Revises: 4b1f2c7d9e10
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e5a1b2d44'
+down_revision: Union[str, Sequence[str], None] = '4b1f2c7d9e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('api_key_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_users_api_key_hash'), 'users', ['api_key_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_api_key_hash'), table_name='users')
+    op.drop_column('users', 'api_key_hash')
@@ -0,0 +1,45 @@
+"""sensor rollups (1min / 1h / 1d)
+
+Revision ID: 9a2d6e3f1b57
+Revises: 7c3e5a1b2d44
+Create Date: 2026-10-18 11:20:00.000000
+
+Backfill existing readings afterwards with scripts/rebuild_rollups.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a2d6e3f1b57'
+down_revision: Union[str, Sequence[str], None] = '7c3e5a1b2d44'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sensor_rollups',
+        sa.Column('sensor_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('resolution', sa.String(length=8), nullable=False),
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.Column('sum', sa.Float(), nullable=False),
+        sa.Column('min', sa.Float(), nullable=False),
+        sa.Column('max', sa.Float(), nullable=False),
+        sa.Column('first_ts', sa.DateTime(), nullable=False),
+        sa.Column('first_value', sa.Float(), nullable=False),
+        sa.Column('last_ts', sa.DateTime(), nullable=False),
+        sa.Column('last_value', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('sensor_id', 'resolution', 'bucket'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sensor_rollups')
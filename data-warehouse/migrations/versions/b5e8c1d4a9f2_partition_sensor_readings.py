@@ -0,0 +1,86 @@
+"""range-partition sensor_readings by ts
+
+Revision ID: b5e8c1d4a9f2
+Revises: 9a2d6e3f1b57
+Create Date: 2026-10-18 12:40:00.000000
+
+The existing table is not copied: it becomes the first partition, covering
+everything up to the start of the month after its newest reading. Its
+primary key is widened to (id, ts) as partitioning requires. Monthly
+partitions from there on are created by app/partitions.py at startup.
+"""
+import datetime as dt
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e8c1d4a9f2'
+down_revision: Union[str, Sequence[str], None] = '9a2d6e3f1b57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_sr_sensor_ts': '(sensor_id, ts)',
+    'ix_sensor_readings_ts': '(ts)',
+    'ix_sensor_readings_sensor_id': '(sensor_id)',
+}
+
+COLUMNS = """
+    id BIGINT NOT NULL DEFAULT nextval('sensor_readings_id_seq'),
+    sensor_id UUID REFERENCES sensors (id),
+    ts TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    ts_end TIMESTAMP WITHOUT TIME ZONE,
+    value DOUBLE PRECISION NOT NULL,
+    unit VARCHAR,
+    owner_id UUID REFERENCES users (id),
+    license TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    newest = bind.execute(sa.text("SELECT max(ts) FROM sensor_readings")).scalar() or dt.datetime.utcnow()
+    boundary = (newest.replace(day=28) + dt.timedelta(days=4)).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+    op.execute("ALTER TABLE sensor_readings RENAME TO sensor_readings_legacy")
+    for name in INDEXES:
+        op.execute(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy")
+    op.execute("ALTER TABLE sensor_readings_legacy DROP CONSTRAINT sensor_readings_pkey")
+    op.execute("ALTER TABLE sensor_readings_legacy ADD CONSTRAINT sensor_readings_legacy_pkey PRIMARY KEY (id, ts)")
+
+    op.execute(f"CREATE TABLE sensor_readings ({COLUMNS}, PRIMARY KEY (id, ts)) PARTITION BY RANGE (ts)")
+    op.execute("ALTER SEQUENCE sensor_readings_id_seq OWNED BY sensor_readings.id")
+    for name, cols in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON sensor_readings {cols}")
+
+    op.execute(
+        "ALTER TABLE sensor_readings ATTACH PARTITION sensor_readings_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{boundary.isoformat(sep=' ')}')"
+    )
+    op.execute("CREATE TABLE sensor_readings_default PARTITION OF sensor_readings DEFAULT")
+
+
+def downgrade() -> None:
+    """Downgrade schema (copies every row back into a plain table)."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute(f"CREATE TABLE sensor_readings_plain ({COLUMNS}, PRIMARY KEY (id))")
+    op.execute("INSERT INTO sensor_readings_plain SELECT * FROM sensor_readings")
+    op.execute("ALTER SEQUENCE sensor_readings_id_seq OWNED BY sensor_readings_plain.id")
+    op.execute("DROP TABLE sensor_readings")
+    op.execute("ALTER TABLE sensor_readings_plain RENAME TO sensor_readings")
+    op.execute("ALTER INDEX sensor_readings_plain_pkey RENAME TO sensor_readings_pkey")
+    for name, cols in INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON sensor_readings {cols}")
@@ -0,0 +1,35 @@
+"""keyset pagination indexes on sensor_readings
+
+Revision ID: c7f3a9e2d610
+Revises: b5e8c1d4a9f2
+Create Date: 2026-10-18 13:30:00.000000
+
+(ts, id) and (sensor_id, ts, id) replace the (ts) and (sensor_id, ts)
+indexes, which are their prefixes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f3a9e2d610'
+down_revision: Union[str, Sequence[str], None] = 'b5e8c1d4a9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_sr_ts_id', 'sensor_readings', ['ts', 'id'])
+    op.create_index('ix_sr_sensor_ts_id', 'sensor_readings', ['sensor_id', 'ts', 'id'])
+    op.drop_index('ix_sensor_readings_ts', table_name='sensor_readings')
+    op.drop_index('ix_sr_sensor_ts', table_name='sensor_readings')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_sr_sensor_ts', 'sensor_readings', ['sensor_id', 'ts'])
+    op.create_index('ix_sensor_readings_ts', 'sensor_readings', ['ts'])
+    op.drop_index('ix_sr_sensor_ts_id', table_name='sensor_readings')
+    op.drop_index('ix_sr_ts_id', table_name='sensor_readings')
@@ -0,0 +1,41 @@
+"""sensor stats catalog
+
+Revision ID: d4a8b2e6f913
+Revises: c7f3a9e2d610
+Create Date: 2026-10-18 15:10:00.000000
+
+Backfill existing sensors afterwards with scripts/rebuild_rollups.py
+(it rebuilds the rollups and this catalog).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8b2e6f913'
+down_revision: Union[str, Sequence[str], None] = 'c7f3a9e2d610'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sensor_stats',
+        sa.Column('sensor_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('first_ts', sa.DateTime(), nullable=True),
+        sa.Column('last_ts', sa.DateTime(), nullable=True),
+        sa.Column('row_count', sa.BigInteger(), nullable=False),
+        sa.Column('last_value', sa.Float(), nullable=True),
+        sa.Column('last_ingest_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['sensor_id'], ['sensors.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('sensor_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sensor_stats')
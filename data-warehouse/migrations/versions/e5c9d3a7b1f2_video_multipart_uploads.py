@@ -0,0 +1,51 @@
+"""video multipart uploads
+
+Revision ID: e5c9d3a7b1f2
+Revises: d4a8b2e6f913
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5c9d3a7b1f2'
+down_revision: Union[str, Sequence[str], None] = 'd4a8b2e6f913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('video_assets', sa.Column('object_key', sa.Text(), nullable=True))
+    op.add_column('video_assets', sa.Column('content_type', sa.Text(), nullable=True))
+    op.add_column('video_assets', sa.Column('status', sa.String(), nullable=False, server_default='complete'))
+    op.add_column('video_assets', sa.Column('upload_id', sa.Text(), nullable=True))
+    op.add_column('video_assets', sa.Column('part_size', sa.BigInteger(), nullable=True))
+    op.add_column('video_assets', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.create_table(
+        'video_upload_parts',
+        sa.Column('video_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('part_number', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('etag', sa.Text(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['video_id'], ['video_assets.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('video_id', 'part_number'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('video_upload_parts')
+    op.drop_column('video_assets', 'updated_at')
+    op.drop_column('video_assets', 'part_size')
+    op.drop_column('video_assets', 'upload_id')
+    op.drop_column('video_assets', 'status')
+    op.drop_column('video_assets', 'content_type')
+    op.drop_column('video_assets', 'object_key')
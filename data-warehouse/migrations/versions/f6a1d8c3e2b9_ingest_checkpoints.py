@@ -0,0 +1,38 @@
+"""ingest checkpoints
+
+Revision ID: f6a1d8c3e2b9
+Revises: e5c9d3a7b1f2
+Create Date: 2026-10-18 18:40:00.000000
+
+Buffered ingest (INGEST_MODE=buffered) keeps its flush checkpoint here, in
+the same transaction as the readings it covers. Slots that still hold a
+storage/ingest/slot-N/checkpoint file are read from it once after upgrade.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a1d8c3e2b9'
+down_revision: Union[str, Sequence[str], None] = 'e5c9d3a7b1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ingest_checkpoints',
+        sa.Column('slot_id', sa.String(length=36), nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=False),
+        sa.Column('position', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('slot_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('ingest_checkpoints')
@@ -0,0 +1,155 @@
+"""
+Parsed, typed view of storage/sensors/sensor_data.csv shared by the ML routes.
+
+The file is parsed once and kept as one frame per sensor sorted by Start
+Timestamp, so a time-range filter is a binary search instead of a mask
+over the whole file. The cache is keyed on the file's mtime and size; when
+the file only grew (same header, same bytes just before the old end) only
+the appended tail is parsed. Row-log files written by app/utils/csv_store.py
+are reduced to each row's latest version; an appended update or tombstone
+triggers a full re-parse.
+"""
+import io
+import os
+import logging
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SENSOR_CSV = os.path.join("storage", "sensors", "sensor_data.csv")
+ENCODING = "latin1"
+REQUIRED_COLUMNS = {"Sensor ID", "Start Timestamp", "End Timestamp", "Value", "Unit"}
+_PROBE = 64  # bytes before the previous end that must be unchanged for a tail read
+
+
+class SensorFrameCache:
+    def __init__(self, path: str = SENSOR_CSV):
+        self.path = path
+        self.columns = []
+        self._groups = {}        # sensor id -> frame sorted by Start Timestamp
+        self._key = None         # (mtime_ns, size) the groups reflect
+        self._offset = 0         # bytes parsed so far
+        self._header = b""
+        self._probe = b""
+        self._clean_end = False  # parsed data ended on a newline (tail reads are safe)
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.tail_reads = 0
+
+    # ───────────────────────────────────────────────
+    # 🔄 Loading
+    # ───────────────────────────────────────────────
+    def refresh(self) -> "SensorFrameCache":
+        """Bring the cache in line with the file (raises FileNotFoundError if it is gone)."""
+        st = os.stat(self.path)
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            if key == self._key:
+                return self
+            with open(self.path, "rb") as f:
+                tail = None
+                if self._is_append(f, st.st_size):
+                    f.seek(self._offset)
+                    tail = self._parse(f.read(st.st_size - self._offset), header=False)
+                if tail is not None and not _rewrites(tail):
+                    self._offset = st.st_size
+                    self._index(tail)
+                    self.tail_reads += 1
+                else:
+                    f.seek(0)
+                    self._groups, self._offset = {}, 0
+                    self._consume(f.read(st.st_size), header=True)
+                    self.reloads += 1
+                    logger.info(f"Parsed {self.path}: {sum(len(g) for g in self._groups.values())} rows")
+            self._key = key
+        return self
+
+    def _is_append(self, f, size: int) -> bool:
+        if self._key is None or not self._clean_end or size <= self._offset:
+            return False
+        if f.read(len(self._header)) != self._header:
+            return False
+        f.seek(self._offset - len(self._probe))
+        return f.read(len(self._probe)) == self._probe
+
+    def _consume(self, data: bytes, header: bool):
+        df = self._parse(data, header)
+        self._offset += len(data)
+        if df is None:
+            return
+        if "op" in df.columns:
+            # Row-log file (app/utils/csv_store.py): keep each row's latest version
+            df = df.drop_duplicates("id", keep="last")
+            df = df[df["op"] != "D"]
+        self._index(df)
+
+    def _parse(self, data: bytes, header: bool) -> pd.DataFrame | None:
+        """Typed rows of a chunk (None if it has none, or lacks Sensor ID / Start Timestamp)."""
+        if header:
+            self._header = data[:data.find(b"\n") + 1]
+        self._probe = data[-_PROBE:]
+        self._clean_end = data.endswith(b"\n")
+        if not data.strip():
+            return None
+
+        if header:
+            df = pd.read_csv(io.BytesIO(data), encoding=ENCODING, on_bad_lines="skip")
+            df.columns = df.columns.str.strip()
+            self.columns = df.columns.tolist()
+        else:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=self.columns,
+                             encoding=ENCODING, on_bad_lines="skip")
+        if "op" in df.columns:
+            df["op"] = df["op"].fillna("").astype(str)
+        for col in ("Start Timestamp", "End Timestamp"):
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+        if "Sensor ID" not in df.columns or "Start Timestamp" not in df.columns:
+            return None
+        df["Sensor ID"] = df["Sensor ID"].astype(str)
+        return df
+
+    def _index(self, df: pd.DataFrame):
+        df = df.drop(columns=["op"], errors="ignore").dropna(subset=["Start Timestamp"])
+        for sensor_id, part in df.groupby("Sensor ID", sort=False):
+            part = part.sort_values("Start Timestamp", kind="mergesort")
+            prev = self._groups.get(sensor_id)
+            if prev is not None:
+                in_order = part["Start Timestamp"].iat[0] >= prev["Start Timestamp"].iat[-1]
+                part = pd.concat([prev, part])
+                if not in_order:
+                    part = part.sort_values("Start Timestamp", kind="mergesort")
+            self._groups[sensor_id] = part.reset_index(drop=True)
+
+    # ───────────────────────────────────────────────
+    # 🔎 Lookups
+    # ───────────────────────────────────────────────
+    def sensor(self, sensor_id: str) -> pd.DataFrame | None:
+        return self._groups.get(sensor_id)
+
+    def between(self, sensor_id: str, start, end) -> pd.DataFrame:
+        """Rows with Start Timestamp >= start and End Timestamp <= end, ordered by start."""
+        frame = self._groups.get(sensor_id)
+        if frame is None:
+            return pd.DataFrame(columns=self.columns)
+        starts = frame["Start Timestamp"]
+        # A reading ends after it starts, so every match also has start <= end
+        part = frame.iloc[starts.searchsorted(start, "left"):starts.searchsorted(end, "right")]
+        return part[part["End Timestamp"] <= end]
+
+    def extent(self, sensor_id: str):
+        """(first, last) Start Timestamp of a sensor, or None."""
+        frame = self._groups.get(sensor_id)
+        if frame is None or frame.empty:
+            return None
+        starts = frame["Start Timestamp"]
+        return starts.iat[0], starts.iat[-1]
+
+
+def _rewrites(df: pd.DataFrame) -> bool:
+    """True if an appended chunk updates or deletes earlier rows (needs a full re-parse)."""
+    return "op" in df.columns and bool(df["op"].isin(["U", "D"]).any())
+
+
+frames = SensorFrameCache()
@@ -4,6 +4,9 @@ import pandas as pd
 import logging
 import os
 
+from app.utils import columnar
+from ml_dashboard.backend.frame_cache import REQUIRED_COLUMNS, frames
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,48 +17,33 @@ router = APIRouter(prefix="/ml")
 def get_sensor_data(
     sensor_id: str = Query(..., description="Sensor ID to filter"),
     start: str = Query(..., description="Start timestamp"),
-    end: str = Query(..., description="End timestamp")
+    end: str = Query(..., description="End timestamp"),
+    format: str = Query("csv", description="csv, parquet, arrow or feather")
 ):
-    file_path = os.path.join("storage", "sensors", "sensor_data.csv")
+    columnar.check_format(format)
+    file_path = frames.path
 
     # Check file exists
     if not os.path.isfile(file_path):
         logger.error(f"CSV file not found at: {file_path}")
         raise HTTPException(status_code=500, detail="Sensor data file not found.")
 
-    # Read CSV
+    # Parsed once and cached; only appended rows are read again
     try:
-        df = pd.read_csv(file_path, encoding='latin1', on_bad_lines='skip')
-        df.columns = df.columns.str.strip()  # Clean column names
-        logger.info(f"Cleaned CSV columns: {df.columns.tolist()}")
-
-        # Validate required columns
-        required_columns = {"Sensor ID", "Start Timestamp", "End Timestamp", "Value", "Unit"}
-        actual_columns = set(df.columns)
-        missing = required_columns - actual_columns
-
-        if missing:
-            logger.warning(f"Missing required columns in CSV: {missing}")
-            raise HTTPException(status_code=400, detail=f"Missing columns: {missing}")
-
-        # Convert timestamps
-        df["Start Timestamp"] = pd.to_datetime(df["Start Timestamp"], errors="coerce")
-        df["End Timestamp"] = pd.to_datetime(df["End Timestamp"], errors="coerce")
-
+        cache = frames.refresh()
     except Exception as e:
         logger.exception("Failed to read CSV file.")
         raise HTTPException(status_code=500, detail="Error reading the data file.")
 
-    # Filter data
+    # Validate required columns
+    missing = REQUIRED_COLUMNS - set(cache.columns)
+    if missing:
+        logger.warning(f"Missing required columns in CSV: {missing}")
+        raise HTTPException(status_code=400, detail=f"Missing columns: {missing}")
+
+    # Filter data (binary search on the sensor's sorted timestamps)
     try:
-        start_dt = pd.to_datetime(start)
-        end_dt = pd.to_datetime(end)
-
-        filtered = df[
-            (df["Sensor ID"] == sensor_id) &
-            (df["Start Timestamp"] >= start_dt) &
-            (df["End Timestamp"] <= end_dt)
-        ]
+        filtered = cache.between(sensor_id, pd.to_datetime(start), pd.to_datetime(end))
     except Exception as e:
         logger.exception("Error while filtering data.")
         raise HTTPException(status_code=400, detail="Invalid filter parameters.")
@@ -65,43 +53,44 @@ def get_sensor_data(
         raise HTTPException(status_code=404, detail="No data for given parameters.")
 
     # Export filtered data
-    export_path = f"storage/temp/{sensor_id}_filtered_dataset.csv"
+    ext = "csv" if format == "csv" else columnar.FORMATS[format][1]
+    export_path = f"storage/temp/{sensor_id}_filtered_dataset.{ext}"
     try:
         os.makedirs(os.path.dirname(export_path), exist_ok=True)
-        filtered.to_csv(export_path, index=False)
+        if format == "csv":
+            filtered.to_csv(export_path, index=False)
+        else:
+            table = columnar.pa.Table.from_pandas(filtered, preserve_index=False)
+            columnar.write_table(format, table, export_path)
         logger.info(f"Exported filtered data to: {export_path}")
     except Exception as e:
         logger.exception("Failed to write filtered data to file.")
         raise HTTPException(status_code=500, detail="Failed to export filtered data.")
 
-    return FileResponse(export_path, media_type="text/csv", filename=f"{sensor_id}_dataset.csv")
+    media_type = "text/csv" if format == "csv" else columnar.FORMATS[format][0]
+    return FileResponse(export_path, media_type=media_type, filename=f"{sensor_id}_dataset.{ext}")
 
 
 @router.get("/sensor/timestamps")
 def get_sensor_timestamps(sensor_id: str):
-    file_path = "storage/sensors/sensor_data.csv"
+    file_path = frames.path
 
     if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="Sensor data file not found.")
 
     try:
-        df = pd.read_csv(file_path, encoding='latin1', on_bad_lines='skip')
-        df.columns = df.columns.str.strip()
-        df["Start Timestamp"] = pd.to_datetime(df["Start Timestamp"], errors="coerce")
-        df = df.dropna(subset=["Start Timestamp"])
+        cache = frames.refresh()
     except Exception as e:
         logger.exception("Failed to process CSV for timestamps.")
         raise HTTPException(status_code=500, detail="Error reading the data file.")
 
-    if "Sensor ID" not in df.columns:
+    if "Sensor ID" not in cache.columns:
         raise HTTPException(status_code=400, detail="Missing 'Sensor ID' column.")
 
-    sensor_df = df[df["Sensor ID"] == sensor_id]
-    if sensor_df.empty:
+    extent = cache.extent(sensor_id)
+    if extent is None:
         raise HTTPException(status_code=404, detail="No data for given sensor.")
-
-    min_time = sensor_df["Start Timestamp"].min()
-    max_time = sensor_df["Start Timestamp"].max()
+    min_time, max_time = extent
 
     return {
         "sensor_id": sensor_id,
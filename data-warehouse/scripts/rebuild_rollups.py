@@ -0,0 +1,31 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+from app import database, rollups, sensor_stats
+
+# ─────────────────────────────────────────────
+#  Recompute sensor_rollups and sensor_stats from raw readings
+#  (backfill after the migration, or repair)
+# ─────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild 1min/1h/1d sensor rollups and the sensor stats catalog")
+    parser.add_argument("sensor_ids", nargs="*", help="Sensor UUIDs (default: all sensors)")
+    args = parser.parse_args()
+
+    db = database.SessionLocal()
+    try:
+        print("🔁 Rebuilding sensor rollups...")
+        written = rollups.rebuild(db, args.sensor_ids or None)
+        print(f"✅ Wrote {written} rollup rows")
+        print("🔁 Rebuilding sensor stats catalog...")
+        written = sensor_stats.rebuild(db, args.sensor_ids or None)
+        print(f"✅ Refreshed {written} sensors")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,8 @@ def seed_data():
     print("🌱 Seeding demo data...")
 
     # Wipe existing tables (optional for dev/testing)
+    db.query(models.SensorRollup).delete()
+    db.query(models.SensorStats).delete()
     db.query(models.SensorReading).delete()
     db.query(models.Sensor).delete()
     if hasattr(models, "Video"):
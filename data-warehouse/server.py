@@ -4,19 +4,19 @@ import os
 import datetime
 import io
 import csv
+import shutil
 import zipfile
 from fastapi import (
-    FastAPI, Form, Depends, HTTPException, UploadFile, File
+    FastAPI, Form, Depends, HTTPException, UploadFile, File, Request
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
-from app import models, database
-from app.database import engine
+from app import models, database, sensor_stats
+from app.database import engine, get_db
 from app.auth import (
     create_access_token,
     hash_password,
@@ -37,15 +37,13 @@ ALGORITHM = "HS256"
 # ✅ Initialize uploads database
 # ───────────────────────────────────────────────
 
-import sqlite3
+from app import sqlite_db
 
 DB_PATH = "datawarehouse.db"  # adjust if your DB file name is different
 
 # ✅ Ensure uploads table exists
 def init_uploads_table():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
+    sqlite_db.execute(DB_PATH, """
         CREATE TABLE IF NOT EXISTS uploads (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             filename TEXT NOT NULL,
@@ -54,10 +52,6 @@ def init_uploads_table():
             uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    conn.commit()
-    conn.close()
-
-init_uploads_table()
 
 
 
@@ -67,6 +61,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 # Routers
 from api.sensor_pg import router as sensor_pg_router
 from api.export import router as export_router
+from api.video_upload import router as video_upload_router
 
 
 
@@ -81,27 +76,51 @@ app = FastAPI(
     description="Centralized platform for sensor, video, and storage management.",
     version="2.3.0",
 )
-# Include routers (Sensor API, Export API)
+# Include routers (Sensor API, Export API, resumable video uploads)
 app.include_router(sensor_pg_router)
 app.include_router(export_router)
+app.include_router(video_upload_router)
 
 
-models.Base.metadata.create_all(bind=engine)
+# ───────────────────────────────────────────────
+# Background services (ingest buffer, cache invalidation listener, partition maintenance,
+# storage ledger reconciliation)
+# ───────────────────────────────────────────────
+from app import ingest, ingest_buffer, pg_notify, partitions, storage_ledger, object_store, loop_monitor, startup
+from storage import minio_migrate
 
 
-# Auto-migrate old files to MinIO once at startup
-from storage.minio_migrate import migrate_local_files_to_minio
+@app.on_event("startup")
+def start_background_services():
+    """Schema, tables and background services, timed step by step (see app/startup.py)."""
+    startup.report.begin()
+    startup.ensure_schema(engine, models.Base.metadata)
+    with startup.report.step("uploads table"):
+        init_uploads_table()
+    with startup.report.step("background services"):
+        ingest_buffer.start()
+        pg_notify.start()
+        partitions.start()
+        storage_ledger.start()
+    startup.migrate_at_startup()
 
-try:
-    migrate_local_files_to_minio()
-except Exception as e:
-    print("⚠️ MinIO migration skipped:", e)
 
+@app.on_event("startup")
+async def start_loop_monitor():
+    loop_monitor.monitor.start()
+    startup.ready()
 
-# ───────────────────────────────────────────────
-# Database setup
-# ───────────────────────────────────────────────
-models.Base.metadata.create_all(bind=engine)
+
+@app.on_event("shutdown")
+def stop_background_services():
+    ingest_buffer.stop()
+    pg_notify.stop()
+    partitions.stop()
+    storage_ledger.stop()
+    loop_monitor.monitor.stop()
+    minio_migrate.stop()
+    object_store.shutdown()
+    sqlite_db.close_all()
 
 
 # ───────────────────────────────────────────────
@@ -115,6 +134,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+DB_CHECKOUTS_WARN = int(os.getenv("DB_CHECKOUTS_WARN", "3"))  # warn above this many per request
+
+
+@app.middleware("http")
+async def count_db_checkouts(request: Request, call_next):
+    """
+    Report how many pool checkouts each request made (X-DB-Checkouts).
+    Counted until the response headers are ready: a StreamingResponse body
+    runs afterwards on its own session and is not included.
+    """
+    counter = database.begin_request_accounting()
+    response = await call_next(request)
+    database.end_request_accounting(counter)
+    response.headers["X-DB-Checkouts"] = str(counter.count)
+    if counter.count > DB_CHECKOUTS_WARN:
+        logger.warning(f"⚠️ {request.method} {request.url.path} used {counter.count} DB checkouts")
+    elif counter.count > 1:
+        logger.debug(f"{request.method} {request.url.path} used {counter.count} DB checkouts")
+    return response
+
 # ───────────────────────────────────────────────
 # 🗂️ Static File Mounts (Admin + User)
 # ───────────────────────────────────────────────
@@ -130,10 +170,6 @@ UPLOAD_DIR = "uploaded_files"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 app.mount("/uploaded_files", StaticFiles(directory=UPLOAD_DIR), name="uploaded_files")
 
-# Routers
-app.include_router(sensor_pg_router)
-app.include_router(export_router)
-
 # ───────────────────────────────────────────────
 # Root & Health
 # ───────────────────────────────────────────────
@@ -162,67 +198,108 @@ def health_check():
 # ───────────────────────────────────────────────
 @app.get("/api/admin/storage-usage")
 def get_storage_usage():
-    base_folder = "storage"
-    usage = {"sensors": 0.0, "videos": 0.0, "others": 0.0}
-
-    if not os.path.exists(base_folder):
+    """Storage per category, from the storage ledger (no filesystem walk)."""
+    if not os.path.exists("storage"):
         return JSONResponse({"error": "Storage folder not found"}, status_code=404)
 
-    for root, _, files in os.walk(base_folder):
-        for file in files:
-            try:
-                size_mb = os.path.getsize(os.path.join(root, file)) / (1024 * 1024)
-                if "videos" in root:
-                    usage["videos"] += size_mb
-                elif "sensor" in root or file.endswith((".db", ".csv")):
-                    usage["sensors"] += size_mb
-                else:
-                    usage["others"] += size_mb
-            except Exception:
-                continue
+    usage = storage_ledger.megabytes("storage", ("sensors", "videos", "others"))
+    return {"total_storage_mb": round(sum(usage.values()), 2), "details": usage}
 
-    total = sum(usage.values())
-    return {"total_storage_mb": round(total, 2),
-            "details": {k: round(v, 2) for k, v in usage.items()}}
 
+@app.get("/api/admin/storage-ledger")
+def get_storage_ledger(user=Depends(get_current_user)):
+    """Ledger totals, size histograms and the last reconciliation scan per scope."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    scans = storage_ledger.scans()
+    return {
+        name: {
+            "totals": storage_ledger.totals(name),
+            "histogram": storage_ledger.histogram(name),
+            "last_scan": scans.get(name),
+        }
+        for name in storage_ledger.SCOPES
+    }
 
-@app.get("/api/admin/sensor-count")
-def get_sensor_count():
-    db: Session = database.SessionLocal()
-    try:
-        results = (
-            db.query(models.Sensor.name, func.count(models.SensorReading.id))
-            .outerjoin(models.SensorReading, models.Sensor.id == models.SensorReading.sensor_id)
-            .group_by(models.Sensor.id)
-            .all()
-        )
-        return {name: int(count) for name, count in results}
-    finally:
-        db.close()
 
+@app.post("/api/admin/storage-ledger/reconcile")
+def reconcile_storage_ledger(user=Depends(get_current_user)):
+    """Rescan every scope now and correct the ledger."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return storage_ledger.reconcile_all(force=True)
 
-@app.get("/api/admin/video-storage")
-def get_video_storage():
-    video_dir = "storage/videos"
-    size_buckets = {"Small (<10MB)": 0, "Medium (10–100MB)": 0, "Large (>100MB)": 0}
-    file_sizes = {}
 
-    if not os.path.exists(video_dir):
-        return {"buckets": size_buckets, "files": file_sizes}
+@app.get("/api/admin/db-pool")
+def get_db_pool_stats(user=Depends(get_current_user)):
+    """Connection pool status and per-request checkout counts."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return database.pool_status()
 
-    for filename in os.listdir(video_dir):
-        path = os.path.join(video_dir, filename)
-        if os.path.isfile(path):
-            size_mb = round(os.path.getsize(path) / (1024 * 1024), 2)
-            file_sizes[filename] = size_mb
-            if size_mb < 10:
-                size_buckets["Small (<10MB)"] += 1
-            elif size_mb < 100:
-                size_buckets["Medium (10–100MB)"] += 1
-            else:
-                size_buckets["Large (>100MB)"] += 1
 
-    return {"buckets": size_buckets, "files": file_sizes}
+@app.get("/api/admin/event-loop")
+def get_event_loop_stats(user=Depends(get_current_user)):
+    """Event-loop blocking time in this worker and object-store pool usage."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {"loop": loop_monitor.monitor.stats(), "object_store": object_store.stats()}
+
+
+@app.get("/api/admin/startup")
+def get_startup_report(user=Depends(get_current_user)):
+    """Cold-start timing of this worker and the background MinIO migration."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return {**startup.report.as_dict(), "migration_status": minio_migrate.status()}
+
+
+@app.get("/api/admin/partitions")
+def get_reading_partitions(user=Depends(get_current_user)):
+    """sensor_readings partitions and their ts ranges."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    with engine.connect() as conn:
+        if not partitions.is_partitioned(conn):
+            return {"partitioned": False, "partitions": []}
+        return {"partitioned": True, "partitions": partitions.list_partitions(conn)}
+
+
+@app.delete("/api/admin/partitions")
+def drop_old_readings(before: str, user=Depends(get_current_user)):
+    """Retention: drop whole partitions older than `before` (ISO timestamp)."""
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    try:
+        cutoff = ingest.parse_ts(before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'before' timestamp")
+    if cutoff is None:
+        raise HTTPException(status_code=400, detail="Missing 'before' timestamp")
+    with engine.begin() as conn:
+        return partitions.drop_before(conn, cutoff)
+
+
+@app.get("/api/admin/sensor-count")
+def get_sensor_count(db: Session = Depends(get_db)):
+    """Readings per sensor name, from the sensor_stats catalog (no scan of sensor_readings)."""
+    return {s["name"]: int(s["row_count"]) for s in sensor_stats.catalog(db)}
+
+
+@app.get("/api/admin/video-storage")
+def get_video_storage(limit: int = 100):
+    """Video size buckets and the `limit` largest videos, from the storage ledger."""
+    hist = list(storage_ledger.histogram("videos").values())  # <1MB, 1–10MB, 10–100MB, 100MB–1GB, >1GB
+    size_buckets = {
+        "Small (<10MB)": hist[0] + hist[1],
+        "Medium (10–100MB)": hist[2],
+        "Large (>100MB)": hist[3] + hist[4],
+    }
+    file_sizes = {
+        os.path.basename(key): round(size / (1024 * 1024), 2)
+        for key, size in storage_ledger.largest("videos", max(1, min(limit, 1000)))
+    }
+    return {"buckets": size_buckets, "files": file_sizes, "count": sum(hist)}
 
 
 # ───────────────────────────────────────────────
@@ -234,31 +311,33 @@ from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse, StreamingResponse
 import datetime, io, csv, zipfile
 from app.database import get_db
-from app import models
+from app import models, pagination
 from app.auth import get_current_active_user
 
-router = APIRouter()
-
 # ✅ Get all sensors (admin sees all, user sees only their own)
 @app.get("/api/sensors")
-def get_sensors(user: models.User = Depends(get_current_active_user)):
-    db = database.SessionLocal()
-    try:
-        query = db.query(models.Sensor)
-        if not user.is_admin:
-            query = query.filter(models.Sensor.owner_id == user.id)
-        sensors = query.all()
-        return [{"id": str(s.id), "name": s.name} for s in sensors]
-    finally:
-        db.close()
+def get_sensors(user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    query = db.query(models.Sensor)
+    if not user.is_admin:
+        query = query.filter(models.Sensor.owner_id == user.id)
+    sensors = query.all()
+    return [{"id": str(s.id), "name": s.name} for s in sensors]
 
 
 
 # ✅ Get all sensor readings (admin sees all, user sees only their own)
 @app.get("/api/sensors/all-readings")
-def get_all_readings(user: models.User = Depends(get_current_active_user)):
-    """Return all sensor readings — admin sees all, user sees their own."""
-    db: Session = database.SessionLocal()
+def get_all_readings(
+    limit: int = pagination.DEFAULT_LIMIT,
+    after: str | None = None,
+    before: str | None = None,
+    user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Sensor readings, newest first — admin sees all, user sees their own.
+    Keyset-paginated: pass next_cursor back as `after` (prev_cursor as `before`).
+    """
     try:
         # Base query
         query = (
@@ -271,220 +350,50 @@ def get_all_readings(user: models.User = Depends(get_current_active_user)):
                 models.Sensor.name.label("sensor_name"),
             )
             .join(models.Sensor, models.SensorReading.sensor_id == models.Sensor.id)
-            .order_by(models.SensorReading.ts.desc())
         )
 
         # Admin vs normal user filter
         if not user.is_admin:
             query = query.filter(models.Sensor.owner_id == user.id)
 
-        results = query.all()
-
-        if not results:
-            return []
-
-        return [
-            {
-                "id": str(r.id),
-                "sensor_name": r.sensor_name or "Unknown",
-                "start_time": r.ts.isoformat() if r.ts else None,
-                "end_time": r.ts_end.isoformat() if r.ts_end else None,
-                "value": r.value,
-                "unit": r.unit or "",
-            }
-            for r in results
-        ]
-
-    except Exception as e:
-        print("❌ Error loading all readings:", e)
-        raise HTTPException(status_code=500, detail="Database error")
-    finally:
-        db.close()
-
-
-
-# ✅ Add new sensor reading (FormData)
-@router.post("/api/sensors/add")
-def add_sensor_reading(
-    sensor_name: str = Form(...),
-    value: float = Form(...),
-    unit: str = Form(""),
-    ts: str = Form(None),
-    user: models.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    try:
-        # Find or create the sensor
-        sensor = (
-            db.query(models.Sensor)
-            .filter(models.Sensor.name == sensor_name)
-            .filter(models.Sensor.owner_id == user.id)
-            .first()
+        results, next_cursor, prev_cursor = pagination.keyset_page(
+            query, models.SensorReading.ts, models.SensorReading.id,
+            limit=limit, after=after, before=before, descending=True,
         )
-        if not sensor:
-            sensor = models.Sensor(name=sensor_name, owner_id=user.id)
-            db.add(sensor)
-            db.commit()
-            db.refresh(sensor)
-
-        # Parse timestamp
-        if ts:
-            try:
-                start_time = datetime.datetime.fromisoformat(ts)
-            except ValueError:
-                start_time = datetime.datetime.utcnow()
-        else:
-            start_time = datetime.datetime.utcnow()
-
-        end_time = start_time + datetime.timedelta(minutes=1)
 
-        reading = models.SensorReading(
-            sensor_id=sensor.id,
-            owner_id=user.id,
-            ts=start_time,
-            ts_end=end_time,
-            value=value,
-            unit=unit,
-        )
-        db.add(reading)
-        db.commit()
-
-        return {"message": "✅ Sensor reading added successfully!"}
+        return {
+            "items": [
+                {
+                    "id": str(r.id),
+                    "sensor_name": r.sensor_name or "Unknown",
+                    "start_time": r.ts.isoformat() if r.ts else None,
+                    "end_time": r.ts_end.isoformat() if r.ts_end else None,
+                    "value": r.value,
+                    "unit": r.unit or "",
+                }
+                for r in results
+            ],
+            "next_cursor": next_cursor,
+            "prev_cursor": prev_cursor,
+        }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        db.rollback()
-        print("❌ Error adding reading:", e)
+        print("❌ Error loading all readings:", e)
         raise HTTPException(status_code=500, detail="Database error")
 
 
-# ✅ Update reading
-@router.put("/api/sensors/update/{reading_id}")
-def update_sensor_reading(
-    reading_id: int,
-    value: float = Form(...),
-    unit: str = Form(""),
-    db: Session = Depends(get_db)
-):
-    reading = db.query(models.SensorReading).filter(models.SensorReading.id == reading_id).first()
-    if not reading:
-        raise HTTPException(status_code=404, detail="Reading not found")
-
-    reading.value = value
-    reading.unit = unit
-    db.commit()
-    db.refresh(reading)
-    return {"message": "✅ Reading updated successfully"}
-
-
-# ✅ Delete reading
-@router.delete("/api/sensors/delete/{reading_id}")
-def delete_sensor_reading(reading_id: int, db: Session = Depends(get_db)):
-    reading = db.query(models.SensorReading).filter(models.SensorReading.id == reading_id).first()
-    if not reading:
-        raise HTTPException(status_code=404, detail="Reading not found")
-
-    db.delete(reading)
-    db.commit()
-    return {"message": "✅ Reading deleted successfully"}
-
-
-# ✅ Export CSV / ZIP
-@router.get("/api/export/sensor-data")
-def export_sensor_data(sensor_ids: str, start: str, end: str, db: Session = Depends(get_db)):
-    try:
-        start_dt = datetime.datetime.fromisoformat(start)
-        end_dt = datetime.datetime.fromisoformat(end)
-        sensor_id_list = [s.strip() for s in sensor_ids.split(",") if s.strip()]
-
-        if not sensor_id_list:
-            raise HTTPException(status_code=400, detail="No sensors selected.")
-
-        sensor_data = {}
-        for sid in sensor_id_list:
-            rows = (
-                db.query(
-                    models.Sensor.name.label("sensor_name"),
-                    models.SensorReading.ts,
-                    models.SensorReading.ts_end,
-                    models.SensorReading.value,
-                    models.SensorReading.unit,
-                )
-                .join(models.Sensor, models.SensorReading.sensor_id == models.Sensor.id)
-                .filter(models.SensorReading.sensor_id == sid)
-                .filter(models.SensorReading.ts >= start_dt)
-                .filter(models.SensorReading.ts <= end_dt)
-                .order_by(models.SensorReading.ts)
-                .all()
-            )
-            if rows:
-                sensor_data[rows[0].sensor_name] = rows
-
-        if not sensor_data:
-            raise HTTPException(status_code=404, detail="No data found in this range.")
-
-        if len(sensor_data) == 1:
-            name, rows = list(sensor_data.items())[0]
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(["Sensor Name", "Start Time", "End Time", "Value", "Unit"])
-            for r in rows:
-                writer.writerow([
-                    r.sensor_name,
-                    r.ts.strftime("%Y-%m-%d %H:%M:%S"),
-                    r.ts_end.strftime("%Y-%m-%d %H:%M:%S") if r.ts_end else "",
-                    r.value,
-                    r.unit,
-                ])
-            output.seek(0)
-            filename = f"{name}_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            return StreamingResponse(
-                io.BytesIO(output.getvalue().encode()),
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
-
-        # Multiple → ZIP
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for name, rows in sensor_data.items():
-                csv_buffer = io.StringIO()
-                writer = csv.writer(csv_buffer)
-                writer.writerow(["Sensor Name", "Start Time", "End Time", "Value", "Unit"])
-                for r in rows:
-                    writer.writerow([
-                        r.sensor_name,
-                        r.ts.strftime("%Y-%m-%d %H:%M:%S"),
-                        r.ts_end.strftime("%Y-%m-%d %H:%M:%S") if r.ts_end else "",
-                        r.value,
-                        r.unit,
-                    ])
-                zipf.writestr(f"{name}.csv", csv_buffer.getvalue())
-
-        zip_buffer.seek(0)
-        zip_filename = f"sensors_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={zip_filename}"}
-        )
-    except Exception as e:
-        print("❌ CSV Export Error:", e)
-        raise HTTPException(status_code=500, detail=str(e))
-    
 
     # Get only sensors for current user
 @app.get("/api/user/sensors")
-def get_user_sensors(user: models.User = Depends(get_current_active_user)):
-    db = database.SessionLocal()
-    try:
-        sensors = (
-            db.query(models.Sensor)
-            .filter(models.Sensor.owner_id == user.id)
-            .all()
-        )
-        return [{"id": str(s.id), "name": s.name} for s in sensors]
-    finally:
-        db.close()
+def get_user_sensors(user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    sensors = (
+        db.query(models.Sensor)
+        .filter(models.Sensor.owner_id == user.id)
+        .all()
+    )
+    return [{"id": str(s.id), "name": s.name} for s in sensors]
 
 
 
@@ -537,11 +446,12 @@ def download_video(filename: str):
 
 @app.post("/api/videos/upload")
 def upload_video(file: UploadFile = File(...)):
-    """Upload new video"""
+    """Upload new video (large recordings: use the resumable /api/videos/uploads protocol)"""
     try:
         dest = os.path.join(VIDEO_DIR, file.filename)
         with open(dest, "wb") as buffer:
-            buffer.write(file.file.read())
+            shutil.copyfileobj(file.file, buffer, 1024 * 1024)
+        storage_ledger.record(dest)
         return {"status": "success", "filename": file.filename}
     except Exception as e:
         print("❌ Upload failed:", e)
@@ -556,6 +466,7 @@ def delete_video(filename: str):
         if not os.path.exists(path):
             return JSONResponse({"error": "File not found"}, status_code=404)
         os.remove(path)
+        storage_ledger.forget(path)
         return {"status": "success", "message": f"{filename} deleted"}
     except Exception as e:
         print("❌ Error deleting video:", e)
@@ -568,33 +479,16 @@ def delete_video(filename: str):
 from fastapi import UploadFile, File, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from pathlib import Path
-import io, os, sqlite3
+import io, os
 
 from app.auth import get_current_active_user
-from app import models
-from storage.minio_client import minio_client, MINIO_BUCKET  # ✅ MinIO client
+from app import models, sqlite_db
+from fastapi.concurrency import run_in_threadpool
+from app.object_store import store as file_store  # ✅ MinIO, off the event loop
+from app.utils.object_stream import object_response
 
 DB_PATH = "datawarehouse.db"
 
-# ───────────────────────────────────────────────
-# Ensure uploads metadata table
-# ───────────────────────────────────────────────
-def _ensure_uploads_table():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS uploads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            size_mb REAL NOT NULL,
-            username TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-_ensure_uploads_table()
-
 # ───────────────────────────────────────────────
 # ✅ Upload file → to MinIO + record metadata in SQLite
 # ───────────────────────────────────────────────
@@ -605,30 +499,21 @@ async def upload_file(
 ):
     username = current_user.username
 
-    # Read file into memory (can be optimized later for large files)
-    contents = await file.read()
-
-    # Upload to MinIO bucket: store under username/filename
+    # Upload to MinIO bucket: store under username/filename (streamed from the spooled upload)
     object_name = f"{username}/{file.filename}"
-    file_bytes = io.BytesIO(contents)
-    minio_client.put_object(
-        MINIO_BUCKET,
-        object_name,
-        data=file_bytes,
-        length=len(contents),
-        content_type=file.content_type or "application/octet-stream",
+    size = await file_store.put(
+        object_name, file.file, content_type=file.content_type or "application/octet-stream"
     )
+    await run_in_threadpool(storage_ledger.record_object, object_name, size)
 
     # Save metadata into SQLite
-    size_mb = round(len(contents) / (1024 * 1024), 2)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
+    size_mb = round(size / (1024 * 1024), 2)
+    await run_in_threadpool(
+        sqlite_db.execute,
+        DB_PATH,
         "INSERT INTO uploads (filename, size_mb, username) VALUES (?, ?, ?)",
         (file.filename, size_mb, username),
     )
-    conn.commit()
-    conn.close()
 
     return {"message": "✅ File uploaded to MinIO successfully!", "filename": file.filename, "size_mb": size_mb}
 
@@ -638,17 +523,13 @@ async def upload_file(
 # ───────────────────────────────────────────────
 @app.get("/api/files")
 async def list_files(current_user: models.User = Depends(get_current_active_user)):
-    _ensure_uploads_table()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
     if current_user.is_admin:
-        c.execute("SELECT filename, size_mb, username FROM uploads")
+        rows = await run_in_threadpool(sqlite_db.query, DB_PATH, "SELECT filename, size_mb, username FROM uploads")
     else:
-        c.execute("SELECT filename, size_mb, username FROM uploads WHERE username=?", (current_user.username,))
-
-    rows = c.fetchall()
-    conn.close()
+        rows = await run_in_threadpool(
+            sqlite_db.query,
+            DB_PATH, "SELECT filename, size_mb, username FROM uploads WHERE username=?", (current_user.username,)
+        )
 
     return [{"filename": r[0], "size": r[1], "username": r[2]} for r in rows]
 
@@ -657,13 +538,11 @@ async def list_files(current_user: models.User = Depends(get_current_active_user
 # ✅ Download file — stream directly from MinIO
 # ───────────────────────────────────────────────
 @app.get("/api/files/download/{filename}")
-async def download_file(filename: str, current_user: models.User = Depends(get_current_active_user)):
-    _ensure_uploads_table()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT username FROM uploads WHERE filename=?", (filename,))
-    row = c.fetchone()
-    conn.close()
+async def download_file(filename: str, request: Request, current_user: models.User = Depends(get_current_active_user)):
+    """Stream from MinIO; supports Range (206) and If-None-Match (304)."""
+    row = await run_in_threadpool(
+        sqlite_db.query_one, DB_PATH, "SELECT username FROM uploads WHERE filename=?", (filename,)
+    )
 
     if not row:
         raise HTTPException(status_code=404, detail="File not found")
@@ -673,15 +552,7 @@ async def download_file(filename: str, current_user: models.User = Depends(get_c
         raise HTTPException(status_code=403, detail="Not authorized")
 
     object_name = f"{owner}/{filename}"
-
-    try:
-        file_obj = minio_client.get_object(MINIO_BUCKET, object_name)
-    except Exception:
-        raise HTTPException(status_code=404, detail="File not found in MinIO")
-
-    return StreamingResponse(file_obj, headers={
-        "Content-Disposition": f"attachment; filename={filename}"
-    })
+    return await object_response(request, file_store, object_name, filename=filename)
 
 
 # ───────────────────────────────────────────────
@@ -689,103 +560,55 @@ async def download_file(filename: str, current_user: models.User = Depends(get_c
 # ───────────────────────────────────────────────
 @app.delete("/api/files/delete/{filename}")
 async def delete_file(filename: str, current_user: models.User = Depends(get_current_active_user)):
-    _ensure_uploads_table()
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT username FROM uploads WHERE filename=?", (filename,))
-    row = c.fetchone()
+    row = await run_in_threadpool(
+        sqlite_db.query_one, DB_PATH, "SELECT username FROM uploads WHERE filename=?", (filename,)
+    )
 
     if not row:
-        conn.close()
         raise HTTPException(status_code=404, detail="File not found")
 
     owner = row[0]
     if not (current_user.is_admin or current_user.username == owner):
-        conn.close()
         raise HTTPException(status_code=403, detail="Not authorized")
 
     object_name = f"{owner}/{filename}"
     try:
-        minio_client.remove_object(MINIO_BUCKET, object_name)
+        await file_store.remove(object_name)
+        await run_in_threadpool(storage_ledger.forget_object, object_name)
     except Exception as e:
         print("⚠️ Warning:", e)
 
-    c.execute("DELETE FROM uploads WHERE filename=?", (filename,))
-    conn.commit()
-    conn.close()
+    await run_in_threadpool(sqlite_db.execute, DB_PATH, "DELETE FROM uploads WHERE filename=?", (filename,))
 
     return {"message": "✅ File deleted successfully from MinIO"}
 
 
 # ───────────────────────────────────────────────
-# ✅ File stats — still based on SQLite records
+# ✅ File stats — MinIO objects, from the storage ledger
 # ───────────────────────────────────────────────
 @app.get("/api/files/stats")
 def get_file_stats():
-    _ensure_uploads_table()
-    stats = {"Images": 0, "Documents": 0, "Videos": 0, "Others": 0}
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT filename, size_mb FROM uploads")
-    files = c.fetchall()
-    conn.close()
-
-    for fname, size_mb in files:
-        ext = fname.rsplit(".", 1)[-1].lower() if "." in fname else ""
-        if ext in {"jpg", "jpeg", "png", "gif"}:
-            stats["Images"] += size_mb
-        elif ext in {"pdf", "doc", "docx", "txt", "xlsx", "pptx"}:
-            stats["Documents"] += size_mb
-        elif ext in {"mp4", "avi", "mov", "mkv"}:
-            stats["Videos"] += size_mb
-        else:
-            stats["Others"] += size_mb
-
-    return {k: round(v, 2) for k, v in stats.items()}
+    mb = storage_ledger.megabytes("minio", ("images", "documents", "videos", "others"))
+    return {k.capitalize(): v for k, v in mb.items()}
 
 
 # ✅ Migrate existing local files to MinIO bucket (Admin only)
-from storage.minio_client import minio_client, MINIO_BUCKET
-import io
-
-@app.post("/api/files/migrate-minio")
+@app.post("/api/files/migrate-minio", status_code=202)
 async def migrate_to_minio(current_user: models.User = Depends(get_current_active_user)):
+    """Start (or join) a background migration; poll GET /api/files/migrate-minio for progress."""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
+    status = await run_in_threadpool(startup.start_migration)
+    if status is None:
+        raise HTTPException(status_code=409, detail="A migration is already running in another worker")
+    return status
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT filename, username FROM uploads")
-    rows = c.fetchall()
-    conn.close()
-
-    uploaded = []
-    skipped = []
-
-    for filename, username in rows:
-        file_path = UPLOAD_ROOT / username / filename
-        if not file_path.exists():
-            skipped.append(filename)
-            continue
-
-        object_name = f"{username}/{filename}"
-        with open(file_path, "rb") as f:
-            data = io.BytesIO(f.read())
-            minio_client.put_object(
-                MINIO_BUCKET,
-                object_name,
-                data,
-                length=data.getbuffer().nbytes,
-                content_type="application/octet-stream",
-            )
-        uploaded.append(filename)
 
-    return {
-        "message": f"✅ Migration complete: {len(uploaded)} uploaded, {len(skipped)} skipped.",
-        "uploaded": uploaded,
-        "skipped": skipped
-    }
+@app.get("/api/files/migrate-minio")
+def migrate_to_minio_status(current_user: models.User = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return minio_migrate.status() or {"running": False}
 
 
 # ───────────────────────────────────────────────
@@ -801,46 +624,38 @@ from app import database, models
 
 
 @app.post("/api/register")
-def register_user(form: OAuth2PasswordRequestForm = Depends()):
+def register_user(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """User registration (non-admin)."""
-    db = database.SessionLocal()
-    try:
-        existing = db.query(models.User).filter(models.User.username == form.username).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Username already exists")
-        user = models.User(
-            username=form.username,
-            hashed_password=hash_password(form.password),
-            is_admin=False
-        )
-        db.add(user)
-        db.commit()
-        return {"message": "User registered successfully"}
-    finally:
-        db.close()
+    existing = db.query(models.User).filter(models.User.username == form.username).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Username already exists")
+    user = models.User(
+        username=form.username,
+        hashed_password=hash_password(form.password),
+        is_admin=False
+    )
+    db.add(user)
+    db.commit()
+    return {"message": "User registered successfully"}
 
 
 @app.post("/api/login")
-def login_user(form: OAuth2PasswordRequestForm = Depends()):
-    db = database.SessionLocal()
-    try:
-        user = db.query(models.User).filter(models.User.username == form.username).first()
-        if not user or not verify_password(form.password, user.hashed_password):
-            raise HTTPException(status_code=401, detail="Invalid username or password")
-
-        token = create_access_token({
-            "sub": user.username,
-            "role": "admin" if user.is_admin else "user"
-        })
+def login_user(form: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = db.query(models.User).filter(models.User.username == form.username).first()
+    if not user or not verify_password(form.password, user.hashed_password):
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+
+    token = create_access_token({
+        "sub": user.username,
+        "role": "admin" if user.is_admin else "user"
+    })
 
-        return {
-            "access_token": token,
-            "token_type": "bearer",
-            "is_admin": user.is_admin,
-            "username": user.username
-        }
-    finally:
-        db.close()
+    return {
+        "access_token": token,
+        "token_type": "bearer",
+        "is_admin": user.is_admin,
+        "username": user.username
+    }
 
 
 
@@ -871,30 +686,25 @@ def create_default_admin():
 
 # ✅ Get user's own uploaded files
 @app.get("/api/user/files")
-def get_user_files(user: models.User = Depends(get_current_active_user)):
+def get_user_files(user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     """Return files uploaded by the logged-in user"""
-    db: Session = database.SessionLocal()
-    try:
-        files = db.query(models.File).filter(models.File.owner_id == user.id).order_by(models.File.uploaded_at.desc()).all()
-        return [
-            {
-                "id": str(f.id),
-                "filename": f.filename,
-                "filetype": f.filetype,
-                "size": f.size,
-                "uploaded_at": f.uploaded_at,
-            }
-            for f in files
-        ]
-    finally:
-        db.close()
+    files = db.query(models.File).filter(models.File.owner_id == user.id).order_by(models.File.uploaded_at.desc()).all()
+    return [
+        {
+            "id": str(f.id),
+            "filename": f.filename,
+            "filetype": f.filetype,
+            "size": f.size,
+            "uploaded_at": f.uploaded_at,
+        }
+        for f in files
+    ]
 
 
 
 # ✅ Upload new file
 @app.post("/api/files/upload")
-def upload_file(file: UploadFile = File(...), user: models.User = Depends(get_current_active_user)):
-    db: Session = database.SessionLocal()
+def upload_file(file: UploadFile = File(...), user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     try:
         # read file contents
         content = file.file.read()
@@ -917,13 +727,10 @@ def upload_file(file: UploadFile = File(...), user: models.User = Depends(get_cu
         db.rollback()
         print("❌ Upload error:", e)
         raise HTTPException(status_code=500, detail="File upload failed.")
-    finally:
-        db.close()
 
 # ✅ Delete file
 @app.delete("/api/files/delete/{file_id}")
-def delete_user_file(file_id: str, user: models.User = Depends(get_current_active_user)):
-    db: Session = database.SessionLocal()
+def delete_user_file(file_id: str, user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
     try:
         file_entry = db.query(models.File).filter(
             models.File.id == file_id,
@@ -939,31 +746,25 @@ def delete_user_file(file_id: str, user: models.User = Depends(get_current_activ
         db.rollback()
         print("❌ Delete error:", e)
         raise HTTPException(status_code=500, detail="Failed to delete file.")
-    finally:
-        db.close()
 
 
 # ✅ Download file (metadata only; for now simulated)
 @app.get("/api/files/download/{file_id}")
-def download_user_file(file_id: str, user: models.User = Depends(get_current_active_user)):
-    db: Session = database.SessionLocal()
-    try:
-        file_entry = db.query(models.File).filter(
-            models.File.id == file_id,
-            models.File.owner_id == user.id
-        ).first()
-        if not file_entry:
-            raise HTTPException(status_code=404, detail="File not found")
+def download_user_file(file_id: str, user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+    file_entry = db.query(models.File).filter(
+        models.File.id == file_id,
+        models.File.owner_id == user.id
+    ).first()
+    if not file_entry:
+        raise HTTPException(status_code=404, detail="File not found")
 
-        # Simulated download (metadata response)
-        return {
-            "filename": file_entry.filename,
-            "filetype": file_entry.filetype,
-            "size": file_entry.size,
-            "uploaded_at": file_entry.uploaded_at
-        }
-    finally:
-        db.close()
+    # Simulated download (metadata response)
+    return {
+        "filename": file_entry.filename,
+        "filetype": file_entry.filetype,
+        "size": file_entry.size,
+        "uploaded_at": file_entry.uploaded_at
+    }
 
 # ───────────────────────────────────────────────
 # FILE MANAGEMENT ENDPOINTS
@@ -980,23 +781,14 @@ def upload_file(file: UploadFile = File(...), user=Depends(get_current_user)):
     save_path = os.path.join(user_folder, file.filename)
     with open(save_path, "wb") as f:
         f.write(file.file.read())
+    storage_ledger.record(save_path)
     return {"message": f"{file.filename} uploaded for {user.username}"}
 
 
 @app.get("/api/files/stats")
 def get_file_stats():
-    stats = {"images": 0, "documents": 0, "others": 0}
-    for root, _, files in os.walk("storage/files"):
-        for f in files:
-            ext = f.lower().split(".")[-1]
-            size_mb = os.path.getsize(os.path.join(root, f)) / (1024 * 1024)
-            if ext in ["jpg", "jpeg", "png", "gif"]:
-                stats["images"] += size_mb
-            elif ext in ["pdf", "docx", "doc", "txt", "xlsx", "pptx"]:
-                stats["documents"] += size_mb
-            else:
-                stats["others"] += size_mb
-    return {k: round(v, 2) for k, v in stats.items()}
+    """storage/files usage per type, from the storage ledger."""
+    return storage_ledger.megabytes("files", ("images", "documents", "others"))
 
 
 
@@ -1017,10 +809,10 @@ def get_profile(user=Depends(get_current_user)):
 def update_password(
     old_password: str = Form(...),
     new_password: str = Form(...),
-    user=Depends(get_current_user)
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
 ):
     """Allow users to change their password."""
-    db = database.SessionLocal()
     try:
         db_user = db.query(models.User).filter(models.User.id == user.id).first()
         if not db_user:
@@ -1039,8 +831,6 @@ def update_password(
         db.rollback()
         logger.error(f"❌ Error updating password: {e}")
         raise HTTPException(status_code=500, detail="Internal error")
-    finally:
-        db.close()
 
 # ───────────────────────────────────────────────
 # Temporary Stub Endpoints for Admin Charts 
@@ -1090,11 +880,15 @@ from fastapi import Header
 
 # ✅ Generate & assign API key (admin only)
 @app.post("/api/admin/generate-api-key/{username}")
-def generate_user_api_key(username: str, current_user: models.User = Depends(get_current_active_user)):
+def generate_user_api_key(
+    username: str,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admins can generate API keys")
 
-    api_key = assign_api_key_to_user(username)
+    api_key = assign_api_key_to_user(username, db)
     return {
         "message": f"✅ API key generated for {username}",
         "api_key": api_key
@@ -1103,56 +897,32 @@ def generate_user_api_key(username: str, current_user: models.User = Depends(get
 
 # ✅ Revoke a user’s API key (admin only)
 @app.post("/api/admin/revoke-api-key/{username}")
-def revoke_user_api_key(username: str, current_user: models.User = Depends(get_current_active_user)):
+def revoke_user_api_key(
+    username: str,
+    current_user: models.User = Depends(get_current_active_user),
+    db: Session = Depends(get_db),
+):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Only admins can revoke API keys")
 
-    revoke_api_key(username)
+    revoke_api_key(username, db)
     return {"message": f"🚫 API key revoked for {username}"}
 
 
 # ✅ API key–based authentication (for programmatic access)
 @app.get("/api/auth/by-api-key")
-def auth_by_api_key(x_api_key: str = Header(None)):
+def auth_by_api_key(x_api_key: str = Header(None), db: Session = Depends(get_db)):
     """
     Verify API key passed via 'X-API-Key' header.
     Example: curl -H "X-API-Key: abc123..." http://localhost:8000/api/auth/by-api-key
     """
-    user = get_user_by_api_key(x_api_key)
+    user = get_user_by_api_key(x_api_key, db)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
     return {
         "message": "✅ API key is valid",
-        "user": user
-    }
-
-
-
-# ───────────────────────────────────────────────
-
-@app.post("/api/files/migrate-minio")
-def migrate_files_to_minio(user=Depends(get_current_user)):
-    """Migrate all files to MinIO storage."""
-    if not user.is_admin:
-        raise HTTPException(status_code=403, detail="Admin access required")
-
-    # Logic to migrate files to MinIO
-    uploaded_files = []
-    skipped_files = []
-
-    for root, dirs, files in os.walk("storage/files"):
-        for filename in files:
-            file_path = os.path.join(root, filename)
-            if upload_file_to_minio(file_path):
-                uploaded_files.append(filename)
-            else:
-                skipped_files.append(filename)
-
-    return {
-        "message": "File migration completed",
-        "uploaded": uploaded_files,
-        "skipped": skipped_files
+        "user": {"id": str(user.id), "username": user.username, "is_admin": user.is_admin}
     }
 
 
@@ -1,7 +1,9 @@
 // chartUtils.js
 
 export async function fetchData(url) {
-  const response = await fetch(url);
+  const token = localStorage.getItem("token");
+  const headers = token ? { Authorization: `Bearer ${token}` } : {};
+  const response = await fetch(url, { headers });
   if (!response.ok) throw new Error(`Failed to fetch ${url}`);
   return await response.json();
 }
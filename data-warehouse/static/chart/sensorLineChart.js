@@ -3,9 +3,14 @@ import { fetchData, generateColors } from './chartUtils.js';
 
 let sensorLineChart;
 
-export async function renderSensorLineChart() {
+// Most points a chart asks for; the server downsamples (LTTB) to this
+const MAX_POINTS = 1000;
+
+export async function renderSensorLineChart(sensorId) {
   try {
-    const data = await fetchData("/api/admin/sensor-timeline");
+    const data = sensorId
+      ? await fetchData(`/api/sensors/${sensorId}/series?points=${MAX_POINTS}`)
+      : await fetchData("/api/admin/sensor-timeline");
     const ctx = document.getElementById("sensorLineChart").getContext("2d");
 
     const labels = data.timestamps;
@@ -22,13 +22,14 @@ minio_client = Minio(
 )
 
 # ───────────────────────────────────────────────
-# 🪣 Ensure bucket exists
+# 🪣 Ensure bucket exists (on first use, not at import: a MinIO outage must not block boot)
 # ───────────────────────────────────────────────
-try:
-    if not minio_client.bucket_exists(MINIO_BUCKET):
-        minio_client.make_bucket(MINIO_BUCKET)
-        print(f"✅ Created bucket '{MINIO_BUCKET}'")
-    else:
-        print(f"🪣 Bucket '{MINIO_BUCKET}' already exists")
-except S3Error as e:
-    print("⚠️ MinIO bucket check error:", e)
+def ensure_bucket():
+    try:
+        if not minio_client.bucket_exists(MINIO_BUCKET):
+            minio_client.make_bucket(MINIO_BUCKET)
+            print(f"✅ Created bucket '{MINIO_BUCKET}'")
+        else:
+            print(f"🪣 Bucket '{MINIO_BUCKET}' already exists")
+    except S3Error as e:
+        print("⚠️ MinIO bucket check error:", e)
@@ -1,94 +1,291 @@
 """
 📦 MinIO Migration Tool
 -----------------------
-Migrate all files stored locally under `uploaded_files/<username>/`
-into MinIO, keeping the existing SQLite metadata intact.
+Migrate every file stored locally under `uploaded_files/<username>/`
+into MinIO as `<username>/<filename>`, keeping the existing SQLite metadata intact.
+
+- One recursive list_objects call replaces a stat_object round-trip per file
+- Uploads stream from disk with fput_object (multipart above MIGRATE_PART_SIZE)
+  on MIGRATE_WORKERS threads
+- Every upload is verified: the object's ETag must equal the one computed
+  from the local file (MD5, or MD5-of-part-MD5s for multipart uploads)
+- Objects uploaded by the old put_object path (minio-py's default part size)
+  are verified with that part size, so they are not uploaded again
+- A checkpoint file records each verified object, so a killed migration
+  resumes without re-reading what is already done
 
 You can safely run this multiple times — already-migrated files will be skipped.
 """
 
 import os
-import sqlite3
+import json
+import time
+import hashlib
+import threading
 from pathlib import Path
-from minio import Minio
-from minio.error import S3Error
-from storage.minio_client import minio_client, MINIO_BUCKET
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from app import storage_ledger
 
-# Adjust if your app stores metadata elsewhere
-DB_PATH = "datawarehouse.db"
 UPLOAD_ROOT = Path("uploaded_files")
+MIGRATE_WORKERS = int(os.getenv("MIGRATE_WORKERS", "8"))
+MIGRATE_PART_SIZE = int(os.getenv("MIGRATE_PART_SIZE", str(64 * 1024 * 1024)))
+CHECKPOINT_PATH = os.getenv("MIGRATE_CHECKPOINT", "storage/.minio_migrate.checkpoint")
+HASH_CHUNK = 1024 * 1024
 
-def migrate_local_files_to_minio():
-    print("🚀 Starting MinIO migration...")
 
-    # Ensure MinIO bucket exists
-    found = minio_client.bucket_exists(MINIO_BUCKET)
-    if not found:
-        minio_client.make_bucket(MINIO_BUCKET)
-        print(f"🪣 Created bucket: {MINIO_BUCKET}")
+def s3_etag(path, part_size: int = MIGRATE_PART_SIZE) -> str:
+    """The ETag MinIO reports for `path` uploaded with fput_object(part_size=part_size)."""
+    digests = []
+    with open(path, "rb") as f:
+        while True:
+            part = hashlib.md5()
+            remaining = part_size
+            while remaining:
+                chunk = f.read(min(HASH_CHUNK, remaining))
+                if not chunk:
+                    break
+                part.update(chunk)
+                remaining -= len(chunk)
+            if remaining == part_size and digests:
+                break  # EOF exactly on a part boundary
+            digests.append(part.digest())
+            if remaining:
+                break
+    if len(digests) == 1:
+        return digests[0].hex()
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
 
-    # Ensure the uploads table exists
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS uploads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            size_mb REAL DEFAULT 0,
-            username TEXT NOT NULL
-        )
-    """)
+def etag_part_size(size: int, etag: str, part_size: int = MIGRATE_PART_SIZE) -> int:
+    """
+    Part size to hash a local file with when comparing it to a remote ETag.
+    A multipart ETag ("<md5>-N") whose N does not fit part_size came from
+    the old put_object(part_size=0) upload: use minio-py's default part size
+    for this object size when that gives N parts.
+    """
+    _, _, parts = etag.rpartition("-")
+    if parts.isdigit() and int(parts) != max(1, -(-size // part_size)):
+        from minio.helpers import get_part_info
 
-    # Fetch all uploaded files
-    c.execute("SELECT filename, username FROM uploads")
-    rows = c.fetchall()
+        default_size, count = get_part_info(size, 0)
+        if count == int(parts):
+            return default_size
+    return part_size
 
-    if not rows:
-        print("⚠️ No files found in SQLite uploads table.")
-        conn.close()
-        return
 
-    migrated = 0
-    skipped = 0
+class Checkpoint:
+    """Append-only JSON lines of verified objects: {"bucket", "key", "size", "mtime_ns", "etag"}."""
 
-    for filename, username in rows:
-        local_path = UPLOAD_ROOT / username / filename
+    def __init__(self, path: str, bucket: str):
+        self.path = path
+        self.bucket = bucket
+        self.done = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a killed run
+                    if rec.get("bucket") == bucket:
+                        self.done[rec["key"]] = rec
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
 
-        if not local_path.exists():
-            print(f"❌ Missing local file: {local_path}")
-            continue
+    def matches(self, key: str, st: os.stat_result, etag: str | None) -> bool:
+        rec = self.done.get(key)
+        return (rec is not None and rec["size"] == st.st_size and rec["mtime_ns"] == st.st_mtime_ns
+                and (etag is None or rec["etag"] == etag))
 
-        object_name = f"{username}/{filename}"
+    def add(self, key: str, st: os.stat_result, etag: str):
+        rec = {"bucket": self.bucket, "key": key, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "etag": etag}
+        with self._lock:
+            self.done[key] = rec
+            self._f.write(json.dumps(rec) + "\n")
+            self._f.flush()
 
-        # Skip if file already exists in MinIO
-        try:
-            minio_client.stat_object(MINIO_BUCKET, object_name)
-            print(f"⏭️ Skipped (already exists): {object_name}")
-            skipped += 1
-            continue
-        except S3Error as e:
-            if e.code != "NoSuchKey":
-                print(f"⚠️ Error checking {object_name}: {e}")
+    def close(self):
+        self._f.close()
+
+
+class Migration:
+    def __init__(self, client, bucket: str, root: Path = UPLOAD_ROOT, workers: int = MIGRATE_WORKERS,
+                 checkpoint: str = CHECKPOINT_PATH, part_size: int = MIGRATE_PART_SIZE):
+        self.client = client
+        self.bucket = bucket
+        self.root = Path(root)
+        self.workers = workers
+        self.checkpoint_path = checkpoint
+        self.part_size = part_size
+        self.counts = {"scanned": 0, "uploaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
+        self.failures = []
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _count(self, what: str, nbytes: int = 0):
+        with self._lock:
+            self.counts[what] += 1
+            self.counts["bytes"] += nbytes
+
+    def _local_files(self):
+        """(object name, path, stat) for every file under root."""
+        stack = [self.root]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except OSError:
                 continue
+            with it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        key = Path(entry.path).relative_to(self.root).as_posix()
+                        yield key, entry.path, entry.stat()
 
-        # Upload to MinIO
+    def _remote(self) -> dict:
+        """{object name: (size, etag)} from a single recursive listing."""
+        return {
+            obj.object_name: (obj.size, (obj.etag or "").strip('"'))
+            for obj in self.client.list_objects(self.bucket, recursive=True)
+        }
+
+    def _migrate_one(self, key: str, path: str, st: os.stat_result, remote, checkpoint: Checkpoint):
         try:
-            minio_client.fput_object(
-                MINIO_BUCKET,
-                object_name,
-                str(local_path),
-                content_type="application/octet-stream",
+            if remote is not None and remote[0] == st.st_size:
+                if checkpoint.matches(key, st, remote[1]):
+                    return self._count("skipped")
+                hashed_with = etag_part_size(st.st_size, remote[1], self.part_size)
+                local = s3_etag(path, hashed_with)
+                if local == remote[1]:
+                    checkpoint.add(key, st, local)
+                    return self._count("skipped")
+                if hashed_with != self.part_size:
+                    local = s3_etag(path, self.part_size)
+            else:
+                local = s3_etag(path, self.part_size)
+
+            result = self.client.fput_object(
+                self.bucket, key, path, content_type="application/octet-stream", part_size=self.part_size
             )
-            print(f"✅ Uploaded to MinIO: {object_name}")
-            migrated += 1
+            uploaded = (result.etag or "").strip('"')
+            if uploaded != local:
+                raise ValueError(f"checksum mismatch (local {local}, MinIO {uploaded})")
+            checkpoint.add(key, st, local)
+            storage_ledger.record_object(key, st.st_size)
+            self._count("uploaded", st.st_size)
         except Exception as e:
-            print(f"❌ Failed to upload {local_path}: {e}")
+            self._count("failed")
+            with self._lock:
+                if len(self.failures) < 100:
+                    self.failures.append({"key": key, "error": str(e)})
+            print(f"❌ Failed to upload {path}: {e}")
+
+    def run(self) -> dict:
+        self.started_at = time.time()
+        if not self.client.bucket_exists(self.bucket):
+            self.client.make_bucket(self.bucket)
+            print(f"🪣 Created bucket: {self.bucket}")
+
+        remote = self._remote()
+        checkpoint = Checkpoint(self.checkpoint_path, self.bucket)
+        print(f"🚀 Starting MinIO migration of {self.root} ({len(remote)} objects already in {self.bucket})...")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="minio-migrate") as pool:
+                in_flight = set()
+                for key, path, st in self._local_files():
+                    if self._stop.is_set():
+                        break
+                    self._count("scanned")
+                    # Keep the queue short: the tree can hold millions of files
+                    if len(in_flight) >= self.workers * 4:
+                        _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    in_flight.add(pool.submit(self._migrate_one, key, path, st, remote.get(key), checkpoint))
+        finally:
+            checkpoint.close()
+            self.finished_at = time.time()
+
+        print(f"\n✅ Migration complete!")
+        print(f"   → Migrated: {self.counts['uploaded']} files ({self.counts['bytes'] / 1024 ** 3:.2f} GiB)")
+        print(f"   → Skipped:  {self.counts['skipped']} already in MinIO")
+        print(f"   → Failed:   {self.counts['failed']}")
+        return self.status()
+
+    def stop(self):
+        """Stop after the uploads already queued; the checkpoint lets the next run resume."""
+        self._stop.set()
+
+    def status(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0
+        return {
+            **self.counts,
+            "running": self.started_at is not None and self.finished_at is None,
+            "elapsed_s": round(elapsed, 1),
+            "mb_per_s": round(self.counts["bytes"] / 1024 ** 2 / elapsed, 2) if elapsed else 0.0,
+            "failures": list(self.failures),
+        }
+
+
+# ───────────────────────────────────────────────
+# 🧵 Entry points
+# ───────────────────────────────────────────────
+_current = None
+_thread = None
+_start_lock = threading.Lock()
+
+
+def _default_migration() -> Migration:
+    from storage.minio_client import minio_client, MINIO_BUCKET
+    return Migration(minio_client, MINIO_BUCKET)
+
+
+def migrate_local_files_to_minio() -> dict:
+    """Run a migration in this thread and return its summary."""
+    global _current
+    _current = _default_migration()
+    return _current.run()
+
+
+def start_background(on_done=None) -> dict:
+    """
+    Start a migration on a background thread unless one is running; returns its status.
+    on_done() is called when the run ends (at once if one was already running).
+    """
+    global _current, _thread
+    with _start_lock:
+        if _thread is None or not _thread.is_alive():
+            _current = _default_migration()
+            _thread = threading.Thread(target=_run_logged, args=(_current, on_done), name="minio-migrate", daemon=True)
+            _thread.start()
+        elif on_done is not None:
+            on_done()
+        return _current.status()
+
+
+def _run_logged(migration: Migration, on_done=None):
+    try:
+        migration.run()
+    except Exception as e:
+        print(f"❌ MinIO migration failed: {e}")
+    finally:
+        if on_done is not None:
+            on_done()
+
+
+def status() -> dict | None:
+    return _current.status() if _current is not None else None
+
 
-    conn.close()
-    print(f"\n✅ Migration complete!")
-    print(f"   → Migrated: {migrated} files")
-    print(f"   → Skipped:  {skipped} already in MinIO")
+def stop():
+    if _current is not None:
+        _current.stop()
+    if _thread is not None:
+        _thread.join(timeout=5.0)
 
 
 if __name__ == "__main__":